@@ -0,0 +1,48 @@
+"""
+Compare the time taken to fill the cells of a table using SingleLoad.insert_table() with the previous approach, which
+accessed each cell using table.rows[i].cells[j].
+
+Usage: python benchmarks/bench_tables.py
+"""
+from laundry.laundryclass import SingleLoad
+from docx import Document
+from types import SimpleNamespace
+from timeit import timeit
+
+TABLE_SIZES = [(2, 10), (2, 50), (200, 10)]
+REPEAT = 5
+
+
+def table_data(rows: int, cols: int):
+    return [tuple(f'Header {j}' for j in range(cols))] + \
+           [tuple(f'Cell {i}, {j}' for j in range(cols)) for i in range(1, rows)]
+
+
+def insert_table_per_cell(document: Document, cols: int, rows: int, data, section_style: str = None,
+                          autofit_table: bool = True):
+    table = document.add_table(rows=rows, cols=cols, style=section_style)
+    table.autofit = autofit_table
+    for i, cell_contents in enumerate(data, 0):
+        for j, text in enumerate(cell_contents):
+            table.rows[i].cells[j].text = str(text)
+
+
+def insert_table_bulk(document: Document, cols: int, rows: int, data, section_style: str = None,
+                      autofit_table: bool = True):
+    load = SimpleNamespace(_file_template=document, _volume_bytes=0)
+    SingleLoad.insert_table(load, cols, rows, data, section_style, autofit_table)
+
+
+def main():
+    print(f'{"rows x cols":>12}{"per cell (ms)":>16}{"bulk (ms)":>12}{"speed up":>10}')
+    for rows, cols in TABLE_SIZES:
+        data = table_data(rows, cols)
+        results = []
+        for insert_table in (insert_table_per_cell, insert_table_bulk):
+            seconds = timeit(lambda: insert_table(Document(), cols, rows, data, 'Table Grid'), number=REPEAT)
+            results.append(seconds / REPEAT * 1000)
+        print(f'{f"{rows} x {cols}":>12}{results[0]:>16.1f}{results[1]:>12.1f}{results[0] / results[1]:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Generate a synthetic input file, with its data, structure and batch worksheets and placeholder photos, for the
+benchmarks.
+
+The data worksheet contains an asset name, a component used to filter the batch rows, a photo column and as many text
+columns as are needed to reach the requested number of columns. Text columns that are not used by a section are left
+in the worksheet, as they would be in a real input file.
+
+Usage: python benchmarks/generate_workbook.py --rows 1000 --columns 40 --batch-rows 2 <directory>
+"""
+from docx import Document
+from typing import List, Tuple
+from pathlib import Path
+import struct
+import zlib
+import click
+import pandas as pd
+
+COMPONENTS = ['iso', 'cb', 'sw', 'pump', 'valve']
+PHOTO_DIRECTORY = 'photos'
+TEMPLATE_FILE = 'template.docx'
+OUTPUT_DIRECTORY = 'output'
+
+
+def placeholder_png(width: int, height: int, seed: int = 0) -> bytes:
+    """
+    Return a PNG of a colour gradient. The gradient stops the photo from compressing to almost nothing.
+    :param width: The width in pixels.
+    :param height: The height in pixels.
+    :param seed: Changes the colours, so each photo is different.
+    :return: bytes
+    """
+    rows = bytearray()
+    for y in range(height):
+        rows.append(0)
+        for x in range(width):
+            rows.extend(((x + seed * 37) % 256, (y + seed * 11) % 256, (x * y + seed) % 256))
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)) + \
+        chunk(b'IDAT', zlib.compress(bytes(rows), 6)) + chunk(b'IEND', b'')
+
+
+def generate_workbook(directory: (Path, str), rows: int = 100, columns: int = 10, batch_rows: int = 1,
+                      paragraphs: int = 1, tables: int = 1, table_columns: int = 3, photos_per_row: int = 1,
+                      photo_files: int = 10, photo_size: Tuple[int, int] = (320, 240)) -> Path:
+    """
+    Write the input file, a template and photos to the directory. The template and output files of the batch rows are
+    relative to the directory, so laundry should be run from the directory.
+    :param directory: The directory that the files are written to. It is created if it does not exist.
+    :param rows: The number of data rows.
+    :param columns: The number of data worksheet columns. At least enough columns for the sections are created.
+    :param batch_rows: The number of batch rows. The first row uses every data row, the others filter the data rows
+    by component.
+    :param paragraphs: The number of para sections.
+    :param tables: The number of table sections.
+    :param table_columns: The number of data columns in each table section.
+    :param photos_per_row: The number of photos listed in each data row. If 0 there is no photo section.
+    :param photo_files: The number of placeholder photos. Data rows share the photos.
+    :param photo_size: The width and height of the photos in pixels.
+    :return: The path to the input file.
+    """
+    directory = Path(directory)
+    (directory / PHOTO_DIRECTORY).mkdir(parents=True, exist_ok=True)
+    (directory / OUTPUT_DIRECTORY).mkdir(exist_ok=True)
+    Document().save(str(directory / TEMPLATE_FILE))
+    for i in range(photo_files if photos_per_row > 0 else 0):
+        (directory / PHOTO_DIRECTORY / f'photo_{i:04}.png').write_bytes(placeholder_png(*photo_size, seed=i))
+
+    t_text_columns = max(columns - 3, paragraphs + tables * table_columns)
+    data = {'Asset Name': [f'Asset {i}' for i in range(rows)],
+            'Component': [COMPONENTS[i % len(COMPONENTS)] for i in range(rows)],
+            'Photos': ['\n'.join(f'photo_{(i + j) % max(photo_files, 1):04}' for j in range(photos_per_row))
+                       if photos_per_row > 0 else 'no photo' for i in range(rows)]}
+    for j in range(t_text_columns):
+        data[f'Field {j:03}'] = [f'Value {i}.{j}' if (i + j) % 7 else f'Value {i}.{j}\nsecond line'
+                                 for i in range(rows)]
+
+    t_fields: List[str] = [f'field_{j:03}' for j in range(t_text_columns)]
+    structure = [('heading', 'asset_name', 'Normal', 'Heading 1', False, False, None)]
+    for i in range(tables):
+        t_contains = '\n'.join(['component'] + t_fields[i * table_columns:(i + 1) * table_columns])
+        structure.append(('table', t_contains, 'Table Grid', None, True, False, None))
+    for i in range(paragraphs):
+        structure.append(('para', t_fields[tables * table_columns + i], 'Normal', 'Heading 2', False, False, None))
+    if photos_per_row > 0:
+        structure.append(('photo', 'photos', None, None, False, False, PHOTO_DIRECTORY))
+    structure[-1] = structure[-1][:5] + (True,) + structure[-1][6:]
+
+    batch = []
+    for i in range(batch_rows):
+        t_filter = None if i == 0 else f'component: {COMPONENTS[(i - 1) % len(COMPONENTS)]}'
+        batch.append(('Master List', '_structure', 0, True, TEMPLATE_FILE, t_filter,
+                      f'{OUTPUT_DIRECTORY}/batch_{i:03}.docx'))
+
+    fp = directory / 'benchmark.xlsx'
+    with pd.ExcelWriter(fp) as writer:
+        pd.DataFrame(data).to_excel(writer, sheet_name='Master List', index=False)
+        pd.DataFrame(structure, columns=['section_type', 'section_contains', 'section_style', 'title_style',
+                                         'section_break', 'page_break', 'path']).to_excel(
+            writer, sheet_name='_structure', index=False)
+        pd.DataFrame(batch, columns=['data_worksheet', 'structure_worksheet', 'header_row', 'drop_empty_columns',
+                                     'template_file', 'filter_rows', 'output_file']).to_excel(
+            writer, sheet_name='_batch', index=False)
+    return fp
+
+
+@click.command()
+@click.option('--rows', default=100, show_default=True, type=click.IntRange(min=1), help='Number of data rows.')
+@click.option('--columns', default=10, show_default=True, type=click.IntRange(min=1),
+              help='Number of data worksheet columns.')
+@click.option('--batch-rows', default=1, show_default=True, type=click.IntRange(min=1), help='Number of batch rows.')
+@click.option('--paragraphs', default=1, show_default=True, type=click.IntRange(min=0), help='Number of para sections.')
+@click.option('--tables', default=1, show_default=True, type=click.IntRange(min=0), help='Number of table sections.')
+@click.option('--table-columns', default=3, show_default=True, type=click.IntRange(min=1),
+              help='Number of data columns in each table section.')
+@click.option('--photos-per-row', default=1, show_default=True, type=click.IntRange(min=0),
+              help='Number of photos in each data row.')
+@click.option('--photo-files', default=10, show_default=True, type=click.IntRange(min=1),
+              help='Number of placeholder photos.')
+@click.option('--photo-size', default=(320, 240), show_default=True, type=(int, int),
+              help='Width and height of the placeholder photos in pixels.')
+@click.argument('directory', type=click.Path(file_okay=False))
+def main(directory: str, **options):
+    """Generate a synthetic input file in DIRECTORY."""
+    print(generate_workbook(directory, **options))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""
+Time each phase of a run, reading the workbook, validating the worksheets, rendering and saving the output files, for
+synthetic workbooks of increasing size. Laundry is timed for a complete multi run, and SingleLoad is timed rendering
+and saving the first batch row on its own.
+
+Each phase is timed exclusive of the other phases that it calls, e.g. the worksheets read while the batch worksheet is
+validated are counted as reading. The fastest of the repeats is reported.
+
+Usage:
+    python benchmarks/run_benchmarks.py --save results.json
+    python benchmarks/run_benchmarks.py --tiers small,medium --baseline results.json
+"""
+from generate_workbook import generate_workbook, TEMPLATE_FILE
+from laundry.constants import laundry_version
+from laundry.readers import READER_ENGINES, DEFAULT_READER
+from laundry.images import ImageCache
+import laundry.laundryclass as laundryclass
+from typing import Dict, List
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime, timezone
+from tempfile import TemporaryDirectory
+from io import StringIO
+from pathlib import Path
+import functools
+import json
+import os
+import platform
+import sys
+import time
+import click
+import pandas as pd
+
+PHASES = ['read', 'validate', 'render', 'save']
+# The generate_workbook() arguments of each size tier.
+TIERS: Dict[str, Dict] = {
+    'small': dict(rows=50, columns=10, batch_rows=2),
+    'medium': dict(rows=500, columns=40, batch_rows=3, paragraphs=2, tables=2),
+    'large': dict(rows=2000, columns=180, batch_rows=4, paragraphs=3, tables=3, photo_files=50),
+}
+DEFAULT_TIERS = 'small,medium'
+# A phase has regressed if it is slower than the baseline by more than the tolerance and by more than MIN_SECONDS,
+# which ignores the noise in the timing of very short phases.
+DEFAULT_TOLERANCE = 0.2
+MIN_SECONDS = 0.005
+
+
+class PhaseTimer:
+    """Accumulate the time spent in each phase. Time spent in a nested phase is only counted by the nested phase."""
+
+    def __init__(self, phases: List[str] = None):
+        """
+        :param phases: The phases that are reported. All PHASES are reported by default.
+        """
+        self.seconds: Dict[str, float] = {phase: 0.0 for phase in (phases or PHASES)}
+        self._stack: List[list] = []
+
+    def wrap(self, phase: str, function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            self._stack.append([phase, time.perf_counter(), 0.0])
+            try:
+                return function(*args, **kwargs)
+            finally:
+                t_phase, t_start, t_nested = self._stack.pop()
+                t_elapsed = time.perf_counter() - t_start
+                self.seconds[t_phase] = self.seconds.get(t_phase, 0.0) + t_elapsed - t_nested
+                if self._stack:
+                    self._stack[-1][2] += t_elapsed
+        return timed
+
+
+@contextmanager
+def timed_phases(timer: PhaseTimer):
+    """
+    Wrap the functions that make up each phase so they are timed, and restore them afterwards.
+    :param timer: The PhaseTimer that records the time.
+    """
+    laundry, single_load = laundryclass.Laundry, laundryclass.SingleLoad
+    t_targets = [(laundryclass, 'open_workbook', 'read', False),
+                 (laundry, 'excel_to_dataframe', 'read', True),
+                 (laundry, 'check_batch_worksheet_data', 'validate', False),
+                 (laundry, 'check_dataframe', 'validate', False),
+                 (single_load, 'start_wash', 'render', False),
+                 (single_load, 'issue_document', 'save', False),
+                 (single_load, 'issue_volume_index', 'save', False)]
+    t_originals = [(owner, name, owner.__dict__[name]) for owner, name, phase, static in t_targets]
+    for owner, name, phase, static in t_targets:
+        function = timer.wrap(phase, getattr(owner, name))
+        setattr(owner, name, staticmethod(function) if static else function)
+    try:
+        yield timer
+    finally:
+        for owner, name, original in t_originals:
+            setattr(owner, name, original)
+
+
+@contextmanager
+def working_directory(directory: Path):
+    t_cwd = os.getcwd()
+    os.chdir(directory)
+    try:
+        yield
+    finally:
+        os.chdir(t_cwd)
+
+
+def time_laundry(input_fp: Path, reader: str, frames: Dict) -> Dict[str, float]:
+    """
+    Time a multi run of the input file. The structure and data DataFrames of the first batch row are stored in frames.
+    :return: The seconds spent in each phase, and in total.
+    """
+    t_wash_load = laundryclass.Laundry.wash_load
+
+    def wash_load(self, *args, **kwargs):
+        frames.setdefault('structure', self.t_structure_df.copy())
+        frames.setdefault('data', self.t_data_df.copy())
+        return t_wash_load(self, *args, **kwargs)
+
+    timer = PhaseTimer()
+    laundryclass.Laundry.wash_load = wash_load
+    try:
+        with timed_phases(timer), redirect_stdout(StringIO()):
+            t_start = time.perf_counter()
+            laundryclass.Laundry(input_fp, batch_worksheet='_batch', verbose=False, reader=reader)
+            t_total = time.perf_counter() - t_start
+    finally:
+        laundryclass.Laundry.wash_load = t_wash_load
+    return {**timer.seconds, 'total': t_total}
+
+
+def time_single_load(frames: Dict, output_fp: Path) -> Dict[str, float]:
+    """
+    Time SingleLoad rendering and saving the first batch row with an empty image cache.
+    :return: The seconds spent in each phase, and in total.
+    """
+    timer = PhaseTimer(['render', 'save'])
+    with timed_phases(timer), redirect_stdout(StringIO()):
+        t_start = time.perf_counter()
+        laundryclass.SingleLoad(frames['structure'], frames['data'], Path(TEMPLATE_FILE).resolve(), output_fp,
+                                image_cache=ImageCache())
+        t_total = time.perf_counter() - t_start
+    return {**timer.seconds, 'total': t_total}
+
+
+def run_tier(tier: str, reader: str, repeat: int) -> Dict:
+    """
+    Generate the tier's workbook and time Laundry and SingleLoad, keeping the fastest time of each phase.
+    :return: The tier's results.
+    """
+    results = {'workbook': TIERS[tier], 'laundry': {}, 'single_load': {}}
+    with TemporaryDirectory() as directory, working_directory(Path(directory)):
+        input_fp = generate_workbook(directory, **TIERS[tier])
+        for _ in range(repeat):
+            frames = {}
+            t_runs = {'laundry': time_laundry(input_fp, reader, frames),
+                      'single_load': time_single_load(frames, Path(directory) / 'single_load.docx')}
+            for target, seconds in t_runs.items():
+                for phase, value in seconds.items():
+                    results[target][phase] = min(results[target].get(phase, value), value)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Print the results beside the baseline.
+    :return: The phases that have regressed.
+    """
+    regressions = []
+    print(f'{"tier":<8}{"target":<13}{"phase":<10}{"baseline (s)":>14}{"result (s)":>12}{"change":>9}')
+    for tier, tier_results in results['tiers'].items():
+        for target in ('laundry', 'single_load'):
+            for phase, seconds in tier_results[target].items():
+                t_baseline = baseline.get('tiers', {}).get(tier, {}).get(target, {}).get(phase)
+                if t_baseline is None:
+                    print(f'{tier:<8}{target:<13}{phase:<10}{"-":>14}{seconds:>12.3f}{"":>9}')
+                    continue
+                t_change = (seconds - t_baseline) / t_baseline if t_baseline > 0 else 0.0
+                t_flag = ''
+                if t_change > tolerance and seconds - t_baseline > MIN_SECONDS:
+                    t_flag = '  slower'
+                    regressions.append(f'{tier} {target} {phase}')
+                print(f'{tier:<8}{target:<13}{phase:<10}{t_baseline:>14.3f}{seconds:>12.3f}{t_change:>+9.0%}{t_flag}')
+    return regressions
+
+
+@click.command()
+@click.option('--tiers', default=DEFAULT_TIERS, show_default=True,
+              help=f'Comma separated size tiers to run. One or more of {", ".join(TIERS)}.')
+@click.option('--reader', default=DEFAULT_READER, show_default=True, type=click.Choice(list(READER_ENGINES)),
+              help='The engine used to read the workbooks.')
+@click.option('--repeat', default=3, show_default=True, type=click.IntRange(min=1),
+              help='The number of times each tier is run.')
+@click.option('--save', 'save_fp', default=None, type=click.Path(dir_okay=False),
+              help='Save the results to this JSON file.')
+@click.option('--baseline', 'baseline_fp', default=None, type=click.Path(exists=True, dir_okay=False),
+              help='Compare the results with a JSON file saved by an earlier run. Exits with status 1 if a phase has '
+                   'regressed.')
+@click.option('--tolerance', default=DEFAULT_TOLERANCE, show_default=True, type=click.FloatRange(min=0),
+              help='The fraction by which a phase may be slower than the baseline before it has regressed.')
+def main(tiers: str, reader: str, repeat: int, save_fp: str, baseline_fp: str, tolerance: float):
+    """Time each phase of a run for synthetic workbooks of increasing size."""
+    t_tiers = [tier.strip() for tier in tiers.split(',') if tier.strip()]
+    for tier in t_tiers:
+        if tier not in TIERS:
+            raise click.BadParameter(f'{tier!r} is not one of {", ".join(TIERS)}.', param_hint='--tiers')
+    results = {'laundry_version': laundry_version, 'python': platform.python_version(), 'pandas': pd.__version__,
+               'platform': platform.platform(), 'reader': reader, 'repeat': repeat,
+               'created': datetime.now(timezone.utc).isoformat(timespec='seconds'), 'tiers': {}}
+    for tier in t_tiers:
+        print(f'Running {tier}...', file=sys.stderr)
+        results['tiers'][tier] = run_tier(tier, reader, repeat)
+
+    baseline = {}
+    if baseline_fp is not None:
+        baseline = json.loads(Path(baseline_fp).read_text())
+    regressions = compare(results, baseline, tolerance)
+    if save_fp is not None:
+        Path(save_fp).write_text(json.dumps(results, indent=2))
+    if regressions:
+        print(f'{len(regressions)} phases are slower than the baseline: {", ".join(regressions)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -23,6 +23,11 @@ setup(
         'pyjanitor',
         'colorama',
     ],
+    extras_require={
+        'cache': ['pyarrow'],
+        'calamine': ['python-calamine'],
+        'images': ['Pillow'],
+    },
     entry_points={
         'console_scripts': [
             'laundry = laundry.laundry_cli:cli',
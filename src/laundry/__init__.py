@@ -1,2 +1,3 @@
 from laundry.laundryclass import *
 from laundry.laundry_cli import *
+from laundry.render import render_document
@@ -8,3 +8,17 @@ laundry_version = '2020.2.2'
 data_frame = NewType('data_frame', pd.DataFrame)
 invalid = ['nan', 'None', 'NA', 'N/A', 'False', 'Nil']
 photo_formats = ['.jpg', '.jpeg', '.png', '.tiff']
+# The cell text read as NaN. This is the default na_values documented for pandas.read_excel(). It is passed to pandas
+# explicitly, so every reader engine and the row filters agree whatever the installed version of pandas.
+NA_VALUES = frozenset(['', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+                       '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'n/a', 'nan', 'null'])
+
+# Define headers for the batch and structure worksheets. These are fixed.
+EXPECTED_BATCH_HEADERS = ['data_worksheet', 'structure_worksheet', 'header_row', 'drop_empty_columns', 'template_file',
+                          'filter_rows', 'output_file']
+# Optional batch headers that split a large output file into volumes.
+VOLUME_BATCH_HEADERS = ['max_rows_per_file', 'max_output_mb']
+EXPECTED_STRUCTURE_HEADERS = ['section_type', 'section_contains', 'section_style', 'title_style', 'section_break',
+                              'page_break', 'path']
+EXPECTED_SECTION_TYPES = ['heading', 'table', 'para', 'photo']
+PARAGRAPH_SECTION_TYPES = ['heading', 'para', 'paragraph']
@@ -0,0 +1,233 @@
+"""
+The filter_rows language of the batch worksheet. Each line of filter_rows is a condition, and a data row is included in
+the output file only if it meets every condition:
+
+    column: value1, value2      The cell is one of the values.
+    column > 10                 The cell is greater than a number or date. >=, < and <= can also be used.
+    column between 1 and 5      The cell is between two numbers or dates, inclusive.
+    column contains text        The cell contains the text, ignoring case.
+    column matches ^A\\d+$       The cell matches a regular expression.
+    column is empty             The cell is empty. 'column is not empty' can also be used.
+    not <condition>             The cell does not meet the condition.
+
+The conditions are compiled once into a single boolean mask. A RowPrefilter applies the same conditions to the raw
+worksheet values so that reader engines that stream rows can discard rows that cannot match before they are parsed.
+"""
+from laundry.constants import NA_VALUES
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+from datetime import datetime
+import operator
+import re
+import janitor
+import pandas as pd
+
+
+class RowFilter(NamedTuple):
+    """A single condition of filter_rows."""
+    column: str
+    operator: str
+    values: tuple
+    negate: bool = False
+
+
+def parse_filter_value(value: str):
+    """
+    Convert the value of a comparison to a number, or if it is not a number, a date.
+    :param value: The value as written in filter_rows.
+    :return: float or pd.Timestamp
+    """
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return pd.Timestamp(value)
+    except ValueError:
+        raise ValueError(f'The filter value {value!r} is not a number or a date.')
+
+
+def parse_filters(filters: str) -> List[RowFilter]:
+    """
+    Parse filter_rows into a list of conditions.
+    :param filters: The filter_rows text. Each line is a condition.
+    :return: List[RowFilter]
+    """
+    parsed = []
+    for line in str(filters).splitlines():
+        line = line.strip()
+        if line == '':
+            continue
+        negate = False
+        match = re.match(r'^not\s+(.+)$', line, re.IGNORECASE)
+        if match:
+            negate, line = True, match.group(1)
+
+        if re.match(r'^\w+\s*:', line):
+            column, values = line.split(':', 1)
+            parsed.append(RowFilter(column.strip(), 'in', tuple(value.strip() for value in values.split(',')),
+                                    negate))
+            continue
+        match = re.match(r'^(\w+)\s+is\s+(not\s+)?empty$', line, re.IGNORECASE)
+        if match:
+            parsed.append(RowFilter(match.group(1), 'empty', (), negate != bool(match.group(2))))
+            continue
+        match = re.match(r'^(\w+)\s+between\s+(.+?)\s+and\s+(.+)$', line, re.IGNORECASE)
+        if match:
+            low, high = parse_filter_value(match.group(2)), parse_filter_value(match.group(3))
+            if type(low) is not type(high):
+                raise ValueError(f'The filter {line!r} must compare two numbers or two dates.')
+            parsed.append(RowFilter(match.group(1), 'between', (low, high), negate))
+            continue
+        match = re.match(r'^(\w+)\s+(contains|matches)\s+(.+)$', line, re.IGNORECASE)
+        if match:
+            t_operator, value = match.group(2).lower(), match.group(3)
+            if t_operator == 'matches':
+                try:
+                    re.compile(value)
+                except re.error as e:
+                    raise ValueError(f'The filter {line!r} is not a valid regular expression: {e}.')
+            parsed.append(RowFilter(match.group(1), t_operator, (value,), negate))
+            continue
+        match = re.match(r'^(\w+)\s*(>=|<=|>|<)\s*(.+)$', line)
+        if match:
+            parsed.append(RowFilter(match.group(1), match.group(2), (parse_filter_value(match.group(3)),), negate))
+            continue
+        raise ValueError(f'The filter {line!r} is not understood.')
+    return parsed
+
+
+def compare(values: pd.Series, comparison: str, filter_values: tuple) -> pd.Series:
+    """
+    Compare the values of a column to a number or date. Cells that are not numbers or dates do not match.
+    :param values: The column.
+    :param comparison: One of >, >=, <, <= or between.
+    :param filter_values: The numbers or dates compared to.
+    :return: pd.Series
+    """
+    if isinstance(filter_values[0], pd.Timestamp):
+        values = pd.to_datetime(values, errors='coerce')
+    else:
+        values = pd.to_numeric(values, errors='coerce')
+    if comparison == 'between':
+        return (values >= filter_values[0]) & (values <= filter_values[1])
+    return {'>': values.gt, '>=': values.ge, '<': values.lt, '<=': values.le}[comparison](filter_values[0])
+
+
+def filter_mask(df: pd.DataFrame, filters: List[RowFilter]) -> pd.Series:
+    """
+    Return a boolean mask of the rows of the DataFrame that meet all of the filters.
+    :param df: The DataFrame to be filtered.
+    :param filters: The filters as returned by parse_filters().
+    :return: pd.Series
+    """
+    mask = pd.Series(True, index=df.index)
+    for row_filter in filters:
+        if row_filter.column not in df.columns:
+            raise ValueError(f'The filter column {row_filter.column!r} does not exist in the data worksheet.')
+        values = df[row_filter.column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+        if row_filter.operator == 'in':
+            t_mask = values.isin(row_filter.values)
+        elif row_filter.operator == 'empty':
+            t_mask = values.isna() | (values.astype(str).str.strip() == '')
+        elif row_filter.operator in ('contains', 'matches'):
+            t_mask = values.where(values.notna(), '').astype(str).str.contains(
+                row_filter.values[0], case=row_filter.operator == 'matches', regex=row_filter.operator == 'matches')
+        else:
+            t_mask = compare(values, row_filter.operator, row_filter.values)
+        mask &= ~t_mask if row_filter.negate else t_mask
+    return mask
+
+
+def is_number(value: str) -> bool:
+    """
+    :param value: Text from a worksheet cell.
+    :return: True if the parser converts the text to a number.
+    """
+    try:
+        float(value)
+        return True
+    except ValueError:
+        return False
+
+
+class RowPrefilter:
+    """
+    Decide from a worksheet row's raw values whether the row can meet the filters. A row is only discarded if it cannot
+    meet the filters once it has been parsed, so applying filter_mask() to the parsed rows gives the same result with or
+    without the prefilter. Conditions that cannot be decided from the raw values, such as negated conditions, keep the
+    row.
+    """
+
+    def __init__(self, filters: List[RowFilter], clean_header: bool = True):
+        """
+        :param filters: The filters as returned by parse_filters().
+        :param clean_header: True if the worksheet's column names are cleaned before the filters are applied.
+        """
+        self.filters: List[RowFilter] = filters
+        self.clean_header: bool = clean_header
+        self._tests: List[Tuple[int, Callable[[Any], bool]]] = []
+
+    def set_header(self, header: list):
+        """
+        Find the position of each filtered column using the worksheet's header row.
+        :param header: The raw values of the header row.
+        :return:
+        """
+        t_columns = pd.DataFrame(columns=[str(value) if value != '' else f'Unnamed: {i}'
+                                          for i, value in enumerate(header)])
+        if self.clean_header:
+            t_columns = t_columns.clean_names()
+        position: Dict[str, int] = {}
+        for i, column in enumerate(t_columns.columns):
+            position.setdefault(column, i)
+        self._tests = []
+        for row_filter in self.filters:
+            test = None if row_filter.negate else self.value_test(row_filter)
+            if test is not None and row_filter.column in position:
+                self._tests.append((position[row_filter.column], test))
+
+    @staticmethod
+    def value_test(row_filter: RowFilter):
+        """
+        Return a function that is False for a raw value that cannot meet the filter, or None if the filter cannot be
+        decided from the raw values.
+        :param row_filter: The filter.
+        :return:
+        """
+        if row_filter.operator == 'in':
+            return lambda value: isinstance(value, str) and value in row_filter.values
+        if row_filter.operator in ('contains', 'matches'):
+            if row_filter.operator == 'contains':
+                t_text = row_filter.values[0].lower()
+                test = lambda value: t_text in value.lower()
+            else:
+                t_pattern = re.compile(row_filter.values[0])
+                test = lambda value: t_pattern.search(value) is not None
+            # Only text that is left unchanged by the parser can be tested.
+            return lambda value: not isinstance(value, str) or value in NA_VALUES or is_number(value) or \
+                value.lower() in ('true', 'false') or test(value)
+        if row_filter.operator in ('>', '>=', '<', '<=', 'between'):
+            if row_filter.operator == 'between':
+                t_compare = lambda value: row_filter.values[0] <= value <= row_filter.values[1]
+            else:
+                t_operator = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}[
+                    row_filter.operator]
+                t_compare = lambda value: t_operator(value, row_filter.values[0])
+            if isinstance(row_filter.values[0], pd.Timestamp):
+                return lambda value: not isinstance(value, datetime) or t_compare(pd.Timestamp(value))
+            # Numbers, and text that the parser converts to a number, are compared. NaN never matches.
+            return lambda value: isinstance(value, bool) or not isinstance(value, (int, float, str)) or \
+                (isinstance(value, str) and not is_number(value)) or t_compare(float(value))
+        return None
+
+    def __call__(self, row: list) -> bool:
+        """
+        :param row: The raw values of a worksheet row.
+        :return: False if the row cannot meet the filters.
+        """
+        for position, test in self._tests:
+            if not test(row[position] if position < len(row) else ''):
+                return False
+        return True
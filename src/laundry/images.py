@@ -0,0 +1,234 @@
+"""
+Prepare photos before they are inserted into an output document. Photos are resampled to the pixel size required by
+their width in the document, and TIFF files are converted to JPEG or PNG, so the size of the output document depends
+on the number of photos rather than the resolution of the camera. Resampling requires the Pillow package.
+
+Prepared photos are held in memory by an ImageCache that is shared by every output document in a run, so a photo used
+by many documents is only read and parsed once. Photos can be loaded ahead of the renderer, see laundry.prefetch.
+"""
+from laundry.constants import laundry_version
+from laundry.worksheet_cache import file_digest
+from docx.image.image import Image as DocxImage
+from collections import OrderedDict
+from typing import Dict, Tuple
+from pathlib import Path
+from io import BytesIO
+import hashlib
+import os
+import tempfile
+import threading
+
+DEFAULT_PHOTO_DPI = 150
+DEFAULT_JPEG_QUALITY = 85
+DEFAULT_IMAGE_CACHE_SIZE_MB = 256
+
+
+class ImagePipeline:
+    """
+    Resample photos to the resolution required at a given DPI. Prepared photos are stored in cache_dir, keyed by the
+    source photo's content hash and the render parameters, so each photo is only resampled once. If cache_dir is None
+    the prepared photo is returned in memory.
+    """
+
+    def __init__(self, dpi: int = DEFAULT_PHOTO_DPI, cache_dir: (Path, str) = None,
+                 jpeg_quality: int = DEFAULT_JPEG_QUALITY):
+        """
+        :param dpi: The resolution of the photos in the output document, in dots per inch.
+        :param cache_dir: The directory used to store the prepared photos, or None.
+        :param jpeg_quality: The JPEG quality (1-95) used when a photo is recompressed.
+        """
+        try:
+            from PIL import Image
+        except ImportError:
+            raise ImportError('Resampling photos requires the Pillow package. Install it using "pip install Pillow".')
+        self._image = Image
+        self.dpi: int = dpi
+        self.jpeg_quality: int = jpeg_quality
+        self._cache_dir: Path = None
+        if cache_dir is not None:
+            self._cache_dir = Path(cache_dir)
+            self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+
+    def source_digest(self, photo: Path) -> str:
+        """
+        Return the content hash of the source photo. The hash is only recalculated if the photo's size or modification
+        time has changed.
+        :param photo: The photo's file path.
+        :return: str
+        """
+        stat = os.stat(photo)
+        key = (str(photo), stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = file_digest(photo)
+        return self._digests[key]
+
+    def target_pixels(self, width: float) -> int:
+        """
+        The number of pixels needed for a photo of the given width.
+        :param width: width of the image in Inches
+        :return: int
+        """
+        return max(1, int(round(width * self.dpi)))
+
+    def prepare(self, photo: (Path, str), width: float) -> (Path, BytesIO):
+        """
+        Return the photo to be inserted into the document at the given width. Photos that are already small enough and
+        in a format that does not need converting are returned unchanged.
+        :param photo: The photo's file path.
+        :param width: width of the image in Inches
+        :return: The prepared photo's file path, or a stream if no cache directory is used.
+        """
+        photo = Path(photo)
+        target_px = self.target_pixels(width)
+        key = None
+        if self._cache_dir is not None:
+            params = [laundry_version, self.source_digest(photo), target_px, self.dpi, self.jpeg_quality]
+            key = hashlib.sha256(repr(params).encode('utf-8')).hexdigest()
+            for suffix in ('.jpg', '.png', '.src'):
+                t_cached = self._cache_dir.joinpath(key + suffix)
+                if t_cached.exists():
+                    # A '.src' marker records that the source photo did not need to be prepared.
+                    return photo if suffix == '.src' else t_cached
+
+        with self._image.open(photo) as img:
+            t_source_format = img.format
+            if img.width <= target_px and t_source_format in ('JPEG', 'PNG'):
+                if key is not None:
+                    self._cache_dir.joinpath(key + '.src').touch()
+                return photo
+            img.load()
+            exif = img.info.get('exif')
+            has_alpha = img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info
+            if img.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+                img = img.convert('RGBA' if has_alpha else 'RGB')
+            if img.width > target_px:
+                height = max(1, int(round(img.height * target_px / img.width)))
+                img = img.resize((target_px, height), self._image.LANCZOS)
+
+            save_kwargs = {'dpi': (self.dpi, self.dpi)}
+            if has_alpha or t_source_format == 'PNG':
+                t_format, suffix = 'PNG', '.png'
+                save_kwargs['optimize'] = True
+            else:
+                t_format, suffix = 'JPEG', '.jpg'
+                save_kwargs['quality'] = self.jpeg_quality
+                if exif:
+                    save_kwargs['exif'] = exif
+
+            if key is None:
+                stream = BytesIO()
+                img.save(stream, t_format, **save_kwargs)
+                stream.seek(0)
+                return stream
+            t_cached = self._cache_dir.joinpath(key + suffix)
+            # Each writer has its own temporary file, since prefetch threads and worker processes may prepare the
+            # same photo at once.
+            t_fd, t_tmp = tempfile.mkstemp(suffix='.tmp', prefix=key + '.', dir=str(self._cache_dir))
+            try:
+                with os.fdopen(t_fd, 'wb') as f:
+                    img.save(f, t_format, **save_kwargs)
+                os.replace(t_tmp, t_cached)
+            except Exception:
+                os.remove(t_tmp)
+                raise
+            return t_cached
+
+
+class ImageCache:
+    """
+    Hold the photos inserted into output documents in memory, including their bytes, content hash and parsed
+    dimensions, so a photo that appears in more than one document is not read or parsed again. Each photo file is
+    stat'ed once per run to find whether it has changed. The least recently used photos are evicted once the cached
+    bytes exceed max_size_mb.
+    """
+
+    def __init__(self, max_size_mb: float = DEFAULT_IMAGE_CACHE_SIZE_MB, pipeline: ImagePipeline = None):
+        """
+        :param max_size_mb: The maximum size of the cached photos in megabytes. 0 disables the cache.
+        :param pipeline: If provided, photos are prepared by the pipeline before they are cached.
+        """
+        self.max_size: int = int(max_size_mb * 1024 * 1024)
+        self.pipeline: ImagePipeline = pipeline
+        self.hits: int = 0
+        self.misses: int = 0
+        self.size: int = 0
+        self._images: OrderedDict = OrderedDict()
+        # The size and modification time of each photo, by path, read once per run.
+        self._stamps: Dict[str, Tuple[int, int]] = {}
+        # Photos may be loaded by the prefetch threads while the cache is used by the renderer.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._images)
+
+    def key(self, photo: (Path, str), width: float) -> tuple:
+        """
+        :return: The key of the photo at the given width. It changes if the photo file changes between runs, as each
+        photo is only stat'ed the first time it is used after new_run().
+        """
+        t_path = str(photo)
+        stamp = self._stamps.get(t_path)
+        if stamp is None:
+            stat = os.stat(photo)
+            stamp = self._stamps[t_path] = (stat.st_size, stat.st_mtime_ns)
+        # The width only changes the photo if it is resampled.
+        return t_path, stamp[0], stamp[1], width if self.pipeline is not None else None
+
+    def new_run(self):
+        """
+        Start a new run, or request, in which the photos are checked again for changes. The cached photos are kept.
+        :return:
+        """
+        self._stamps.clear()
+
+    def cached(self, key: tuple) -> bool:
+        with self._lock:
+            return key in self._images
+
+    def load(self, photo: (Path, str), width: float) -> DocxImage:
+        """
+        Read, and if there is a pipeline prepare, a photo without using the cache. This may be called by more than one
+        thread at once.
+        :param photo: The photo's file path.
+        :param width: width of the image in Inches
+        :return: docx.image.image.Image
+        """
+        prepared = photo if self.pipeline is None else self.pipeline.prepare(photo, width)
+        return DocxImage.from_file(str(prepared) if isinstance(prepared, (Path, str)) else prepared)
+
+    def get(self, photo: (Path, str), width: float, loaded: Tuple[tuple, DocxImage] = None) -> DocxImage:
+        """
+        Return the photo to be inserted into a document at the given width.
+        :param photo: The photo's file path.
+        :param width: width of the image in Inches
+        :param loaded: The key and image of the photo if it has already been loaded, see laundry.prefetch. The image
+        is None if the photo was cached when it was loaded.
+        :return: docx.image.image.Image
+        """
+        key = self.key(photo, width) if loaded is None else loaded[0]
+        with self._lock:
+            image = self._images.get(key)
+            if image is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return image
+            self.misses += 1
+
+        image = loaded[1] if loaded is not None and loaded[1] is not None else self.load(photo, width)
+        if len(image.blob) <= self.max_size:
+            with self._lock:
+                if key not in self._images:
+                    self._images[key] = image
+                    self.size += len(image.blob)
+                    self.evict()
+        return image
+
+    def evict(self):
+        """
+        Remove the least recently used photos until the cache is within its maximum size. The caller holds the lock.
+        :return:
+        """
+        while self.size > self.max_size and self._images:
+            _, image = self._images.popitem(last=False)
+            self.size -= len(image.blob)
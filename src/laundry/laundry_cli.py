@@ -1,9 +1,159 @@
 import click
 from laundry.constants import laundry_version
 from laundry.laundryclass import Laundry
+from laundry.worksheet_cache import DEFAULT_CACHE_SIZE_MB
+from laundry.readers import READER_ENGINES, DEFAULT_READER
+from laundry.images import DEFAULT_IMAGE_CACHE_SIZE_MB
+from laundry.prefetch import DEFAULT_PREFETCH_THREADS, DEFAULT_PREFETCH_SIZE_MB
+from laundry.log import LOG_LEVELS, LOG_FORMATS, DEFAULT_LOG_FORMAT, configure_logging
+from laundry.watch import watch as watch_input_file, DEFAULT_INTERVAL
+from laundry.serve import serve as serve_requests, DEFAULT_HOST, DEFAULT_PORT, DEFAULT_QUEUE_SIZE, \
+    DEFAULT_MAX_REQUEST_MB
+from pandas.api.types import pandas_dtype
+from typing import Dict, Tuple
 from pathlib import Path
 
 
+def parse_dtypes(ctx, param, values: Tuple[str]) -> Dict[str, str]:
+    """
+    Convert the --dtype options, each of the form <column>=<dtype>, into a dict.
+    """
+    dtypes = {}
+    for value in values:
+        column, _, dtype = value.partition('=')
+        if column.strip() == '' or dtype.strip() == '':
+            raise click.BadParameter(f'{value!r} must take the form <column>=<dtype>.')
+        try:
+            pandas_dtype(dtype.strip())
+        except (TypeError, ValueError, ImportError) as e:
+            raise click.BadParameter(f'{dtype.strip()!r} is not a valid dtype: {e}')
+        dtypes[column.strip()] = dtype.strip()
+    return dtypes
+
+
+def shared_options(*options):
+    """
+    Combine options used by more than one command into a single decorator. The options are listed in the command's
+    help in the order given.
+    :param options: The click.option() decorators.
+    :return: The decorator.
+    """
+    def decorator(command):
+        for option in reversed(options):
+            command = option(command)
+        return command
+    return decorator
+
+
+verbose_option = click.option(
+    '--verbose', '-v', 'verbose',
+    default=True,
+    type=bool,
+    help="Flag to allow verbose output to the CLI for fault finding issues. The default is True.")
+
+cache_options = shared_options(
+    click.option('--cache-dir', 'cache_dir',
+                 default=None,
+                 type=click.Path(file_okay=False),
+                 help="Directory used to cache the cleaned worksheets between runs. Worksheets are only parsed again "
+                      "when the input file changes. Use a directory that only you can write to: entries that cannot be "
+                      "stored as Parquet are pickled, and are only read from a directory that you own and that is "
+                      "not writable by everyone. The cache is not used by default."),
+    click.option('--cache-size', 'cache_size',
+                 default=DEFAULT_CACHE_SIZE_MB,
+                 type=click.IntRange(min=1),
+                 help=f"The maximum size of the cache directory in megabytes. The default is "
+                      f"{DEFAULT_CACHE_SIZE_MB}."))
+
+reader_option = click.option(
+    '--reader', 'reader',
+    default=DEFAULT_READER,
+    type=click.Choice(list(READER_ENGINES)),
+    help=f"The engine used to read the input file. 'openpyxl-stream' streams worksheet values to reduce memory use, "
+         f"'calamine' uses a faster native parser if python-calamine is installed. The default is '{DEFAULT_READER}'.")
+
+photo_options = shared_options(
+    click.option('--photo-dpi', 'photo_dpi',
+                 default=None,
+                 type=click.IntRange(min=1),
+                 help="Resample photos to this resolution, in dots per inch, before they are inserted. TIFF photos "
+                      "are converted to JPEG or PNG. Photos are inserted unchanged by default. Requires Pillow."),
+    click.option('--image-cache-dir', 'image_cache_dir',
+                 default=None,
+                 type=click.Path(file_okay=False),
+                 help="Directory used to store resampled photos between runs. Used with --photo-dpi."),
+    click.option('--image-cache-size', 'image_cache_size',
+                 default=DEFAULT_IMAGE_CACHE_SIZE_MB,
+                 show_default=True,
+                 type=click.IntRange(min=0),
+                 help="Maximum size, in megabytes, of the photos held in memory and reused by later output files."),
+    click.option('--prefetch-threads', 'prefetch_threads',
+                 default=DEFAULT_PREFETCH_THREADS,
+                 show_default=True,
+                 type=click.IntRange(min=0),
+                 help="The number of threads that read photos ahead of the rows being rendered, so photos on slow or "
+                      "network drives are read while earlier rows render. 0 reads each photo as it is rendered."),
+    click.option('--prefetch-size', 'prefetch_size',
+                 default=DEFAULT_PREFETCH_SIZE_MB,
+                 show_default=True,
+                 type=click.IntRange(min=1),
+                 help="Maximum size, in megabytes, of the photos read ahead of the rows being rendered."))
+
+output_options = shared_options(
+    click.option('--max-rows-per-file', 'max_rows_per_file',
+                 default=None,
+                 type=click.IntRange(min=1),
+                 help="Split each output file into volumes of at most this many data rows, named <output>_001.docx, "
+                      "<output>_002.docx and so on, with an index of the rows in each volume."),
+    click.option('--max-output-mb', 'max_output_mb',
+                 default=None,
+                 type=click.FloatRange(min=0, min_open=True),
+                 help="Split each output file into volumes once the text and photos in a volume exceed this size in "
+                      "megabytes."),
+    click.option('--stream/--no-stream', 'stream_output',
+                 default=False,
+                 show_default=True,
+                 help="Write each output file as its data rows are rendered, rather than holding the whole document "
+                      "in memory until it is saved."),
+    click.option('--dtype', 'dtypes',
+                 multiple=True,
+                 callback=parse_dtypes,
+                 metavar='COLUMN=DTYPE',
+                 help="The pandas dtype used to hold a data worksheet column, e.g. 'component=category'. Can be used "
+                      "more than once."))
+
+profile_options = shared_options(
+    click.option('--profile', 'profile',
+                 is_flag=True,
+                 default=False,
+                 help="Report the time and peak memory used by each phase of each batch row, with the sections and "
+                      "photos rendered into each output file."),
+    click.option('--profile-json', 'profile_json',
+                 default=None,
+                 type=click.Path(dir_okay=False),
+                 help="Also write the profile report to this JSON file. Implies --profile."),
+    click.option('--profile-render', 'profile_render',
+                 default=None,
+                 type=click.Path(dir_okay=False),
+                 help="Profile the render phase using cProfile and write the statistics to this file. Implies "
+                      "--profile."))
+
+log_format_option = click.option(
+    '--log-format', 'log_format',
+    default=DEFAULT_LOG_FORMAT,
+    show_default=True,
+    type=click.Choice(LOG_FORMATS),
+    help="The format of the console output. 'json' writes one JSON object per line for log collectors.")
+
+log_options = shared_options(
+    click.option('--log-level', 'log_level',
+                 default=None,
+                 type=click.Choice(list(LOG_LEVELS)),
+                 help="The level of the console output. 'debug' also prints each worksheet as it is checked, "
+                      "'notice' prints only the output files and errors. The default is 'info' if --verbose is True "
+                      "and 'notice' otherwise."),
+    log_format_option)
+
 
 @click.group()
 @click.version_option(laundry_version)
@@ -19,7 +169,8 @@ def cli():
 @click.option('--data-worksheet', '-dw', 'data',
               default='Master List',
               help='Name of the worksheet containing the cell_data to be converted into a '
-                   'word document. '
+                   'word document, or a data source URI such as "csv:data.csv", "parquet:data.parquet" or '
+                   '"sqlite:data.db#table". '
                    'The default is "Master List".'
               )
 @click.option('--template', '-t', 'template',
@@ -38,15 +189,22 @@ def cli():
               help="The row number of the cell_data worksheet's row containing the column "
                    "headers. The default is 0."
               )
-@click.option('--verbose', '-v', 'verbose',
-              default=True,
-              type=bool,
-              help="Flag to allow verbose output to the CLI for fault finding issues. The default is True.")
+@verbose_option
+@cache_options
+@reader_option
+@photo_options
+@output_options
+@profile_options
+@log_options
 @click.argument('input_file',
                 type=click.Path(exists=True)
                 )
 @click.argument('output_file')
-def single(input_file: str, output_file: str, data: str, structure: str, template: str, data_head: int, verbose: bool):
+def single(input_file: str, output_file: str, data: str, structure: str, template: str, data_head: int, verbose: bool,
+           cache_dir: str, cache_size: int, reader: str, photo_dpi: int, image_cache_dir: str,
+           image_cache_size: int, prefetch_threads: int, prefetch_size: int, max_rows_per_file: int,
+           max_output_mb: float, stream_output: bool, dtypes: Dict[str, str], profile: bool, profile_json: str,
+           profile_render: str, log_level: str, log_format: str):
     """
     Run laundry on a single worksheet.
 
@@ -65,7 +223,12 @@ def single(input_file: str, output_file: str, data: str, structure: str, templat
     template: str = template
     verbose: bool = verbose
     Laundry(file_input, data_worksheet=wkst_data, structure_worksheet=wkst_struct, template_file=template,
-            header_row=data_head, output_file=file_output, verbose=verbose)
+            header_row=data_head, output_file=file_output, verbose=verbose, cache_dir=cache_dir,
+            cache_size_mb=cache_size, reader=reader, photo_dpi=photo_dpi, image_cache_dir=image_cache_dir,
+            image_cache_size_mb=image_cache_size, max_rows_per_file=max_rows_per_file, max_output_mb=max_output_mb,
+            stream_output=stream_output, dtypes=dtypes, profile=profile, profile_json=profile_json,
+            profile_render=profile_render, log_level=log_level, log_format=log_format,
+            prefetch_threads=prefetch_threads, prefetch_size_mb=prefetch_size)
 
 
 @cli.command()
@@ -75,21 +238,157 @@ def single(input_file: str, output_file: str, data: str, structure: str, templat
                    'worksheet defines the structure and cell_data worksheets and '
                    'other higher level formatting details. The default batch '
                    'worksheet name is "_batch".')
-@click.option('--verbose', '-v', 'verbose',
-              default=True,
-              type=bool,
-              help="Flag to allow verbose output to the CLI for fault finding issues. The default is True.")
+@verbose_option
+@click.option('--jobs', '-j', 'jobs',
+              default=1,
+              type=click.IntRange(min=0),
+              help="The number of worker processes used to produce the output files. Use 0 to use all available "
+                   "cores. The default is 1.")
+@click.option('--pipeline-depth', 'pipeline_depth',
+              default=0,
+              show_default=True,
+              type=click.IntRange(min=0),
+              help="With a single job, load and check up to this many batch rows ahead on one thread, and save up to "
+                   "this many output files on another, while each batch row is rendered. 0 washes the batch rows one "
+                   "at a time.")
+@cache_options
+@reader_option
+@photo_options
+@output_options
+@profile_options
+@log_options
+@click.option('--incremental/--no-incremental', 'incremental',
+              default=False,
+              show_default=True,
+              help="Only rebuild the output files whose inputs have changed since they were last built, as recorded in "
+                   "a .laundry-manifest.json file in each output directory. By default every output file is rebuilt "
+                   "without reading or writing the manifests.")
+@click.option('--force', 'force',
+              is_flag=True,
+              default=False,
+              help="Rebuild every output file of an incremental run and record their inputs. Without --force an "
+                   "incremental run only rebuilds an output file if its data rows, structure worksheet, template file "
+                   "or photos have changed since it was last built.")
 @click.argument('input_file',
                 type=click.Path(exists=True)
                 )
-def multi(input_file: (Path, str), batch: str, verbose: bool):
+def multi(input_file: (Path, str), batch: str, verbose: bool, jobs: int, pipeline_depth: int, cache_dir: str,
+          cache_size: int, reader: str, photo_dpi: int, image_cache_dir: str,
+          image_cache_size: int, prefetch_threads: int, prefetch_size: int, max_rows_per_file: int,
+          max_output_mb: float, stream_output: bool, dtypes: Dict[str, str], profile: bool, profile_json: str,
+          profile_render: str, log_level: str, log_format: str, incremental: bool, force: bool):
     """
     Run Laundry on multiple worksheets.
+
+    When more than one job is used the output of each batch row is printed in batch order, followed by a summary of
+    the rows that succeeded and failed.
+
+    Every output file is rebuilt unless --incremental is given, in which case output files whose inputs have not changed
+    since they were last built are skipped. The inputs of each output file are recorded in a .laundry-manifest.json
+    file in its directory. The watch command is always incremental.
     """
     file_input: Path = Path(input_file)
     wksht_batch: str = batch
     verbose: bool = verbose
-    Laundry(file_input, batch_worksheet=wksht_batch, verbose=verbose)
+    Laundry(file_input, batch_worksheet=wksht_batch, verbose=verbose, jobs=jobs, cache_dir=cache_dir,
+            cache_size_mb=cache_size, reader=reader, photo_dpi=photo_dpi, image_cache_dir=image_cache_dir,
+            image_cache_size_mb=image_cache_size, max_rows_per_file=max_rows_per_file, max_output_mb=max_output_mb,
+            stream_output=stream_output, dtypes=dtypes, profile=profile, profile_json=profile_json,
+            profile_render=profile_render, log_level=log_level, log_format=log_format, incremental=incremental,
+            force=force, prefetch_threads=prefetch_threads, prefetch_size_mb=prefetch_size,
+            pipeline_depth=pipeline_depth)
+
+
+@cli.command()
+@click.option('--batch-worksheet', '-b', 'batch',
+              default='_batch',
+              help='Name of the worksheet containing the batch details. The default batch worksheet name is "_batch".')
+@verbose_option
+@click.option('--interval', 'interval',
+              default=DEFAULT_INTERVAL,
+              show_default=True,
+              type=click.FloatRange(min=0.1),
+              help="The number of seconds between checks for changes to the input file, templates and photos.")
+@reader_option
+@photo_options
+@output_options
+@log_options
+@click.argument('input_file',
+                type=click.Path(exists=True)
+                )
+def watch(input_file: str, batch: str, verbose: bool, interval: float, reader: str, photo_dpi: int,
+          image_cache_dir: str, image_cache_size: int, prefetch_threads: int, prefetch_size: int,
+          max_rows_per_file: int, max_output_mb: float, stream_output: bool, dtypes: Dict[str, str], log_level: str,
+          log_format: str):
+    """
+    Run Laundry on multiple worksheets each time the input file is saved.
+
+    The parsed worksheets, templates and photos are kept in memory between runs. Only the worksheets that have changed
+    are parsed again, and only the output files whose data rows, structure worksheet, template file or photos have
+    changed are rebuilt. Press Ctrl+C to stop.
+    """
+    watch_input_file(Path(input_file), interval=interval, image_cache_size_mb=image_cache_size,
+                     batch_worksheet=batch, verbose=verbose, reader=reader, photo_dpi=photo_dpi,
+                     image_cache_dir=image_cache_dir, max_rows_per_file=max_rows_per_file, max_output_mb=max_output_mb,
+                     stream_output=stream_output, dtypes=dtypes, log_level=log_level, log_format=log_format,
+                     prefetch_threads=prefetch_threads, prefetch_size_mb=prefetch_size)
+
+
+@cli.command()
+@click.option('--host', 'host',
+              default=DEFAULT_HOST,
+              show_default=True,
+              help="The host to listen on. Use 0.0.0.0 to accept requests from other machines.")
+@click.option('--port', 'port',
+              default=DEFAULT_PORT,
+              show_default=True,
+              type=click.IntRange(min=0, max=65535),
+              help="The port to listen on.")
+@click.option('--templates', 'templates_dir',
+              default=None,
+              type=click.Path(exists=True, file_okay=False),
+              help="Directory holding the templates. A request names a template by its file name without '.docx'.")
+@click.option('--root', 'root',
+              default=None,
+              type=click.Path(exists=True, file_okay=False),
+              help="Directory that the photo paths of the structure worksheets are relative to. Photo paths outside it "
+                   "are refused. The default is the current directory.")
+@click.option('--workers', '-j', 'workers',
+              default=None,
+              type=click.IntRange(min=1),
+              help="The number of worker processes that render documents. The default is the number of cores.")
+@click.option('--queue-size', 'queue_size',
+              default=DEFAULT_QUEUE_SIZE,
+              show_default=True,
+              type=click.IntRange(min=0),
+              help="The number of requests held while every worker is busy. Further requests are refused with 503.")
+@click.option('--max-request-size', 'max_request_mb',
+              default=DEFAULT_MAX_REQUEST_MB,
+              show_default=True,
+              type=click.FloatRange(min=0, min_open=True),
+              help="The largest request accepted, in megabytes.")
+@photo_options
+@click.option('--log-level', 'log_level',
+              default='info',
+              show_default=True,
+              type=click.Choice(list(LOG_LEVELS)),
+              help="The level of the console output. Each request is logged at 'info'.")
+@log_format_option
+def serve(host: str, port: int, templates_dir: str, root: str, workers: int, queue_size: int, max_request_mb: float,
+          photo_dpi: int, image_cache_dir: str, image_cache_size: int, prefetch_threads: int, prefetch_size: int,
+          log_level: str, log_format: str):
+    """
+    Run a local HTTP service that renders documents.
+
+    POST a workbook, or JSON structure and data, to /render with the id of a template and the rendered .docx is
+    returned. The worker processes keep the templates, photo indexes and photos they have read between requests. GET
+    /status reports the queue depth, request counts and latency. Press Ctrl+C to stop.
+    """
+    configure_logging(log_level, log_format)
+    serve_requests(host, port, max_request_mb, templates_dir=templates_dir, root=root, workers=workers,
+                   queue_size=queue_size, photo_dpi=photo_dpi, image_cache_dir=image_cache_dir,
+                   image_cache_size_mb=image_cache_size, prefetch_threads=prefetch_threads,
+                   prefetch_size_mb=prefetch_size)
 
 
 @cli.command()
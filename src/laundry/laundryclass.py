@@ -1,68 +1,68 @@
 """Main class for laundry. This is intended to replace the original laundry script."""
 
-from laundry.constants import data_frame, invalid, photo_formats
-from typing import Dict, List, Iterable, Tuple, NamedTuple, Any
+from laundry.constants import data_frame, invalid, photo_formats, EXPECTED_BATCH_HEADERS, VOLUME_BATCH_HEADERS, \
+    EXPECTED_STRUCTURE_HEADERS, EXPECTED_SECTION_TYPES, PARAGRAPH_SECTION_TYPES
+from laundry.worksheet_cache import WorksheetCache, DEFAULT_CACHE_SIZE_MB, file_digest
+from laundry.readers import WorkbookReader, ColumnProjection, open_workbook, DEFAULT_READER, PARSER_NA_OPTIONS
+from laundry.sources import DataSource, parse_source
+from laundry.photos import PhotoIndex
+from laundry.images import ImagePipeline, ImageCache, DEFAULT_IMAGE_CACHE_SIZE_MB
+from laundry.streaming import StreamingDocument
+from laundry.prefetch import PhotoPrefetcher, PrefetchStats, DEFAULT_PREFETCH_THREADS, DEFAULT_PREFETCH_SIZE_MB
+from laundry.pipeline import BatchPipeline
+from laundry.templates import new_document
+from laundry.filters import RowFilter, RowPrefilter, parse_filters, filter_mask
+from laundry.profiling import RunProfile
+from laundry.validation import ValidationReport, ValidationError, validate_batch, validate_structure, \
+    validate_photos, find_photo
+from laundry.manifest import BuildManifest, BuildRecord, frame_digest, options_digest, file_stat
+from laundry.log import log, notice, style, configure_logging, captured, replay, DEFAULT_LOG_FORMAT, OUTPUT_TITLE, \
+    OUTPUT_TEXT, EXCEPTION_TEXT, DATAFRAME_TITLE, DATAFRAME_TEXT, FAULTFIND_TEXT, OUTPUT_SUCCESS
+from typing import Dict, List, Iterable, Tuple, NamedTuple, Any, BinaryIO
 from docx import Document
 from docx.shared import Inches
+from docx.table import _Cell
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.shape import CT_Inline
 from pathlib import Path, PurePath
+from concurrent.futures import Future, ProcessPoolExecutor
+from collections import Counter
+from types import SimpleNamespace
+from functools import partial
+import copy
+import logging
+import os
 import janitor
 import pandas as pd
 from colorama import init as colorama_init
-from colorama import Fore, Back, Style
 from sys import exit as sys_exit
 
 colorama_init(autoreset=True)
 
-# Define headers for the batch and structure worksheets. These are fixed.
-EXPECTED_BATCH_HEADERS = ['data_worksheet', 'structure_worksheet', 'header_row', 'drop_empty_columns', 'template_file',
-                          'filter_rows', 'output_file']
-EXPECTED_STRUCTURE_HEADERS = ['section_type', 'section_contains', 'section_style', 'title_style', 'section_break',
-                              'page_break', 'path']
-EXPECTED_SECTION_TYPES = ['heading', 'table', 'para', 'photo']
-OUTPUT_TITLE = {'fore_colour': 'GREEN', 'style_colour': 'BRIGHT'}
-OUTPUT_TEXT = {'fore_colour': 'GREEN', 'style_colour': 'DIM'}
-EXCEPTION_TEXT = {'fore_colour': 'RED', 'style_colour': 'BRIGHT'}
-DATAFRAME_TITLE = {'fore_colour': 'BLUE', 'style_colour': 'BRIGHT'}
-DATAFRAME_TEXT = {'fore_colour': 'BLACK', 'back_colour': 'BLUE'}
-FAULTFIND_TEXT = {'fore_colour': 'BLACK', 'back_colour': 'GREEN'}
-OUTPUT_SUCCESS = {'fore_colour': 'CYAN', 'back_colour': 'BLACK', 'style_colour': 'BRIGHT'}
+# The width of photos in the output document, in inches.
+PHOTO_WIDTH = 4
 
 
-def exit_app():
-    sys_exit()
-
-
-def print_verbose(text: (str, Exception), verbose: bool, fore_colour: str = 'RESET', back_colour: str = 'RESET',
-                  style_colour: str = 'NORMAL', end: str = '\n', flush: bool = True):
+def exit_app(status: int = None):
     """
-    A function to provide clearer informaiton to the user at the command line.
-    :param text: Text to be printed
-    :param verbose: Is the text to be output.
-    :param fore_colour: The text's colour.
-    :param back_colour: The background colour.
-    :param style_colour: The text style.
-    :param end:
-    :param flush:
+    End the process. A run that fails its checks or a batch row exits with status 1, so the shell and CI see the
+    failure whether or not the batch rows were washed in worker processes.
+    :param status: The exit status.
     :return:
     """
-    if verbose is False:
-        return
-    fore = {'BLACK': Fore.BLACK, 'RED': Fore.RED, 'GREEN': Fore.GREEN, 'YELLOW': Fore.YELLOW, 'BLUE': Fore.BLUE,
-            'MAGENTA': Fore.MAGENTA, 'CYAN': Fore.CYAN, 'WHITE': Fore.WHITE, 'RESET': Fore.RESET}
-
-    back = {'BLACK': Back.BLACK, 'RED': Back.RED, 'GREEN': Back.GREEN, 'YELLOW': Back.YELLOW, 'BLUE': Back.BLUE,
-            'MAGENTA': Back.MAGENTA, 'CYAN': Back.CYAN, 'WHITE': Back.WHITE, 'RESET': Back.RESET}
+    sys_exit(status)
 
-    style = {'DIM': Style.DIM, 'NORMAL': Style.NORMAL, 'BRIGHT': Style.BRIGHT, 'RESET_ALL': Style.RESET_ALL}
 
-    if fore_colour is not None:
-        fore = fore[fore_colour.upper()]
-    if back_colour is not None:
-        back = back[back_colour.upper()]
-    if style_colour is not None:
-        style = style[style_colour.upper()]
-
-    print(f'{fore}{back}{style}{text}{Style.RESET_ALL}', end=end, flush=flush)
+def log_error_count(count: int):
+    """
+    Log the number of errors found by a check, or Ok when there are none.
+    :param count: The number of errors.
+    :return:
+    """
+    if count:
+        log.info('%s errors', count)
+    else:
+        log.info('Ok')
 
 
 def split_str(data_str: str) -> List[str]:
@@ -121,7 +121,7 @@ def resolve_file_path(path: (Path, str)) -> (Path, Exception):
         p = Path(q).resolve(strict=True)
         return p
     except Exception as e:
-        print_verbose(f'{e}', True, **EXCEPTION_TEXT)
+        log.error('%s', e)
 
 
 def values_exist(expected: set, actual: set) -> bool:
@@ -148,6 +148,132 @@ def strip_whitespace(wht_spc: List) -> List:
     return i
 
 
+# The spreadsheets and parsed worksheets held by a worker process, keyed by the spreadsheet's file path.
+_worker_washing_baskets: Dict[Tuple[str, str], Tuple[WorkbookReader, Dict[tuple, pd.DataFrame]]] = {}
+# The image cache of each worker process, keyed by the options that created it, is shared by the rows it washes.
+_worker_image_caches: Dict[str, ImageCache] = {}
+
+
+class SessionCaches(NamedTuple):
+    """
+    The state kept between runs of the same input file by a long running process, such as laundry watch. The owner of
+    the caches removes the worksheets that have changed before each run.
+    """
+    worksheet_frames: Dict[tuple, pd.DataFrame]
+    image_cache: ImageCache
+    manifest: BuildManifest
+
+
+class BatchResult(NamedTuple):
+    """The outcome of washing a single batch worksheet row."""
+    index: Any
+    output_file: str
+    success: bool
+    message: str = ''
+    # The messages logged while washing the row in a worker process, as kept by log.RecordCapture.
+    records: List[Dict] = None
+    image_hits: int = 0
+    image_misses: int = 0
+    profile: Dict = None
+    build: BuildRecord = None
+    prefetch: Dict = None
+
+
+class PreparedRow(NamedTuple):
+    """A batch row whose worksheets have been loaded, filtered and checked, ready to be rendered."""
+    batch_row: Any
+    structure: pd.DataFrame
+    data: pd.DataFrame
+    # The inputs of the output file if the run is incremental, otherwise None.
+    build: BuildRecord = None
+
+    @property
+    def skipped(self) -> bool:
+        """True if the output file is up to date and is not rendered."""
+        return self.build is not None and self.build.skipped
+
+
+def wash_batch_row_worker(input_fp: Path, sheets_actual: List[str], batch_row: Dict, options: Dict) -> BatchResult:
+    """
+    Wash a single batch row inside a worker process. The messages logged while washing the row are captured and
+    returned with the result so the parent process can log them in batch order.
+    :param input_fp: The resolved file path to the spreadsheet containing the data.
+    :param sheets_actual: The worksheet names contained within the spreadsheet.
+    :param batch_row: A checked batch worksheet row as a dict, including its 'Index'.
+    :param options: The keyword arguments passed to Laundry.worker_instance(), as returned by Laundry.worker_options().
+    :return: BatchResult
+    """
+    success, message = True, 'Ok'
+    image_hits = image_misses = 0
+    profile = build = prefetch = None
+    with captured() as capture:
+        try:
+            laundry = Laundry.worker_instance(input_fp, sheets_actual, batch_row, **options)
+            image_hits, image_misses = laundry._image_cache.hits, laundry._image_cache.misses
+            build = laundry.wash_batch_row(SimpleNamespace(**batch_row))
+            if build is not None and build.skipped:
+                message = 'Up to date'
+            image_hits = laundry._image_cache.hits - image_hits
+            image_misses = laundry._image_cache.misses - image_misses
+            if laundry._profile.enabled:
+                profile = laundry._profile.export()
+            prefetch = laundry._prefetch_stats.export()
+        except SystemExit:
+            success, message = False, 'Batch row failed its checks.'
+        except Exception as e:
+            success, message = False, f'{type(e).__name__}: {e}'
+    return BatchResult(batch_row['Index'], str(batch_row['output_file']), success, message, capture.records,
+                       image_hits, image_misses, profile, build, prefetch)
+
+
+class SectionOp(NamedTuple):
+    """
+    A single compiled element of the structure worksheet. All of the string handling required to render the element
+    is resolved when the plan is compiled so it is not repeated for every data row.
+    """
+    section_type: str
+    positions: Tuple[int, ...]
+    title: str = None
+    headers: Tuple[str, ...] = ()
+    section_style: str = None
+    title_style: str = None
+    section_break: bool = False
+    page_break: bool = False
+
+
+def compile_render_plan(structure: pd.DataFrame, columns: List[str]) -> List[SectionOp]:
+    """
+    Compile the structure worksheet into a list of SectionOps that can be run against each data row. The positions
+    held by each SectionOp index the tuples returned by DataFrame.itertuples(name=None), i.e. position 0 is the index.
+    :param structure: The structure worksheet DataFrame.
+    :param columns: The column names of the data worksheet DataFrame.
+    :return: List[SectionOp]
+    """
+    position = {col: idx for idx, col in enumerate(columns, 1)}
+    plan: List[SectionOp] = []
+    for structure_element in structure.itertuples():
+        sect_contains_element: str = str(structure_element.section_contains).lower()
+        sect_type_element: str = str(structure_element.section_type).lower()
+        op = SectionOp('unknown', (), section_style=str(structure_element.section_style),
+                       title_style=str(structure_element.title_style),
+                       section_break=structure_element.section_break is True,
+                       page_break=structure_element.page_break is True)
+
+        if sect_type_element in PARAGRAPH_SECTION_TYPES:
+            op = op._replace(section_type='paragraph', positions=(position[sect_contains_element],),
+                             title=sect_contains_element.title())
+
+        elif sect_type_element == 'table':
+            table_col_hdr = split_str(sect_contains_element)
+            op = op._replace(section_type='table', positions=tuple(position[col] for col in table_col_hdr),
+                             headers=tuple(remove_underscore(col).title() for col in table_col_hdr))
+
+        elif sect_type_element == 'photo':
+            op = op._replace(section_type='photo', positions=(position[sect_contains_element],))
+        plan.append(op)
+    return plan
+
+
 class SingleLoad:
     """
     This class is intended to replace the original Laundry's procedural approach from the single load function.
@@ -155,72 +281,193 @@ class SingleLoad:
     Assumptions
     1. The file paths passed are correct and have already been checked.
     2. Data passed to the class is in the correct format.
-    3. The output file will be created by the object.
+    3. The output file will be created by the object, or the document written to the output stream.
     """
 
-    def __init__(self, structure_data: pd.DataFrame, data_data: pd.DataFrame, file_template: Path,
-                 file_output_path: Path):
+    def __init__(self, structure_data: pd.DataFrame, data_data: pd.DataFrame, file_template: (Path, bytes),
+                 file_output_path: (Path, BinaryIO), image_cache: ImageCache = None, max_rows_per_file: int = None,
+                 max_output_mb: float = None, stream: bool = False, profile: RunProfile = None,
+                 prefetch_threads: int = DEFAULT_PREFETCH_THREADS, prefetch_size_mb: float = DEFAULT_PREFETCH_SIZE_MB,
+                 prefetch_stats: PrefetchStats = None, issue: bool = True):
         """
         # The method signature is based on the laundry.single_load() function. This calls self.format_docx()
         :param structure_data: A dictionary that defines the structure of the documentation.
         :param data_data: A dictionary that contains the cell_data to be formatted.
-        :param file_template: The Word .docx file that contains the formatting styles to be used.
-        :param file_output_path: The path to the output file location.
+        :param file_template: The Word .docx file that contains the formatting styles to be used, or its bytes.
+        :param file_output_path: The path to the output file location, or a writable binary stream that the document
+        is written to. An output that is split into volumes must be a path.
+        :param image_cache: The cache of photos shared with other documents. If not provided the photos are only
+        shared within this document.
+        :param max_rows_per_file: If provided, the output is split into volumes of at most this many data rows.
+        :param max_output_mb: If provided, the output is split into volumes once the text and photos added to a volume
+        exceed this size in megabytes.
+        :param stream: If True, the document is written to the output file as each data row is rendered rather than
+        when it is complete. See laundry.streaming.
+        :param profile: The profile that the render and save phases are recorded in.
+        :param prefetch_threads: The number of threads that load photos ahead of the renderer. If 0 the photos are
+        read as they are rendered. See laundry.prefetch.
+        :param prefetch_size_mb: The memory budget of the photos loaded ahead of the renderer.
+        :param prefetch_stats: The stats that the time spent waiting for photos is added to.
+        :param issue: If False the document is rendered but not saved. Call issue() to save it, which may be done on
+        another thread. Volumes before the last are still saved as they are filled.
         """
         self._structure: pd.DataFrame = structure_data
         self._data: pd.DataFrame = data_data
-        self._file_template: Document() = Document(file_template)
-        self._file_output: Path = Path(file_output_path)
+        self._template_path: (Path, bytes) = file_template
+        # The document is written to the stream, if given, in place of the output file.
+        self._output_stream: BinaryIO = file_output_path if hasattr(file_output_path, 'write') else None
+        self._file_output: Path = Path(file_output_path) if self._output_stream is None else None
+        self._image_cache: ImageCache = image_cache if image_cache is not None else ImageCache()
         self._row_data: List[Dict] = list()
-        self.start_wash()
+        self._max_rows_per_file: int = max_rows_per_file
+        self._max_output_bytes: int = None if max_output_mb is None else int(max_output_mb * 1024 * 1024)
+        self._stream: bool = stream
+        self._writer: StreamingDocument = None
+        # Each volume is saved and released before the next is started. volumes records the rows in each volume.
+        self.volumes: List[Dict[str, Any]] = []
+        self._profile: RunProfile = profile if profile is not None else RunProfile()
+        # What has been rendered, for the profile report. image_bytes counts each photo once per volume.
+        self.section_counts: Dict[str, int] = {}
+        self.photo_count: int = 0
+        self.image_bytes: int = 0
+        self._prefetch_threads: int = prefetch_threads
+        self._prefetch_size_mb: float = prefetch_size_mb
+        self._prefetcher: PhotoPrefetcher = None
+        self.prefetch_stats: PrefetchStats = prefetch_stats if prefetch_stats is not None else PrefetchStats()
+        if self._output_stream is not None and self.split_volumes:
+            raise ValueError('An output that is split into volumes must be written to a file path, not a stream.')
+        with self._profile.phase('render'):
+            self.start_volume()
+            self.start_wash()
+        if issue:
+            self.issue()
+
+    def issue(self):
+        """
+        Save the rendered document, or its last volume and the volume index.
+        :return:
+        """
         self.issue_document()
+        if self.split_volumes:
+            self.issue_volume_index()
+        if self._output_stream is None:
+            notice('\nDocument %s completed', self._file_output, extra=style(output_file=str(self._file_output)))
+
+    @property
+    def split_volumes(self) -> bool:
+        return self._max_rows_per_file is not None or self._max_output_bytes is not None
+
+    @property
+    def output(self) -> (Path, BinaryIO):
+        """The output stream, or if there is none the output file."""
+        return self._output_stream if self._output_stream is not None else self._file_output
+
+    @property
+    def output_files(self) -> List[Path]:
+        """The files written: the output file, or each volume and the volume index. None are written to a stream."""
+        if self._output_stream is not None:
+            return []
+        if not self.split_volumes:
+            return [self._file_output]
+        return [self._file_output.with_name(volume['output_file']) for volume in self.volumes] + \
+            [self._file_output.with_name(f'{self._file_output.stem}_index.csv')]
+
+    def start_volume(self):
+        """
+        Start a new output document from the template.
+        :return:
+        """
+        if self._stream:
+            t_output = self.volume_path(len(self.volumes) + 1) if self.split_volumes else self.output
+            self._writer = StreamingDocument(self._template_path, t_output)
+            self._file_template: Document() = self._writer.document
+        else:
+            self._file_template: Document() = new_document(self._template_path)
+        # The image parts of the document by hash, so photos used more than once are only added once.
+        self._image_parts: Dict[str, Any] = {part.sha1: part for part in self._file_template.part.package.image_parts}
+        self._volume_rows: List = []
+        self._volume_bytes: int = 0
 
-    def start_wash(self):
+    def volume_full(self) -> bool:
         """
-        Start formatting the output document.
+        Return True if the current volume has reached the maximum number of rows or size. The size is estimated from
+        the text and photos added, since the document is not serialised until it is saved.
+        :return: bool
         """
-        for row in self._data.itertuples():
-            self.format_docx(row)
+        if len(self._volume_rows) == 0:
+            return False
+        if self._max_rows_per_file is not None and len(self._volume_rows) >= self._max_rows_per_file:
+            return True
+        return self._max_output_bytes is not None and self._volume_bytes >= self._max_output_bytes
 
-        print_verbose(f'\nDocument {self._file_output} completed', True, **OUTPUT_SUCCESS)
+    def volume_path(self, volume: int) -> Path:
+        """
+        The file path of a volume. Volumes are numbered from 1, for example output_001.docx.
+        :param volume: The volume number.
+        :return: Path
+        """
+        return self._file_output.with_name(f'{self._file_output.stem}_{volume:03d}{self._file_output.suffix}')
 
-    def format_docx(self, row: NamedTuple):
+    def start_wash(self):
+        """
+        Start formatting the output document. The structure is compiled into a render plan once, and the plan is run
+        against each row of the data. The photos of the rows are loaded ahead of the renderer.
+        """
+        self._render_plan: List[SectionOp] = compile_render_plan(self._structure, list(self._data.columns))
+        t_threads = self._prefetch_threads if any(op.section_type == 'photo' for op in self._render_plan) else 0
+        with PhotoPrefetcher(self._image_cache, self.photo_sequence(), t_threads, self._prefetch_size_mb,
+                             self.prefetch_stats) as self._prefetcher:
+            for row in self._data.itertuples(name=None):
+                if self.split_volumes and self.volume_full():
+                    self.issue_document()
+                    self.start_volume()
+                self.format_docx(row)
+                self._volume_rows.append(row[0])
+                if self._stream:
+                    self._writer.flush()
+        self._prefetcher = None
+
+    def photo_sequence(self) -> Iterable[Tuple[Path, float]]:
+        """
+        Walk the render plan over the data, yielding each photo in the order format_docx() inserts them.
+        :return: The photo and its width.
+        """
+        t_positions = [op.positions[0] for op in self._render_plan if op.section_type == 'photo']
+        for row in self._data.itertuples(name=None):
+            for position in t_positions:
+                if isinstance(row[position], Iterable):
+                    for photo in row[position]:
+                        yield photo, PHOTO_WIDTH
+
+    def format_docx(self, row: tuple):
         """
         This is factory method that calls the appropriate the information contained within document structure.
-        :param row: dictionary containing the data_str to be formatted. This is a single row from the spreadsheet.
+        :param row: tuple containing the data_str to be formatted. This is a single row from the spreadsheet as
+        returned by DataFrame.itertuples(name=None).
         :return:
         """
+        for op in self._render_plan:
+            self.section_counts[op.section_type] = self.section_counts.get(op.section_type, 0) + 1
+            if op.section_type == 'paragraph':
+                # removed .lower() from the string passed to the insert_paragraph call
+                self.insert_paragraph(str(row[op.positions[0]]), title=op.title, section_style=op.section_style,
+                                      title_style=op.title_style)
 
-        row = row._asdict()
-        for structure_element in self._structure.itertuples():
-            sect_contains_element: str = str(structure_element.section_contains).lower()
-            sect_style_element: str = str(structure_element.section_style)
-            sect_type_element: str = str(structure_element.section_type).lower()
-            title_style_element: str = str(structure_element.title_style)
-            sect_break_element: bool = structure_element.section_break
-            page_break_element: bool = structure_element.page_break
+            elif op.section_type == 'table':
+                table_data = [op.headers, tuple(row[idx] for idx in op.positions)]
+                self.insert_table(len(op.headers), len(table_data), table_data, section_style=op.section_style)
 
-            if sect_type_element in ['heading', 'para', 'paragraph']:
-                # removed .lower() from the string passed to the insert_paragraph call
-                self.insert_paragraph(str(row[sect_contains_element]), title=sect_contains_element.title(),
-                                      section_style=sect_style_element, title_style=title_style_element)
-
-            elif sect_type_element == 'table':
-                table_col_hdr = split_str(sect_contains_element)
-                sorted_row = sort_table_data(row, table_col_hdr)
-                self.insert_table(len(table_col_hdr), len(sorted_row), sorted_row, section_style=sect_style_element)
-
-            elif sect_type_element == 'photo':
-                if isinstance(row[sect_contains_element], Iterable):
-                    for each in row[sect_contains_element]:
-                        self.insert_photo(each, 4)
+            elif op.section_type == 'photo':
+                if isinstance(row[op.positions[0]], Iterable):
+                    for each in row[op.positions[0]]:
+                        self.insert_photo(each, PHOTO_WIDTH)
             else:
-                print('Valid section header was not found.')
+                log.warning('Valid section header was not found.')
 
-            if sect_break_element is True:
+            if op.section_break:
                 self.insert_paragraph('')
 
-            if page_break_element is True:
+            if op.page_break:
                 self._file_template.add_page_break()
 
     def insert_paragraph(self, text: str, title: str = None, section_style: str = None,
@@ -234,6 +481,7 @@ class SingleLoad:
         :return:
         """
         split_text = text.splitlines()
+        self._volume_bytes += len(text)
         if len(split_text) == 0:
             self._file_template.add_paragraph(split_text)
         else:
@@ -257,33 +505,94 @@ class SingleLoad:
         """
         table = self._file_template.add_table(rows=rows, cols=cols, style=section_style)
         table.autofit = autofit_table
-        cell_data = enumerate(data, 0)
-        for i, cell_contents in cell_data:
-            for j, text in enumerate(cell_contents):
-                table.rows[i].cells[j].text = str(text)
-
-    def insert_photo(self, photo: Path, width: int = 4):
+        # The cells are filled by walking the table's XML once. Accessing table.rows[i].cells[j] rebuilds the row and
+        # cell lists for every cell, which is quadratic in the size of the table.
+        for tr, cell_contents in zip(table._tbl.tr_lst, data):
+            for tc, text in zip(tr.tc_lst, cell_contents):
+                text = str(text)
+                self._volume_bytes += len(text)
+                _Cell(tc, table).text = text
+
+    def insert_photo(self, photo: Path, width: int = PHOTO_WIDTH):
         """
         Insert a photo located at path into document and set the photo width.
         :param photo: file path to the
         :param width: width of the image in Inches
         :return:
         """
-        self._file_template.add_picture(str(photo), width=Inches(width))
+        # This follows Document.add_picture(), using the cached image rather than reading and parsing the file.
+        if self._prefetcher is not None:
+            image = self._prefetcher.get(photo, width)
+        else:
+            image = self._image_cache.get(photo, width)
+        document_part = self._file_template.part
+        image_part = self._image_parts.get(image.sha1)
+        if image_part is None:
+            image_part = document_part.package.image_parts._add_image_part(image)
+            self._image_parts[image.sha1] = image_part
+            self._volume_bytes += len(image.blob)
+            self.image_bytes += len(image.blob)
+        self.photo_count += 1
+        r_id = document_part.relate_to(image_part, RT.IMAGE)
+        cx, cy = image.scaled_dimensions(Inches(width), None)
+        shape_id = document_part.next_id if self._writer is None else self._writer.next_id
+        inline = CT_Inline.new_pic_inline(shape_id, r_id, image.filename, cx, cy)
+        self._file_template.add_paragraph().add_run()._r.add_drawing(inline)
 
     def issue_document(self):
         """
-        Output the file.
+        Output the file. If the output is split into volumes the current volume is saved and recorded.
         :return:
         """
-        self._file_template.save(self._file_output)
+        if not self.split_volumes:
+            self.save_document(self.output)
+            return
+        t_volume_path = self.volume_path(len(self.volumes) + 1)
+        self.save_document(t_volume_path)
+        self.volumes.append({'volume': len(self.volumes) + 1, 'output_file': t_volume_path.name,
+                             'first_row': self._volume_rows[0] if self._volume_rows else None,
+                             'last_row': self._volume_rows[-1] if self._volume_rows else None,
+                             'rows': len(self._volume_rows)})
+        notice('  Volume %s saved: %s rows', t_volume_path, len(self._volume_rows), extra=style(OUTPUT_TEXT))
+        self._file_template = None
+
+    def save_document(self, file_output: (Path, BinaryIO)):
+        """
+        Save the current document. A streamed document has already been written to file_output and is closed.
+        :param file_output: The path to the output file location, or the output stream.
+        :return:
+        """
+        with self._profile.phase('save'):
+            if self._stream:
+                self._writer.close()
+                self._writer = None
+            else:
+                self._file_template.save(file_output)
+
+    def issue_volume_index(self):
+        """
+        Output a CSV file, next to the volumes, recording the data rows contained in each volume.
+        :return:
+        """
+        t_index_path = self.output_files[-1]
+        pd.DataFrame(self.volumes, columns=['volume', 'output_file', 'first_row', 'last_row', 'rows']).to_csv(
+            t_index_path, index=False)
+        notice('  Volume index %s saved', t_index_path, extra=style(OUTPUT_TEXT))
 
 
 class Laundry:
     def __init__(self, input_fp: Path, data_worksheet: str = None, structure_worksheet: str = None,
                  batch_worksheet: str = None, header_row: int = 0, drop_empty_columns: bool = None,
                  template_file: str = None, filter_rows: str = None, output_file: (Path, str) = None,
-                 verbose: bool = True, template_generate: bool = False):
+                 verbose: bool = True, template_generate: bool = False, jobs: int = 1, cache_dir: (Path, str) = None,
+                 cache_size_mb: int = DEFAULT_CACHE_SIZE_MB, reader: str = DEFAULT_READER, photo_dpi: int = None,
+                 image_cache_dir: (Path, str) = None, image_cache_size_mb: int = DEFAULT_IMAGE_CACHE_SIZE_MB,
+                 max_rows_per_file: int = None, max_output_mb: float = None, stream_output: bool = False,
+                 dtypes: Dict[str, str] = None, profile: bool = False, profile_json: (Path, str) = None,
+                 profile_render: (Path, str) = None, log_level: str = None, log_format: str = DEFAULT_LOG_FORMAT,
+                 incremental: bool = False, force: bool = False, session: SessionCaches = None,
+                 prefetch_threads: int = DEFAULT_PREFETCH_THREADS, prefetch_size_mb: float = DEFAULT_PREFETCH_SIZE_MB,
+                 pipeline_depth: int = 0):
         """
         Instantiating the class will run error checking on the passed information, checking for the following steps:
         1. A basic check that worksheet names have been passed.
@@ -294,7 +603,8 @@ class Laundry:
             Error checking will be completed later.
         5.
         :param input_fp: The file path to the spreadsheet containing the data
-        :param data_worksheet: The name of the worksheet containing the data to be formatted.
+        :param data_worksheet: The name of the worksheet containing the data to be formatted, or the URI of a data
+        source, see laundry.sources.
         :param structure_worksheet: The name of the worksheet containing the output document's structure.
         :param batch_worksheet: The name of the worksheet containing the batch data.
         :param header_row: 
@@ -305,33 +615,89 @@ class Laundry:
         :param output_file:
         :param verbose:
         :param template_generate:
+        :param jobs: The number of worker processes used to wash the batch rows. If 0 all available cores are used.
+        :param cache_dir: If provided, cleaned worksheets are stored in this directory and reused by later runs while
+        the spreadsheet is unchanged.
+        :param cache_size_mb: The maximum size of the cache directory in megabytes.
+        :param reader: The name of the reader engine used to read the spreadsheet. See laundry.readers.READER_ENGINES.
+        :param photo_dpi: If provided, photos are resampled to this resolution before they are inserted.
+        :param image_cache_dir: The directory used to store the resampled photos between runs.
+        :param image_cache_size_mb: The maximum size of the photos held in memory and shared by the output files.
+        :param max_rows_per_file: If provided, each output file is split into volumes of at most this many data rows.
+        Used for batch rows that do not set max_rows_per_file.
+        :param max_output_mb: If provided, each output file is split into volumes of approximately this size. Used for
+        batch rows that do not set max_output_mb.
+        :param stream_output: If True, output files are written as each data row is rendered, so the memory used does
+        not depend on the size of the output file.
+        :param dtypes: The pandas dtype used to hold each of the named data worksheet columns, keyed by the cleaned
+        column name.
+        :param profile: If True, the time and memory used by each phase of each batch row are reported at the end of the
+        run. See laundry.profiling.
+        :param profile_json: If provided, the profile report is also written to this JSON file. Implies profile.
+        :param profile_render: If provided, the render phase is profiled using cProfile and the statistics are written
+        to this file. Implies profile.
+        :param log_level: The level of the console output, one of laundry.log.LOG_LEVELS. If None, the level is info
+        when verbose is True and notice otherwise.
+        :param log_format: The format of the console output, one of laundry.log.LOG_FORMATS.
+        :param incremental: If True, output files whose inputs have not changed since they were last built are not
+        rebuilt. The inputs of each output file are recorded in a manifest in its directory. See laundry.manifest.
+        :param force: If True, every output file is rebuilt. The manifest is still updated when incremental is True.
+        :param session: If provided, the worksheets, photos and manifest are shared with earlier runs of the same input
+        file, and the worksheets loaded by this run are added to it.
+        :param prefetch_threads: The number of threads that load the photos of an output file ahead of the renderer.
+        If 0 the photos are read as they are rendered. See laundry.prefetch.
+        :param prefetch_size_mb: The memory budget of the photos loaded ahead of the renderer, in megabytes.
+        :param pipeline_depth: If greater than 0, and a single job is used, the next batch rows are loaded and checked
+        on one thread, and the previous output files saved on another, while each batch row is rendered. This many
+        rows are prepared ahead, and output files held waiting to be saved. See laundry.pipeline.
         """
+        self.output_verbose: bool = verbose
+        self._log_options: Dict[str, str] = {'log_level': log_level or ('info' if verbose else 'notice'),
+                                             'log_format': log_format}
+        configure_logging(**self._log_options)
         if template_generate:
             # Generate the template spreadsheet and exit the app.
             self.generate_tempate_document()
 
-        self.output_verbose: bool = verbose
         # Step 1: Basic data checking.
         t_sheets_expected = remove_from_iterable([data_worksheet, structure_worksheet, batch_worksheet], None)
-        print_verbose('Check: Worksheets are present:', verbose=self.output_verbose, **OUTPUT_TITLE)
+        log.info('Check: Worksheets are present:', extra=style(OUTPUT_TITLE))
         if len(t_sheets_expected) == 0:
             raise ValueError(f'Either the "data" and "structure" worksheets, or the "batch" worksheet must be '
                              f'provided.')
         sheet = enumerate(t_sheets_expected, 1)
         for item, sht in sheet:
-            print_verbose(f'  Sheet {item}:\t{sht}', verbose=self.output_verbose, **OUTPUT_TEXT)
+            log.info('  Sheet %s:\t%s', item, sht)
 
         # Step 2: Confirm the input file exists.
         self._input_fp: (Path, str) = ''
         try:
-            print_verbose(f'Check: Resolving spreadsheet filepath: ', verbose=self.output_verbose, **OUTPUT_TITLE)
+            log.info('Check: Resolving spreadsheet filepath: ', extra=style(OUTPUT_TITLE))
             self._input_fp = resolve_file_path(input_fp)
-            print_verbose(f'  {self._input_fp}', verbose=self.output_verbose, **OUTPUT_TEXT)
+            log.info('  %s', self._input_fp)
         except Exception as e:
-            print_verbose(f'\t{e}: File {input_fp} does not exist.', True, **EXCEPTION_TEXT)
+            log.error('\t%s: File %s does not exist.', e, input_fp)
+
+        # Worksheets are parsed at most once per run and shared between the batch rows that reference them.
+        self._worksheet_frames: Dict[tuple, pd.DataFrame] = {} if session is None else session.worksheet_frames
+        self._profile_json: (Path, str) = profile_json
+        self._profile_render: (Path, str) = profile_render
+        self.set_wash_options(cache_dir=cache_dir, cache_size_mb=cache_size_mb, photo_dpi=photo_dpi,
+                              image_cache_dir=image_cache_dir, image_cache_size_mb=image_cache_size_mb,
+                              stream_output=stream_output, dtypes=dtypes,
+                              profile=profile or profile_json is not None or profile_render is not None,
+                              profile_render=profile_render is not None, incremental=incremental, force=force,
+                              prefetch_threads=prefetch_threads, prefetch_size_mb=prefetch_size_mb)
+        if session is not None:
+            self._image_cache = session.image_cache
+            self._image_cache.new_run()
+            if incremental:
+                self._manifest = session.manifest
 
         # Load the Excel file into memory.
-        self._washing_basket = pd.ExcelFile(self._input_fp)
+        self._reader = reader
+        with self._profile.phase('open'):
+            self._washing_basket: WorkbookReader = open_workbook(self._input_fp, reader)
 
         # Gather the worksheet names
         self._sheets_actual: list = self._washing_basket.sheet_names
@@ -343,13 +709,14 @@ class Laundry:
 
         #  Step 3: Check that the data, structure and batch worksheet names passed exist within the file.
         try:
-            print_verbose(f'Check Worksheets exist in spreadsheet: ', verbose=self.output_verbose, **OUTPUT_TITLE)
-            self.compare_lists(t_sheets_expected, self._sheets_actual)
+            log.info('Check Worksheets exist in spreadsheet: ', extra=style(OUTPUT_TITLE))
+            self.compare_lists([sht for sht in t_sheets_expected if self.data_source(sht) is None],
+                               self._sheets_actual)
             t_sht_actual = enumerate(self._sheets_actual, 1)
             for item, sht in t_sht_actual:
-                print_verbose(f'  Sheet {item}:\t {sht}', verbose=self.output_verbose, **OUTPUT_TEXT)
+                log.info('  Sheet %s:\t %s', item, sht)
         except Exception as e:
-            print_verbose(f'{e}', True, **EXCEPTION_TEXT)
+            log.error('%s', e)
 
         # Step 4. If the batching information is passed to the object at instantiation, then merge this into a
         #   dictionary. Error checking will be completed later.
@@ -377,54 +744,503 @@ class Laundry:
             self.batch_df = pd.DataFrame.from_dict(data=t_batch_dict)
         # Step 5. If batch information passed as a worksheet clean and sort the batch data.
         else:
-            self.batch_df = self.excel_to_dataframe(self._washing_basket, batch_worksheet, header_row=0,
-                                                    clean_header=True)
+            self.batch_df = self.load_worksheet(batch_worksheet, header_row=0, clean_header=True).copy()
+        self._batch_worksheet: str = batch_worksheet or 'batch'
+        self._volume_defaults: Dict[str, Any] = {'max_rows_per_file': max_rows_per_file,
+                                                 'max_output_mb': max_output_mb}
 
         # Step 6. Check the batch data.
         try:
-            print_verbose(f'Batch worksheet data', verbose=self.output_verbose, **DATAFRAME_TITLE)
-            print_verbose(f'{self.batch_df}', verbose=self.output_verbose, **DATAFRAME_TEXT)
-            print_verbose(f'Check: Batch worksheet data', verbose=self.output_verbose, **OUTPUT_TITLE)
-            self.check_batch_worksheet_data()
-            print_verbose(f'Batch data checked', verbose=self.output_verbose, **OUTPUT_TITLE)
+            log.debug('Batch worksheet data', extra=style(DATAFRAME_TITLE))
+            log.debug('%s', self.batch_df)
+            log.info('Check: Batch worksheet data', extra=style(OUTPUT_TITLE))
+            with self._profile.phase('check_batch'):
+                self.check_batch_worksheet_data()
+            log.info('Batch data checked', extra=style(OUTPUT_TITLE))
         except Exception as e:
-            print_verbose(f'{e}', True, **EXCEPTION_TEXT)
-            exit_app()
+            log.error('%s', e)
+            exit_app(1)
 
         # Step 6. Convert the batch DataFrame to a dict and store.
         self._batch_dict = self.batch_df.to_dict('records')
 
         # Step 7 - Every row of the the batch DataFrame contains information regarding an output file. For each row in
-        # the DataFrame produce the associated output file.
-        for t_batch_row in self.batch_df.itertuples():
-            t_structure_worksheet = t_batch_row.structure_worksheet
-            t_data_worksheet = t_batch_row.data_worksheet
-            self.t_structure_df = self.excel_to_dataframe(self._washing_basket, t_structure_worksheet, header_row=0,
-                                                          clean_header=True, drop_empty_rows=False)
-
-            self.t_structure_photo_path: Dict[str, Path] = {}
-            self.t_data_df = self.excel_to_dataframe(self._washing_basket, t_data_worksheet,
-                                                     header_row=t_batch_row.header_row,
-                                                     clean_header=True, drop_empty_rows=True)
-
-            # Filter the data DataFrame using the filters passed.
-            if str(t_batch_row.filter_rows).lower() not in invalid and t_batch_row.filter_rows is not None:
-                for row_filter in t_batch_row.filter_rows:
-                    self.t_data_df = self.t_data_df.loc[self.t_data_df[row_filter[0]].isin(row_filter[1])]
+        # the DataFrame produce the associated output file. If more than one job is requested the rows are washed in
+        # worker processes and a summary is reported once all rows are complete.
+        if jobs == 0:
+            jobs = os.cpu_count()
+        self.batch_results: List[BatchResult] = []
+        if jobs is not None and jobs > 1:
+            self.wash_batch_parallel(jobs)
+            self.report_batch_results()
+            self.report_profile()
+            if not all(result.success for result in self.batch_results):
+                exit_app(1)
+        else:
+            if pipeline_depth and self._profile.enabled:
+                log.warning('The batch rows are washed in sequence while the run is profiled, so the time of each '
+                            'phase is recorded against its own batch row.')
+                pipeline_depth = 0
+            if pipeline_depth:
+                self.wash_batch_pipeline(pipeline_depth)
+            else:
+                self.plan_batch_worksheets()
+                for t_batch_row in self.batch_df.itertuples():
+                    self.record_batch_row(t_batch_row, self.wash_batch_row(t_batch_row))
+            self.report_image_cache(self._image_cache.hits, self._image_cache.misses)
+            self.report_prefetch()
+            self.report_profile()
+
+    def set_wash_options(self, cache_dir: (Path, str) = None, cache_size_mb: int = DEFAULT_CACHE_SIZE_MB,
+                         photo_dpi: int = None, image_cache_dir: (Path, str) = None,
+                         image_cache_size_mb: int = DEFAULT_IMAGE_CACHE_SIZE_MB, stream_output: bool = False,
+                         dtypes: Dict[str, str] = None, profile: bool = False, profile_render: bool = False,
+                         incremental: bool = False, force: bool = False,
+                         prefetch_threads: int = DEFAULT_PREFETCH_THREADS,
+                         prefetch_size_mb: float = DEFAULT_PREFETCH_SIZE_MB):
+        """
+        Set the options that control how worksheets are loaded and output files are produced. The same options are
+        passed to worker processes. See Laundry.__init__() for details of each option.
+        :return:
+        """
+        self._wash_options: Dict[str, Any] = {'cache_dir': cache_dir, 'cache_size_mb': cache_size_mb,
+                                              'photo_dpi': photo_dpi, 'image_cache_dir': image_cache_dir,
+                                              'image_cache_size_mb': image_cache_size_mb,
+                                              'stream_output': stream_output, 'dtypes': dtypes, 'profile': profile,
+                                              'profile_render': profile_render, 'incremental': incremental,
+                                              'force': force, 'prefetch_threads': prefetch_threads,
+                                              'prefetch_size_mb': prefetch_size_mb}
+        self._worksheet_cache: WorksheetCache = None
+        if cache_dir is not None:
+            self._worksheet_cache = WorksheetCache(cache_dir, cache_size_mb)
+        image_pipeline: ImagePipeline = None
+        if photo_dpi is not None:
+            image_pipeline = ImagePipeline(photo_dpi, image_cache_dir)
+        self._image_cache: ImageCache = ImageCache(image_cache_size_mb, image_pipeline)
+        self._profile: RunProfile = RunProfile(profile, profile_render)
+        self._manifest: BuildManifest = BuildManifest() if incremental else None
+        self._prefetch_stats: PrefetchStats = PrefetchStats()
+
+    def worker_options(self) -> Dict:
+        """
+        The options passed to worker processes so that they wash batch rows in the same way as this object.
+        :return: Dict
+        """
+        return {'verbose': self.output_verbose, 'reader': self._reader, **self._log_options, **self._wash_options}
+
+    @classmethod
+    def worker_instance(cls, input_fp: Path, sheets_actual: List[str], batch_row: Dict, verbose: bool = True,
+                        reader: str = DEFAULT_READER, log_level: str = None, log_format: str = DEFAULT_LOG_FORMAT,
+                        **wash_options):
+        """
+        Create a Laundry object within a worker process without re-running the batch checks completed by the parent
+        process. The spreadsheet is reopened by the worker.
+        :param input_fp: The resolved file path to the spreadsheet containing the data.
+        :param sheets_actual: The worksheet names contained within the spreadsheet.
+        :param batch_row: A checked batch worksheet row as a dict, including its 'Index'.
+        :param verbose: Is the text to be output.
+        :param reader: The name of the reader engine used to read the spreadsheet.
+        :param log_level: The level of the console output. See Laundry.__init__().
+        :param log_format: The format of the console output.
+        :param wash_options: The options passed to set_wash_options().
+        :return: Laundry
+        """
+        laundry = cls.__new__(cls)
+        laundry.output_verbose = verbose
+        laundry._log_options = {'log_level': log_level or ('info' if verbose else 'notice'), 'log_format': log_format}
+        configure_logging(**laundry._log_options)
+        laundry._input_fp = input_fp
+        # Each worker process keeps its spreadsheet and parsed worksheets for the batch rows that it washes.
+        if (str(input_fp), reader) not in _worker_washing_baskets:
+            _worker_washing_baskets[(str(input_fp), reader)] = (open_workbook(input_fp, reader), {})
+        laundry._washing_basket, laundry._worksheet_frames = _worker_washing_baskets[(str(input_fp), reader)]
+        laundry._reader = reader
+        laundry.set_wash_options(**wash_options)
+        laundry._image_cache = _worker_image_caches.setdefault(repr(sorted(wash_options.items())), laundry._image_cache)
+        laundry._sheets_actual = sheets_actual
+        laundry.batch_df = pd.DataFrame([batch_row]).set_index('Index')
+        laundry.batch_results = []
+        return laundry
+
+    def wash_batch_row(self, t_batch_row: NamedTuple):
+        """
+        Load, filter and check the data for a single batch row and produce the associated output file. If the run is
+        incremental the output file is only produced if its inputs have changed.
+        :param t_batch_row: A row from the checked batch DataFrame.
+        :return: The BuildRecord of the output file if the run is incremental, otherwise None.
+        """
+        t_prepared = self.prepare_batch_row(t_batch_row)
+        if t_prepared.skipped:
+            return t_prepared.build
+        return self.built(t_prepared, self.render_batch_row(t_prepared))
 
-            # Step 8 - Check the structure data.
+    def prepare_batch_row(self, t_batch_row: NamedTuple) -> PreparedRow:
+        """
+        Load, filter and check the data for a single batch row. If the run is incremental and the inputs of the output
+        file have not changed, the row is marked as skipped.
+        :param t_batch_row: A row from the checked batch DataFrame.
+        :return: PreparedRow
+        """
+        self._profile.batch_row = t_batch_row.Index
+        t_structure_worksheet = t_batch_row.structure_worksheet
+        self.t_structure_df = self.load_worksheet(t_structure_worksheet, header_row=0, clean_header=True,
+                                                  drop_empty_rows=False).copy()
+
+        self.t_structure_photo_path: Dict[str, Path] = {}
+        t_data_df = self.load_worksheet(**self.data_worksheet_load(t_batch_row))
+
+        # Filter the data DataFrame using the filters passed. The worksheet's DataFrame is shared between batch rows
+        # so the row's DataFrame is always a copy.
+        with self._profile.phase('filter'):
+            if str(t_batch_row.filter_rows).lower() not in invalid and t_batch_row.filter_rows is not None:
+                self.t_data_df = self.filter_dataframe(t_data_df, t_batch_row.filter_rows)
+            else:
+                self.t_data_df = t_data_df.copy()
+        # The worksheets are hashed before they are changed by the checks.
+        t_digests = None
+        if self._manifest is not None:
+            t_digests = {'data': frame_digest(self.t_data_df), 'structure': frame_digest(self.t_structure_df)}
+
+        # Step 8 - Check the structure data.
+        with self._profile.phase('check_structure'):
             self.check_dataframe(f'Structure worksheet data', self.t_structure_df, f'Check: Structure worksheet data',
-                                 self.check_structure_worksheet_data, f'Structure dataframe checked',
+                                 lambda: self.check_structure_worksheet_data(t_batch_row.structure_worksheet),
+                                 f'Structure dataframe checked',
                                  f'{t_batch_row.structure_worksheet}', f'Structure dataframe failure: ')
 
-            # Step 9 - Check the data worksheet data.
+        # Step 9 - Check the data worksheet data.
+        with self._profile.phase('check_data'):
             self.check_dataframe(f'Data dataframe', self.t_data_df, f'Check: Data worksheet data',
-                                 self.check_data_worksheet_data, f'Data dataframe checked',
+                                 lambda: self.check_data_worksheet_data(t_batch_row.data_worksheet),
+                                 f'Data dataframe checked',
                                  f'{t_batch_row.data_worksheet}', f'Data dataframe failure: ')
 
-            self.wash_load(t_batch_row.template_file, t_batch_row.output_file)
+        t_build = None
+        if self._manifest is not None:
+            t_build = self.build_record(t_batch_row, t_digests)
+            if not self._wash_options['force'] and self._manifest.is_current(t_batch_row.output_file, t_build):
+                notice('\nDocument %s is up to date', t_batch_row.output_file,
+                       extra=style(output_file=str(t_batch_row.output_file), skipped=True))
+                t_build = t_build._replace(skipped=True)
+
+        self._profile.batch_row = None
+        del self.t_structure_photo_path
+        return PreparedRow(t_batch_row, self.t_structure_df, self.t_data_df, t_build)
+
+    def render_batch_row(self, t_prepared: PreparedRow, issue: bool = True) -> SingleLoad:
+        """
+        Render the output file of a prepared batch row.
+        :param t_prepared: The batch row returned by prepare_batch_row().
+        :param issue: If False the output file is rendered but not saved. See SingleLoad.issue().
+        :return: The SingleLoad that rendered the output file.
+        """
+        t_batch_row = t_prepared.batch_row
+        self._profile.batch_row = t_batch_row.Index
+        self.t_structure_df, self.t_data_df = t_prepared.structure, t_prepared.data
+        t_load = self.wash_load(t_batch_row.template_file, t_batch_row.output_file,
+                                max_rows_per_file=getattr(t_batch_row, 'max_rows_per_file', None),
+                                max_output_mb=getattr(t_batch_row, 'max_output_mb', None), issue=issue)
+        self._profile.record_output(t_batch_row.output_file, t_load.section_counts, t_load.photo_count,
+                                    t_load.image_bytes)
+        self._profile.batch_row = None
+        return t_load
+
+    @staticmethod
+    def built(t_prepared: PreparedRow, t_load: SingleLoad) -> BuildRecord:
+        """
+        :param t_prepared: The batch row returned by prepare_batch_row().
+        :param t_load: The SingleLoad that produced the output file, once it has been saved.
+        :return: The BuildRecord of the output file, including the files written, or None if the run is not
+        incremental.
+        """
+        if t_prepared.build is None:
+            return None
+        return t_prepared.build._replace(files={fp.name: file_stat(fp) for fp in t_load.output_files})
 
-            del self.t_structure_photo_path
+    def record_batch_row(self, t_batch_row: NamedTuple, t_build: BuildRecord):
+        """
+        Record a batch row washed by this process in the manifest and the batch results.
+        :param t_batch_row: A row from the checked batch DataFrame.
+        :param t_build: The BuildRecord returned by wash_batch_row().
+        :return:
+        """
+        self.record_build(t_batch_row.output_file, t_build)
+        t_message = 'Up to date' if t_build is not None and t_build.skipped else 'Ok'
+        self.batch_results.append(BatchResult(t_batch_row.Index, str(t_batch_row.output_file), True, t_message,
+                                              build=t_build))
+
+    def wash_batch_pipeline(self, depth: int):
+        """
+        Wash the batch rows in batch order, loading and checking the rows that follow on one thread, and saving the
+        output files of the rows before on another, while each row is rendered. The worksheets are loaded as the rows
+        that use them are prepared, so the first row is rendered without waiting for the others' worksheets. See
+        laundry.pipeline.
+        :param depth: The number of rows prepared ahead of the renderer, and of output files waiting to be saved.
+        :return:
+        """
+        log.info('Washing %s batch rows in a pipeline of depth %s.', len(self.batch_df), depth,
+                 extra=style(OUTPUT_TITLE))
+        # The rows are prepared by a copy of this object, so the row being checked and the row being rendered do not
+        # share their DataFrames. The worksheets, photo indexes and manifest are shared.
+        t_preparer = copy.copy(self)
+        with BatchPipeline(t_preparer.prepare_batch_row, depth) as pipeline:
+            try:
+                for t_prepared in pipeline.prepared(self.batch_df.itertuples()):
+                    # A skipped row passes through the writer so that the rows are recorded in batch order.
+                    t_load = None if t_prepared.skipped else self.render_batch_row(t_prepared, issue=False)
+                    pipeline.save(t_load.issue if t_load is not None else lambda: None,
+                                  partial(self.pipeline_saved, t_prepared, t_load))
+            finally:
+                # The rows rendered before a failure are saved and recorded, as they are when washed in sequence.
+                pipeline.drain()
+
+    def pipeline_saved(self, t_prepared: PreparedRow, t_load: SingleLoad, future: Future):
+        """
+        Record a batch row once its output file has been saved by the pipeline's writer.
+        :param t_prepared: The batch row returned by prepare_batch_row().
+        :param t_load: The SingleLoad that rendered the output file, or None if the row was skipped.
+        :param future: The save of the output file. Its exception, if any, is raised.
+        :return:
+        """
+        future.result()
+        t_build = t_prepared.build if t_load is None else self.built(t_prepared, t_load)
+        self.record_batch_row(t_prepared.batch_row, t_build)
+
+    def build_record(self, t_batch_row: NamedTuple, digests: Dict[str, str]) -> BuildRecord:
+        """
+        Hash the inputs of a batch row's output file once its data has been checked and its photos found.
+        :param t_batch_row: A row from the checked batch DataFrame.
+        :param digests: The hashes of the filtered data and structure worksheets.
+        :return: BuildRecord
+        """
+        t_photos = [fp for col in self.t_structure_photo_path for value in self.t_data_df[str(col).lower()]
+                    if isinstance(value, list) for fp in value]
+        t_photo_digest, t_photo_records = self._manifest.photos_fingerprint(t_photos)
+        t_options = {'max_rows_per_file': getattr(t_batch_row, 'max_rows_per_file', None),
+                     'max_output_mb': getattr(t_batch_row, 'max_output_mb', None),
+                     'photo_dpi': self._wash_options['photo_dpi'], 'stream_output': self._wash_options['stream_output']}
+        # A batch row without a template uses the default python-docx template.
+        t_template = t_batch_row.template_file
+        t_fingerprint = {**digests, 'template': file_digest(t_template) if t_template is not None else None,
+                         'photos': t_photo_digest, 'options': options_digest(t_options)}
+        return BuildRecord(t_fingerprint, t_photo_records)
+
+    def plan_batch_worksheets(self):
+        """
+        Group the batch rows by the worksheets they reference and parse each distinct worksheet once. Batch rows that
+        share a structure worksheet, or a data worksheet and header row, share the parsed DataFrame.
+        :return:
+        """
+        t_loads = [dict(worksheet=sht, header_row=0, clean_header=True, drop_empty_rows=False)
+                   for sht in self.batch_df.loc[:, 'structure_worksheet']]
+        t_loads += [self.data_worksheet_load(row) for row in self.batch_df.itertuples()]
+        t_loads = list({self.worksheet_key(**load): load for load in t_loads}.values())
+        log.info('Loading %s worksheets for %s batch rows:', len(t_loads), len(self.batch_df),
+                 extra=style(OUTPUT_TITLE))
+        for load in t_loads:
+            log.info('  %s', load['worksheet'])
+            self.load_worksheet(**load)
+
+    def data_worksheet_load(self, t_batch_row: NamedTuple) -> Dict[str, Any]:
+        """
+        Return the arguments of load_worksheet() used to load the batch row's data worksheet.
+        :param t_batch_row: A row from the checked batch DataFrame.
+        :return: Dict
+        """
+        return dict(worksheet=t_batch_row.data_worksheet, header_row=t_batch_row.header_row, clean_header=True,
+                    drop_empty_rows=True, row_filter=self.pushdown_filter(t_batch_row),
+                    columns=getattr(t_batch_row, 'data_columns', None), dtypes=self._wash_options['dtypes'])
+
+    @staticmethod
+    def pushdown_filter(t_batch_row: NamedTuple) -> (List[RowFilter], None):
+        """
+        Return the filters that are applied while the batch row's data worksheet is read, or None. See
+        check_batch_worksheet_data().
+        :param t_batch_row: A row from the checked batch DataFrame.
+        :return:
+        """
+        if getattr(t_batch_row, 'pushdown_filter', False) is True:
+            return t_batch_row.filter_rows
+        return None
+
+    @staticmethod
+    def worksheet_key(worksheet: str, header_row: int = 0, clean_header: bool = False, drop_empty_rows: bool = False,
+                      row_filter: List[RowFilter] = None, columns: Tuple[str, ...] = None,
+                      dtypes: Dict[str, str] = None) -> tuple:
+        """
+        Return the key of a loaded worksheet. See load_worksheet() for the parameters.
+        :return: tuple
+        """
+        key = (worksheet, header_row, clean_header, drop_empty_rows)
+        if row_filter:
+            key += (('row_filter', tuple(row_filter)),)
+        if columns is not None:
+            key += (('columns', tuple(columns)),)
+        if dtypes:
+            key += (('dtypes', tuple(sorted(dtypes.items()))),)
+        return key
+
+    def load_worksheet(self, worksheet: str, header_row: int = 0, clean_header: bool = False,
+                       drop_empty_rows: bool = False, row_filter: List[RowFilter] = None,
+                       columns: Tuple[str, ...] = None, dtypes: Dict[str, str] = None) -> data_frame:
+        """
+        Return the DataFrame for a worksheet, parsing the worksheet only if it has not already been loaded during this
+        run or stored in the worksheet cache. The returned DataFrame is shared and must not be modified.
+        :param worksheet: The Excel spreadsheet worksheet's name.
+        :param header_row: index of the header row in the spreadsheet.
+        :param clean_header: If True clean the column headers
+        :param drop_empty_rows: If True remove empty rows.
+        :param row_filter: If provided, the reader may discard rows that cannot meet these filters. The filters must
+        still be applied to the returned DataFrame.
+        :param columns: If provided, only these columns are loaded.
+        :param dtypes: The dtype of each of the named columns.
+        :return:
+        """
+        key = self.worksheet_key(worksheet, header_row, clean_header, drop_empty_rows, row_filter, columns, dtypes)
+        if key in self._worksheet_frames:
+            return self._worksheet_frames[key]
+
+        df = None
+        t_reader = self.worksheet_reader(worksheet)
+        # The worksheet cache is keyed by the input file, so data sources are read on each run.
+        t_cached = self._worksheet_cache is not None and t_reader is self._washing_basket
+        if t_cached:
+            cache_key = self._worksheet_cache.entry_key(self._input_fp, *key)
+            df = self._worksheet_cache.get(cache_key)
+        if df is None:
+            with self._profile.phase('read'):
+                df = self.excel_to_dataframe(t_reader, worksheet, header_row=header_row,
+                                             clean_header=clean_header, drop_empty_rows=drop_empty_rows,
+                                             row_filter=row_filter, columns=columns, dtypes=dtypes)
+            if t_cached:
+                self._worksheet_cache.put(cache_key, df)
+        self._worksheet_frames[key] = df
+        return df
+
+    def data_source(self, worksheet: str) -> (DataSource, None):
+        """
+        :param worksheet: A worksheet name or data source URI.
+        :return: The data source, or None if the worksheet is in the input file or is not a data source URI. See
+        laundry.sources.
+        """
+        if worksheet in self._sheets_actual:
+            return None
+        return parse_source(worksheet)
+
+    def worksheet_reader(self, worksheet: str) -> WorkbookReader:
+        """
+        :param worksheet: A worksheet name or data source URI.
+        :return: The reader of the worksheet, either the input file's or a data source.
+        """
+        return self.data_source(worksheet) or self._washing_basket
+
+    @staticmethod
+    def filter_dataframe(df: pd.DataFrame, filters: List[RowFilter]) -> data_frame:
+        """
+        Return the rows of the DataFrame that meet all of the filters. The filters are combined into a single mask so
+        the DataFrame is only copied once.
+        :param df: The DataFrame to be filtered.
+        :param filters: The filters as returned by prepare_row_filters().
+        :return:
+        """
+        return df.loc[filter_mask(df, filters)]
+
+    def wash_batch_parallel(self, jobs: int):
+        """
+        Wash the batch rows across a pool of worker processes. Results are collected in batch order, and the output
+        of each row is printed once it and all preceding rows have completed so the console output is deterministic.
+        :param jobs: The number of worker processes.
+        :return:
+        """
+        batch_rows = [row._asdict() for row in self.batch_df.itertuples()]
+        log.info('Washing %s batch rows using %s jobs.', len(batch_rows), jobs, extra=style(OUTPUT_TITLE))
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = executor.map(wash_batch_row_worker, [self._input_fp] * len(batch_rows),
+                                   [self._sheets_actual] * len(batch_rows), batch_rows,
+                                   [self.worker_options()] * len(batch_rows))
+            for result in results:
+                replay(result.records)
+                self.batch_results.append(result)
+                if result.profile is not None:
+                    self._profile.merge(result.profile)
+                self.record_build(result.output_file, result.build if result.success else None)
+
+    def record_build(self, output_file: (Path, str), build: BuildRecord):
+        """
+        Record the inputs of an output file in the manifest of its directory, or if the output file failed, remove it
+        from the manifest. The manifest is saved after each output file so an interrupted run keeps its progress.
+        :param output_file: The output file.
+        :param build: The BuildRecord returned by wash_batch_row(), or None if the output file failed.
+        :return:
+        """
+        if self._manifest is None:
+            return
+        if build is None:
+            self._manifest.discard(output_file)
+        else:
+            self._manifest.record(output_file, build)
+        self._manifest.save()
+
+    def report_batch_results(self):
+        """
+        Print the success or failure of each batch row.
+        :return:
+        """
+        notice('\nBatch summary:', extra=style(OUTPUT_TITLE))
+        for result in self.batch_results:
+            if result.success:
+                notice('  Row %s:\t%s\t%s', result.index, result.message, result.output_file,
+                       extra=style(OUTPUT_TEXT, batch_row=result.index, output_file=result.output_file, success=True))
+            else:
+                log.error('  Row %s:\tFailed\t%s\t%s', result.index, result.output_file, result.message,
+                          extra=style(batch_row=result.index, output_file=result.output_file, success=False))
+        failed = len([result for result in self.batch_results if not result.success])
+        notice('%s succeeded, %s failed.', len(self.batch_results) - failed, failed)
+        self.report_image_cache(sum(result.image_hits for result in self.batch_results),
+                                sum(result.image_misses for result in self.batch_results))
+        for result in self.batch_results:
+            if result.prefetch is not None:
+                self._prefetch_stats.merge(result.prefetch)
+        self.report_prefetch()
+
+    def report_image_cache(self, hits: int, misses: int):
+        """
+        Print the number of photos that were found in the image cache. Nothing is printed if no photos were inserted.
+        :param hits: The number of photos found in the cache.
+        :param misses: The number of photos read from file.
+        :return:
+        """
+        if hits + misses > 0:
+            log.info('Image cache: %s hits, %s misses.', hits, misses)
+
+    def report_prefetch(self):
+        """
+        Print how many photos were loaded before the renderer needed them, and how long the renderer waited for the
+        others. Nothing is printed if no photos were inserted.
+        :return:
+        """
+        stats = self._prefetch_stats
+        if stats.photos > 0:
+            log.info('Photo prefetch: %.0f%% of %s photos ready, %.2fs stalled.', stats.hit_rate * 100, stats.photos,
+                     stats.stall_seconds, extra=style(**stats.export()))
+
+    def report_profile(self):
+        """
+        Print the profile report, and write it to file if requested. Nothing is done if the run is not profiled.
+        :return:
+        """
+        if not self._profile.enabled:
+            return
+        notice('\nProfile:', extra=style(DATAFRAME_TITLE))
+        notice('%s', self._profile.table().to_string(index=False), extra=style(DATAFRAME_TEXT))
+        if self._profile_json is not None:
+            self._profile.write_json(self._profile_json)
+            notice('Profile saved to %s', self._profile_json, extra=style(OUTPUT_TEXT))
+        if self._profile_render is not None:
+            if self._profile.dump_render_stats(self._profile_render):
+                notice('Render profile saved to %s', self._profile_render, extra=style(OUTPUT_TEXT))
+            else:
+                log.error('No render profile was recorded.')
 
     def generate_tempate_document(self):
         """
@@ -438,290 +1254,267 @@ class Laundry:
         with pd.ExcelWriter('Laundry_template.xlsx') as writer:
             df_batch.to_excel(writer, sheet_name='_batch', index=False)
             df_structure.to_excel(writer, sheet_name='_structure', index=False)
-        print_verbose('Template file saved.', verbose=True, **OUTPUT_TEXT)
-        exit_app()
+        notice('Template file saved.', extra=style(OUTPUT_TEXT))
+        exit_app(0)
 
-    def wash_load(self, template_file: Path, output_file: Path):
+    def wash_load(self, template_file: Path, output_file: Path, max_rows_per_file: int = None,
+                  max_output_mb: float = None, issue: bool = True):
         """
 
         :param template_file:
         :param output_file:
-        :return:
+        :param max_rows_per_file: If provided, the output is split into volumes of at most this many data rows.
+        :param max_output_mb: If provided, the output is split into volumes of approximately this size.
+        :param issue: If False the output file is rendered but not saved. See SingleLoad.issue().
+        :return: The SingleLoad that produced the output file.
         """
-        SingleLoad(self.t_structure_df, self.t_data_df, template_file, output_file)
+        return SingleLoad(self.t_structure_df, self.t_data_df, template_file, output_file,
+                          image_cache=self._image_cache, max_rows_per_file=max_rows_per_file,
+                          max_output_mb=max_output_mb, stream=self._wash_options['stream_output'],
+                          profile=self._profile, prefetch_threads=self._wash_options['prefetch_threads'],
+                          prefetch_size_mb=self._wash_options['prefetch_size_mb'], prefetch_stats=self._prefetch_stats,
+                          issue=issue)
 
     def check_batch_worksheet_data(self):
         """
-        Check the batch worksheet data is in the correct format. Data is checked as a DataFrame. The following checks
-        are made.
-        Check 1: Confirm expected batch headers exist in the batch worksheet.
-        Check 2: Confirm Structure and data worksheets referenced in batch worksheet exist.
-        Check 3: Confirm the template files exist and resolve the files.
-        Check 4: Confirm an output filename has been provided.
-        Check 5: Check if filter_rows
-        Check 6: Check if drop_empty_rows is None, set it to False.
-        Check 7: Check if header_row is None, set it to 0.
+        Check the batch worksheet data is in the correct format. Every batch row and the structure worksheets they
+        reference are checked before any are washed, and every problem found is reported before the run is stopped. See
+        laundry.validation for the checks made.
+        Check 1: Check and convert the batch worksheet, see validate_batch().
+        Check 2: Check each structure worksheet that is referenced, see validate_structure().
+        Check 3: Push the filters down to the reader if the batch row is the only row that uses its data worksheet.
+        Check 4: Find the data worksheet columns used by the structure worksheets and filters, so only these columns
+        are loaded.
+        Check 5: Check the data worksheet of each batch row, see check_batch_rows_data().
         :return:
         """
-        # Extract the data and structure worksheet names from the batch worksheet for error checking.
-        t_batch_headers = list(self.batch_df)
-        t_batch_data_worksheets_expected = list(self.batch_df.loc[:, 'data_worksheet'])
-        t_batch_structure_worksheets_expected = list(self.batch_df.loc[:, 'structure_worksheet'])
-
+        report = ValidationReport()
         # Check 1.
-        self.data_check(f'\tBatch work sheet headers.', f'Ok', [(EXPECTED_BATCH_HEADERS, t_batch_headers)],
-                        compare='subset')
+        log.info('  Batch worksheet: %s rows', len(self.batch_df), extra=style(end='...'))
+        self.batch_df = validate_batch(self.batch_df, self._sheets_actual, report, self._batch_worksheet,
+                                       self._volume_defaults)
+        log_error_count(len(report.errors))
 
         # Check 2.
-        self.data_check(f'\tData & structure worksheets referenced correctly.', f'Ok',
-                        [(t_batch_structure_worksheets_expected, self._sheets_actual),
-                         (t_batch_data_worksheets_expected, self._sheets_actual)], compare='subset')
-
-        # Check 3.
+        if 'structure_worksheet' in self.batch_df.columns:
+            for structure_worksheet in pd.unique(self.batch_df['structure_worksheet']):
+                if structure_worksheet not in self._sheets_actual:
+                    continue
+                t_errors = len(report.errors)
+                log.info('  Structure worksheet: %s', structure_worksheet, extra=style(end='...'))
+                validate_structure(self.load_worksheet(structure_worksheet, header_row=0, clean_header=True,
+                                                       drop_empty_rows=False), report, structure_worksheet,
+                                   self._input_fp.parent)
+                log_error_count(len(report.errors) - t_errors)
+        report.log_issues()
+        report.raise_for_errors('The batch worksheet check')
+
+        # Check 3. A data worksheet used by more than one batch row is read once, in full, and shared.
+        t_sheet_users = Counter(zip(self.batch_df['data_worksheet'], self.batch_df['header_row']))
+        self.batch_df['pushdown_filter'] = [
+            self.worksheet_reader(row.data_worksheet).supports_row_filter and isinstance(row.filter_rows, list)
+            and len(row.filter_rows) > 0 and t_sheet_users[(row.data_worksheet, row.header_row)] == 1
+            for row in self.batch_df.itertuples()]
+
+        # Check 4. Batch rows that share a data worksheet load the columns used by any of them, so the worksheet is
+        # still loaded once.
+        t_sheet_columns: Dict[tuple, set] = {}
         for row in self.batch_df.itertuples():
-            print_verbose(f'  Row {row.Index}:', verbose=self.output_verbose, **OUTPUT_TITLE)
-            print_verbose(f'\tTemplate file {row.template_file}.', verbose=self.output_verbose, end='...',
-                          **OUTPUT_TEXT)
-            try:
-                if row.template_file not in invalid:
-                    fp_template = resolve_file_path(row.template_file)
-                    self.batch_df.at[row.Index, 'template_file'] = fp_template
-                    print_verbose(f"{self.batch_df.at[row.Index, 'template_file']}", verbose=self.output_verbose,
-                                  **OUTPUT_TEXT)
-            except ValueError as v:
-                print_verbose(f'{v}: Row {row.Index} - Template file {row.template_file} does not exist at the given '
-                              f'location.', True, **EXCEPTION_TEXT)
-            except Exception as e:
-                print_verbose(f'{e}: Row {row.Index}\n{row}', True, **EXCEPTION_TEXT)
-
-            # Check 4.
-            print_verbose(f'\tCheck output filename {row.output_file}.', verbose=self.output_verbose, end='...',
-                          **OUTPUT_TEXT)
-            if str(row.output_file) in invalid:
-                raise ValueError(f'The name of the output file has not been provided.')
+            t_columns = self.structure_columns(row.structure_worksheet)
+            t_sheet = (row.data_worksheet, row.header_row)
+            if t_columns is None or t_sheet_columns.get(t_sheet, set()) is None:
+                t_sheet_columns[t_sheet] = None
+                continue
+            if isinstance(row.filter_rows, list):
+                t_columns |= {row_filter.column for row_filter in row.filter_rows}
+            t_sheet_columns[t_sheet] = t_sheet_columns.get(t_sheet, set()) | t_columns
+        t_data_columns = [t_sheet_columns[(row.data_worksheet, row.header_row)] for row in self.batch_df.itertuples()]
+        self.batch_df['data_columns'] = pd.Series([tuple(sorted(columns)) if columns is not None else None
+                                                   for columns in t_data_columns], index=self.batch_df.index,
+                                                  dtype=object)
+
+        # Check 5. Batch rows that share a structure worksheet and data worksheet are checked together, and the
+        # photos of a data worksheet column are found once for all of the batch rows that use them.
+        report = ValidationReport()
+        t_photo_rows: Dict[tuple, Tuple[pd.DataFrame, pd.Series]] = {}
+        for _, t_rows in self.batch_df.groupby(['structure_worksheet', 'data_worksheet', 'header_row'], sort=False,
+                                               dropna=False):
+            t_errors = len(report.errors)
+            log.info('  Data worksheet: %s', t_rows['data_worksheet'].iloc[0], extra=style(end='...'))
+            t_data_df, t_photo_paths, t_used = self.check_batch_rows_data(t_rows, report)
+            log_error_count(len(report.errors) - t_errors)
+            for column, directory in t_photo_paths.items():
+                t_key = (t_rows['data_worksheet'].iloc[0], t_rows['header_row'].iloc[0], column, directory)
+                if t_key in t_photo_rows:
+                    t_used = t_used | t_photo_rows[t_key][1]
+                t_photo_rows[t_key] = (t_data_df, t_used)
+        for (data_worksheet, _, column, directory), (t_data_df, t_used) in t_photo_rows.items():
+            t_errors = len(report.errors)
+            log.info('  Photo column %s: %s', column, directory, extra=style(end='...'))
+            validate_photos(t_data_df.loc[t_used], {column: directory}, report, data_worksheet)
+            log_error_count(len(report.errors) - t_errors)
+        report.log_issues()
+        report.raise_for_errors('The data worksheet check')
+
+    def check_batch_rows_data(self, batch_rows: pd.DataFrame,
+                              report: ValidationReport) -> Tuple[pd.DataFrame, Dict[str, Path], pd.Series]:
+        """
+        Check a structure worksheet against the columns of its data worksheet before any batch row is washed, and find
+        the data rows selected by any of the batch rows' filters. See laundry.validation.validate_structure().
+        :param batch_rows: The rows of the checked batch DataFrame that share a structure worksheet, data worksheet and
+        header row.
+        :param report: The report that problems are added to.
+        :return: The loaded data worksheet, the photo directory of each photo column, and True for each data row that
+        is used by a batch row.
+        """
+        t_batch_row = next(batch_rows.itertuples())
+        t_structure_df = self.load_worksheet(t_batch_row.structure_worksheet, header_row=0, clean_header=True,
+                                             drop_empty_rows=False)
+        t_data_df = self.load_worksheet(**self.data_worksheet_load(t_batch_row))
+        if t_batch_row.data_columns is None:
+            t_header = list(t_data_df.columns)
+        else:
+            # Only some of the columns are loaded. The worksheet's header is listed if a column does not exist.
+            t_header = self.worksheet_reader(t_batch_row.data_worksheet).header(t_batch_row.data_worksheet,
+                                                                                 t_batch_row.header_row)
+            t_header = list(pd.DataFrame(columns=t_header).clean_names().columns)
+        _, t_photo_paths = validate_structure(t_structure_df, report, t_batch_row.structure_worksheet,
+                                              self._input_fp.parent, t_header)
+
+        t_used = pd.Series(False, index=t_data_df.index)
+        for row in batch_rows.itertuples():
+            if not isinstance(row.filter_rows, list):
+                t_used[:] = True
+                continue
             try:
-                fp_name = str(Path(row.output_file).name)
-                fp_output = Path(resolve_file_path(Path(row.output_file).parent)).joinpath(fp_name)
-                self.batch_df.at[row.Index, 'output_file'] = fp_output
-                print_verbose(f"{self.batch_df.at[row.Index, 'output_file']}", verbose=self.output_verbose,
-                              **OUTPUT_TEXT)
-            except FileNotFoundError as f:
-                print_verbose(f'{f}.  Row {row.Index} - Output file {row.output_file} directory does not exist at the '
-                              f'given loaction.', True, **EXCEPTION_TEXT)
-            except Exception as e:
-                print_verbose(f'{e}: Row {row.Index}\n{row}', True, **EXCEPTION_TEXT)
-
-            # Check 5.
-            print_verbose(f'\tCheck row filters:', end='...', verbose=self.output_verbose, **OUTPUT_TEXT)
-            if str(row.filter_rows).lower() not in invalid and row.filter_rows is not None:
-                self.batch_df.at[row.Index, 'filter_rows'] = self.prepare_row_filters(row.filter_rows)
-                print_verbose(f'Ok', verbose=self.output_verbose, **OUTPUT_TEXT)
-            else:
-                print_verbose(f'Ok. No filters exist.', verbose=self.output_verbose, **OUTPUT_TEXT)
+                t_used |= filter_mask(t_data_df, row.filter_rows)
+            except ValueError as e:
+                report.add(self._batch_worksheet, f'{e}', [row.Index], 'filter_rows')
+        return t_data_df, t_photo_paths, t_used
 
-            # Check 6.
-            print_verbose(f'\tCheck drop empty columns', verbose=self.output_verbose, end='...', **OUTPUT_TEXT)
-            if row.drop_empty_columns is None:
-                self.batch_df.at[row.Index, 'drop_empty_columns'] = False
-                print_verbose(f'Ok', verbose=self.output_verbose, **OUTPUT_TEXT)
-            else:
-                print_verbose(f'Ok', verbose=self.output_verbose, **OUTPUT_TEXT)
-
-            # Check 7
-            print_verbose(f'\tCheck header row details', verbose=self.output_verbose, end='...', **OUTPUT_TEXT)
-            if row.header_row is None:
-                self.batch_df.at[row.Index, 'header_row'] = 0
-            print_verbose(f'Ok', verbose=self.output_verbose, **OUTPUT_TEXT)
-
-    def check_structure_worksheet_data(self):
-        """
-        Check 1: Confirm expected batch headers exist in the batch worksheet.
-        Check 2: Confirm the expected section types exist.
-        Check 3: Confirm the section_contains values exist in the structure document.
-        Check 4: Check the photo file paths and resolve
-        Check 5: Check if section_break is None, set it to False.
-        Check 6: Check if page_break is None, set it to False.
-        :return:
-        """
-        t_structure_headers = list(self.t_structure_df)
-
-        # Check 1
-        self.data_check(f'  Check structure work sheet headers', f'Ok',
-                        [(EXPECTED_STRUCTURE_HEADERS, t_structure_headers)], compare='subset')
-        t_structure_section_types = list(self.t_structure_df.loc[:, 'section_type'])
-        t_data_section_types = list(self.t_data_df)
-
-        # Check 2
-        t_structure_section_contains: List = []
-        for each in list(self.t_structure_df.loc[:, 'section_contains']):
-            for item in split_str(each):
-                t_structure_section_contains.append(item)
-        self.data_check(f'  Check structure worksheet section_types are correct.', f'Ok',
-                        [(EXPECTED_SECTION_TYPES, t_structure_section_types)], compare='part')
-
-        # Check 3
-        self.data_check(f'  Check structure worksheet section_contain details are correct.', f'Ok',
-                        [(t_data_section_types, t_structure_section_contains)], compare='part')
-
-        for row in self.t_structure_df.itertuples():
-            # Check 4
-            if 'photo' == str(row.section_type).lower():
-                root = self._input_fp.parent
-                try:
-                    print_verbose(f'  Row {row.Index}: Check file {row.path}', verbose=self.output_verbose,
-                                  **OUTPUT_TEXT)
-                    t_photo_path = resolve_file_path(root.joinpath(row.path))
-                    if t_photo_path.is_dir():
-                        self.batch_df.at[row.Index, 'path'] = t_photo_path
-                        # Add the photo path to the dictionary with the section_contains as the key
-                        self.t_structure_photo_path[row.section_contains] = t_photo_path
-                    print_verbose(f'\t{self.t_structure_photo_path[row.section_contains]}', verbose=self.output_verbose,
-                                  **OUTPUT_TEXT)
-
-                except ValueError as v:
-                    print_verbose(f'{v}: Row {row.Index} - Photo directory {row.path} cannot be found at the given '
-                                  f'locaton.', True, **EXCEPTION_TEXT)
-                except Exception as e:
-                    print_verbose(f'{e}: Row {row.Index}\n{row}', True, **EXCEPTION_TEXT)
-
-            # Check 5.
-            print_verbose(f'\tCheck section break details', verbose=self.output_verbose, end='...', **OUTPUT_TEXT)
-            if row.section_break is None:
-                self.batch_df.at[row.Index, 'section_break'] = False
-            print_verbose(f'Ok', verbose=self.output_verbose, **OUTPUT_TEXT)
-
-            # Check 6.
-            print_verbose(f'\tCheck page break details', verbose=self.output_verbose, end='...', **OUTPUT_TEXT)
-            if row.page_break is None:
-                self.batch_df.at[row.Index, 'page_break'] = False
-            print_verbose(f'Ok', verbose=self.output_verbose, **OUTPUT_TEXT)
-
-    def check_data_worksheet_data(self):
-        """
-        Check 1. Check that the photos exist in the directory. The check assumes that the first file name with the same
-        name is the correct file if no filename has been provided in the worksheet. The check assumes that all photo
-        names are unique regardless of photo directory.
-        :return:
-        """
-        # Check 1. check the photo paths.
-        t_photos_found: Dict[str, Path] = {}
-        # Assuming that that there may be more than one directory containing photos for the worksheet loop through the
-        # each folder.
-        columns = self.t_structure_photo_path.keys()
-        print_verbose(f'  Photos are located in the following data worksheet columns:', verbose=self.output_verbose,
-                      **OUTPUT_TEXT)
-        t_columns = enumerate(columns, 1)
-        for item, col in t_columns:
-            print_verbose(f'\t{item}\t{col}', verbose=self.output_verbose, **OUTPUT_TEXT)
-
-        # Grab the photos stored in the folders and store their paths in dictionary. Store them in the dictionary
-        # with their name minus the file extension as the key.
-        for col in columns:
-            for file_ext in photo_formats:
-                for file in self.t_structure_photo_path[col].glob('*' + file_ext):
-                    t_photos_found[file.name] = file
-            # For each of the columns containing photos loop through the self.t_data_df and replace the file name with
-            # the path.
-            t_df_rows = self.t_data_df.itertuples()
-            for row in t_df_rows:
-                # The row below must remain in this position
-                col = str(col).lower()
-                t_row = row._asdict()
-                t_row_photo = []
-                print_verbose(f'  Row {row.Index}:', verbose=self.output_verbose, **OUTPUT_TITLE)
-                if str(t_row[col]).lower() not in ['no photo', 'none', 'nan', '-']:
-                    for t in split_str(t_row[col]):
-                        try:
-                            t_row_photo.append(self.check_photo_paths(t, t_photos_found))
-                        except Exception as e:
-                            print_verbose(f'{e}: Row {row.Index} - {t_row[col]}', True, **EXCEPTION_TEXT)
-                        self.t_data_df.at[t_row['Index'], col] = t_row_photo
-                if isinstance(self.t_data_df.at[t_row['Index'], col], Iterable):
-                    for fp in self.t_data_df.at[t_row['Index'], col]:
-                        if isinstance(fp, Path):
-                            print_verbose(f'\t{str(fp)}', verbose=self.output_verbose, **OUTPUT_TEXT)
+    def structure_columns(self, structure_worksheet: str) -> (set, None):
+        """
+        Return the names of the data worksheet columns referenced by the structure worksheet's section_contains, or
+        None if they cannot be found. Any errors in the structure worksheet are reported when it is checked.
+        :param structure_worksheet: The name of the structure worksheet.
+        :return:
+        """
+        t_structure_df = self.load_worksheet(structure_worksheet, header_row=0, clean_header=True,
+                                             drop_empty_rows=False)
+        if 'section_contains' not in t_structure_df.columns:
+            return None
+        t_columns = set()
+        for each in t_structure_df.loc[:, 'section_contains']:
+            t_columns.update(split_str(str(each).lower()))
+        return t_columns
+
+    def check_structure_worksheet_data(self, worksheet: str = 'structure'):
+        """
+        Convert the structure worksheet and find its photo directories. The structure worksheet has already been
+        checked against the data worksheet, see check_batch_rows_data(). See laundry.validation.validate_structure().
+        :param worksheet: The name of the structure worksheet.
+        :return:
+        """
+        report = ValidationReport()
+        self.t_structure_df, self.t_structure_photo_path = validate_structure(
+            self.t_structure_df, report, worksheet, self._input_fp.parent)
+        for col, path in self.t_structure_photo_path.items():
+            log.info('  Photo column %s: %s', col, path)
+        report.log_issues()
+        report.raise_for_errors(f'The structure worksheet {worksheet} check')
+
+    def check_data_worksheet_data(self, worksheet: str = 'data'):
+        """
+        Find the photos in the directory. The check assumes that the first file name with the same name is the correct
+        file if no filename has been provided in the worksheet. Where more than one file shares the name the
+        photo_formats order is used to select the file. Each photo directory is indexed once and the index is shared
+        between batch rows. The photos that cannot be found, and the ambiguous names, have already been reported by
+        check_batch_rows_data(), so they are only reported again if a photo has since been removed. See
+        laundry.validation.validate_photos().
+        :param worksheet: The name of the data worksheet.
+        :return:
+        """
+        report = ValidationReport()
+        self.t_data_df = validate_photos(self.t_data_df, self.t_structure_photo_path, report, worksheet)
+        if log.isEnabledFor(logging.DEBUG):
+            for col in self.t_structure_photo_path:
+                log.debug('Photos in the data worksheet column %s', col, extra=style(DATAFRAME_TITLE))
+                log.debug('%s', self.t_data_df[str(col).lower()])
+        if not report.ok:
+            report.log_issues()
+        report.raise_for_errors(f'The data worksheet {worksheet} check')
 
     @staticmethod
-    def check_photo_paths(expected_photo: (Path, str), actual_photos: dict) -> Path:
+    def check_photo_paths(expected_photo: (Path, str), actual_photos: (PhotoIndex, dict)) -> Path:
         """
-        Check 1. Check that the photo could be an image file.
-        Check 2. If the expected_photo does not have a file extension then loop through photo_formats and see if the
-        file does exist.
-        Check 3. If the expected_photo does have a file extension then check that the file does exist.
-        The method will raise exceptions if the file is not found
+        Check that the photo could be an image file and find it. If more than one file shares the photo's name the
+        ambiguity is reported. See laundry.validation.find_photo().
         :param expected_photo:
-        :param actual_photos:
-        :return:
-        """
-        # Check 1
-        photo = expected_photo.strip()
-        if Path(photo).suffix is not '' and Path(photo).suffix not in photo_formats:
-            raise ValueError(f'The data worksheet photo {photo} is not been specified as a photo. Ensure that the'
-                             f' file format is one of the following formats {photo_formats}.')
-        # Check 2
-        elif Path(photo).suffix is '':
-            for ext in photo_formats:
-                try:
-                    t_photo_name = str(photo + ext)
-                    if actual_photos[t_photo_name]:
-                        return Path(actual_photos[t_photo_name]).resolve(strict=True)
-                except KeyError as k:
-                    print_verbose(f'{k}', True, **EXCEPTION_TEXT)
-            raise ValueError(f'The photo {photo} does not exist in the specified directory.')
-        # Check 3
-        elif Path(photo).suffix in photo_formats:
-            try:
-                if actual_photos[photo]:
-                    return Path(actual_photos[photo]).resolve(strict=True)
-            except KeyError as k:
-                print_verbose(f'{k}. The photo {photo} does not exist in the directory.', True, **EXCEPTION_TEXT)
-
-        raise ValueError(f'The photo {photo} does not appear to exist in the directory.')
+        :param actual_photos: The PhotoIndex for the photo directory, or a dict of the photos' paths by file name.
+        :return:
+        """
+        if not isinstance(actual_photos, PhotoIndex):
+            actual_photos = PhotoIndex.from_paths(actual_photos)
+        t_photo, t_ambiguous = find_photo(str(expected_photo), actual_photos)
+        if t_ambiguous:
+            log.warning('The photo %s matches more than one file %s. %s will be used.', str(expected_photo).strip(),
+                        [p.name for p in t_ambiguous], t_ambiguous[0].name)
+        return t_photo
 
     @staticmethod
     def excel_to_dataframe(io, worksheet: str, header_row: int = 0, clean_header: bool = False,
-                           drop_empty_rows: bool = False) -> data_frame:
+                           drop_empty_rows: bool = False, row_filter: List[RowFilter] = None,
+                           columns: Tuple[str, ...] = None, dtypes: Dict[str, str] = None) -> data_frame:
         """
         Open and perform basic cell_data cleaning on a single excel work worksheet.
-        :param io: The Excel file to be read.
+        :param io: The Excel file to be read. This may be a WorkbookReader or anything accepted by pd.read_excel().
         :param worksheet: The Excel spreadsheet worksheet's name.
         :param header_row: index of the header row in the spreadsheet. Defaults to 0, i.e. assumes the headers are at
         the top of the page.
         :param clean_header: If True clean the column headers
         :param drop_empty_rows: If True remove empty rows.
+        :param row_filter: If provided, and io is a WorkbookReader that supports it, rows that cannot meet these
+        filters are discarded while the worksheet is read.
+        :param columns: If provided, only these columns are returned. If io is a WorkbookReader that supports it, the
+        other columns are not parsed.
+        :param dtypes: The dtype of each of the named columns. Columns that are not in the worksheet are ignored.
         :return:
         """
-        df = pd.read_excel(io, worksheet, header_row)
+        t_projection = None
+        if columns is not None:
+            t_projection = ColumnProjection(columns, clean_header is not False, 2 if drop_empty_rows is True else None)
+        t_projected = False
+        if isinstance(io, WorkbookReader):
+            df = io.read_sheet(worksheet, header_row, RowPrefilter(row_filter, clean_header) if row_filter else None,
+                               t_projection)
+            # The reader has already removed the empty rows, counting the values of every column.
+            t_projected = io.supports_projection and t_projection is not None
+        else:
+            df = pd.read_excel(io, sheet_name=worksheet, header=header_row, **PARSER_NA_OPTIONS)
         if clean_header is not False:
             try:
                 df = df.clean_names()
             except KeyError as k:
-                print_verbose(f'{k}', True, **EXCEPTION_TEXT)
-        if drop_empty_rows is True:
+                log.error('%s', k)
+        if drop_empty_rows is True and not t_projected:
             try:
                 df = df.dropna(thresh=2)
             except KeyError as k:
-                print_verbose(f'{k}', True, **EXCEPTION_TEXT)
+                log.error('%s', k)
+        if columns is not None and not t_projected:
+            df = df.loc[:, [column in t_projection.columns for column in df.columns]]
+        if dtypes:
+            df = df.astype({column: dtype for column, dtype in dtypes.items() if column in df.columns})
         return df
 
     @staticmethod
-    def prepare_row_filters(filters: str) -> List[Tuple[Any, list]]:
+    def prepare_row_filters(filters: str) -> List[RowFilter]:
         """
-        Split the passed string into a list of Tuples taking the form (column_name, filter_keyword)
+        Parse the filter_rows text into a list of filters. See laundry.filters for the filter language.
         :param filters:
         :return:
         """
-        filtered_list = []
-        i = []
-        if '\n' in filters:
-            i = str(filters).splitlines()
-        else:
-            i.append(filters)
-        for each in i:
-            col, b = each.split(':')
-            col_kw = strip_whitespace(b.split(','))
-            filtered_list.append((col, col_kw))
-        return filtered_list
+        return parse_filters(filters)
 
     @staticmethod
     def compare_lists(expected_list, actual_list):
@@ -739,47 +1532,51 @@ class Laundry:
             if each.lower() not in expected_list:
                 raise ValueError(f'The provided headers:\n\t{actual_list}\ndo not match the required headers'
                                  f'\n\t{expected_list}.')
-        else:
-            return True
+        return True
 
     def data_check(self, check_text: str, success_text: str, comparision_list: List[tuple], compare: str):
         """
-        :param check_text:
-        :param success_text:
-        :param comparision_list:
-        :param compare:
+        Compare lists of headers, exiting if they do not match. The worksheets themselves are checked by
+        laundry.validation.
+        :param check_text: The text logged before the comparison.
+        :param success_text: The text logged if the lists match.
+        :param comparision_list: The (expected, actual) lists to be compared.
+        :param compare: 'subset' if each expected list must be a subset of the actual list, or 'part' if each item of
+        the actual list must be in the expected list.
         :return:
         """
         try:
-            print_verbose(f'{check_text}', verbose=self.output_verbose, end='...', **OUTPUT_TEXT)
-            if compare is 'subset':
-                for expected, actual in comparision_list:
+            log.info('%s', check_text, extra=style(OUTPUT_TEXT, end='...'))
+            for expected, actual in comparision_list:
+                if compare == 'subset':
                     self.compare_lists(expected, actual)
-            if compare is 'part':
-                for expected, actual in comparision_list:
+                elif compare == 'part':
                     self.in_lists(expected, actual)
-            print_verbose(f'{success_text}', verbose=self.output_verbose, **OUTPUT_TEXT)
+            log.info('%s', success_text, extra=style(OUTPUT_TEXT))
         except ValueError as v:
-            print_verbose(f'\nValueError:\n{v}', True, **EXCEPTION_TEXT)
-            exit_app()
+            log.error('\nValueError:\n%s', v)
+            exit_app(1)
         except Exception as e:
-            print_verbose(f'General exception {e}', True, **EXCEPTION_TEXT)
-            exit_app()
+            log.error('General exception %s', e)
+            exit_app(1)
 
     def check_dataframe(self, title: str, check_dataframe: pd.DataFrame, worksht_title: str, check_method,
                         complete_check: str, check_worksheet: str = '', exception_text: str = ''):
         try:
-            print_verbose(f'{title}: {check_worksheet}', verbose=self.output_verbose, **DATAFRAME_TITLE)
-            print_verbose(f'{check_dataframe}', verbose=self.output_verbose, **DATAFRAME_TEXT)
-            print_verbose(f'{worksht_title}: {check_worksheet}', verbose=self.output_verbose, **OUTPUT_TITLE)
+            log.debug('%s: %s', title, check_worksheet, extra=style(DATAFRAME_TITLE))
+            log.debug('%s', check_dataframe)
+            log.info('%s: %s', worksht_title, check_worksheet, extra=style(OUTPUT_TITLE))
             check_method()
-            print_verbose(f'{complete_check}: {check_worksheet}', verbose=self.output_verbose, **OUTPUT_TITLE)
+            log.info('%s: %s', complete_check, check_worksheet, extra=style(OUTPUT_TITLE))
+        except ValidationError as v:
+            log.error('%s', v)
+            exit_app(1)
         except KeyError as k:
-            print_verbose(f'KeyError {k}: ', True, **EXCEPTION_TEXT)
-            exit_app()
+            log.error('KeyError %s: ', k)
+            exit_app(1)
         except ValueError as v:
-            print_verbose(f'\nValueError {v}: \n', True, **EXCEPTION_TEXT)
-            exit_app()
+            log.error('\nValueError %s: \n', v)
+            exit_app(1)
         except Exception as e:
-            print_verbose(f'{e}: ', True, **EXCEPTION_TEXT)
-            exit_app()
+            log.error('%s: ', e)
+            exit_app(1)
@@ -0,0 +1,199 @@
+"""
+Console output. Messages are logged to the 'laundry' logger at one of these levels:
+
+    debug   Diagnostics, such as the content of each worksheet. Large values are only formatted if they are shown.
+    info    The progress of each check. Shown when --verbose is True, the default.
+    notice  The results of the run, such as each output file that is saved. Always shown.
+    warning Problems that do not stop the run.
+    error   Problems that stop a batch row or the run.
+
+The text format is coloured as the messages have always been. The json format writes one JSON object per message, for
+log collectors. Output is written to the current sys.stdout, which is buffered, and is only flushed for errors.
+"""
+from colorama import Fore, Back, Style
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List
+import json
+import logging
+import sys
+
+NOTICE = 25
+logging.addLevelName(NOTICE, 'NOTICE')
+LOG_LEVELS: Dict[str, int] = {'debug': logging.DEBUG, 'info': logging.INFO, 'notice': NOTICE,
+                              'warning': logging.WARNING, 'error': logging.ERROR}
+LOG_FORMATS = ['text', 'json']
+DEFAULT_LOG_FORMAT = 'text'
+
+OUTPUT_TITLE = {'fore_colour': 'GREEN', 'style_colour': 'BRIGHT'}
+OUTPUT_TEXT = {'fore_colour': 'GREEN', 'style_colour': 'DIM'}
+EXCEPTION_TEXT = {'fore_colour': 'RED', 'style_colour': 'BRIGHT'}
+DATAFRAME_TITLE = {'fore_colour': 'BLUE', 'style_colour': 'BRIGHT'}
+DATAFRAME_TEXT = {'fore_colour': 'BLACK', 'back_colour': 'BLUE'}
+FAULTFIND_TEXT = {'fore_colour': 'BLACK', 'back_colour': 'GREEN'}
+OUTPUT_SUCCESS = {'fore_colour': 'CYAN', 'back_colour': 'BLACK', 'style_colour': 'BRIGHT'}
+# The colours of a message that does not set its own.
+LEVEL_COLOURS: Dict[int, Dict[str, str]] = {logging.DEBUG: DATAFRAME_TEXT, logging.INFO: OUTPUT_TEXT,
+                                            NOTICE: OUTPUT_SUCCESS, logging.WARNING: EXCEPTION_TEXT,
+                                            logging.ERROR: EXCEPTION_TEXT}
+
+FORE = {'BLACK': Fore.BLACK, 'RED': Fore.RED, 'GREEN': Fore.GREEN, 'YELLOW': Fore.YELLOW, 'BLUE': Fore.BLUE,
+        'MAGENTA': Fore.MAGENTA, 'CYAN': Fore.CYAN, 'WHITE': Fore.WHITE, 'RESET': Fore.RESET}
+BACK = {'BLACK': Back.BLACK, 'RED': Back.RED, 'GREEN': Back.GREEN, 'YELLOW': Back.YELLOW, 'BLUE': Back.BLUE,
+        'MAGENTA': Back.MAGENTA, 'CYAN': Back.CYAN, 'WHITE': Back.WHITE, 'RESET': Back.RESET}
+STYLE = {'DIM': Style.DIM, 'NORMAL': Style.NORMAL, 'BRIGHT': Style.BRIGHT, 'RESET_ALL': Style.RESET_ALL}
+
+log = logging.getLogger('laundry')
+
+
+def colour_codes(fore_colour: str = 'RESET', back_colour: str = 'RESET', style_colour: str = 'NORMAL') -> str:
+    """
+    :param fore_colour: The text's colour.
+    :param back_colour: The background colour.
+    :param style_colour: The text style.
+    :return: The colorama codes that start the colours.
+    """
+    codes = ''
+    if fore_colour is not None:
+        codes += FORE[fore_colour.upper()]
+    if back_colour is not None:
+        codes += BACK[back_colour.upper()]
+    if style_colour is not None:
+        codes += STYLE[style_colour.upper()]
+    return codes
+
+
+def style(colour: Dict[str, str] = None, end: str = None, **data) -> Dict[str, Any]:
+    """
+    Return the extra argument of a logging call that sets how the message is shown.
+    :param colour: The colours of the message in the text format, e.g. OUTPUT_TITLE.
+    :param end: The text written after the message in the text format, in place of a new line.
+    :param data: Values added to the message in the json format.
+    :return: Dict
+    """
+    extra: Dict[str, Any] = {'data': data}
+    if colour is not None:
+        extra['colour'] = colour
+    if end is not None:
+        extra['end'] = end
+    return extra
+
+
+def notice(msg: str, *args, **kwargs):
+    """Log a message at the NOTICE level."""
+    log.log(NOTICE, msg, *args, **kwargs)
+
+
+class TextFormatter(logging.Formatter):
+    """Format a message in its colours."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = record.getMessage()
+        if record.exc_info:
+            text = f'{text}\n{self.formatException(record.exc_info)}'
+        t_colour = getattr(record, 'colour', None) or LEVEL_COLOURS.get(record.levelno, OUTPUT_TEXT)
+        t_colour = {'fore_colour': 'RESET', 'back_colour': 'RESET', 'style_colour': 'NORMAL', **t_colour}
+        return f'{colour_codes(**t_colour)}{text}{Style.RESET_ALL}'
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a message as a JSON object on a single line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        t_message = {'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+                     'level': record.levelname.lower(), 'message': record.getMessage().strip()}
+        t_message.update(getattr(record, 'data', None) or {})
+        if record.exc_info:
+            t_message['exception'] = self.formatException(record.exc_info)
+        return json.dumps(t_message, default=str)
+
+
+class ConsoleHandler(logging.StreamHandler):
+    """
+    Write messages to the current sys.stdout, so output captured using contextlib.redirect_stdout() includes them. The
+    stream is only flushed for errors.
+    """
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            t_end = '\n' if isinstance(self.formatter, JsonFormatter) else getattr(record, 'end', '\n')
+            self.stream.write(self.format(record) + t_end)
+            if record.levelno >= logging.ERROR:
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+class RecordCapture(logging.Handler):
+    """
+    Keep the messages logged in a worker process, in place of writing them, so the parent process can log them in
+    batch order. Each message is kept as a dict that can be pickled, with its arguments and exception formatted.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.records: List[Dict[str, Any]] = []
+
+    def emit(self, record: logging.LogRecord):
+        t_record = dict(record.__dict__, msg=record.getMessage(), args=None, exc_info=None, exc_text=None)
+        if record.exc_info:
+            t_record['msg'] = f'{t_record["msg"]}\n{logging.Formatter().formatException(record.exc_info)}'
+        self.records.append(t_record)
+
+
+@contextmanager
+def captured() -> Iterator[RecordCapture]:
+    """
+    Capture the messages logged inside the with block, in place of writing them to the console.
+    :return: The RecordCapture holding the messages.
+    """
+    capture = RecordCapture()
+    t_handlers, t_propagate = log.handlers, log.propagate
+    log.handlers, log.propagate = [capture], False
+    try:
+        yield capture
+    finally:
+        log.handlers, log.propagate = t_handlers, t_propagate
+
+
+def replay(records: List[Dict[str, Any]]):
+    """
+    Log the messages captured by captured(), such as those of a worker process, through the console output.
+    :param records: RecordCapture.records.
+    :return:
+    """
+    for t_record in records or []:
+        record = logging.makeLogRecord(t_record)
+        if log.isEnabledFor(record.levelno):
+            log.handle(record)
+
+
+def configure_logging(log_level: str = 'info', log_format: str = DEFAULT_LOG_FORMAT):
+    """
+    Set the level and format of the console output. Any console output set up earlier is replaced. While messages are
+    captured by captured(), only the level is set.
+    :param log_level: One of LOG_LEVELS.
+    :param log_format: One of LOG_FORMATS.
+    :return:
+    """
+    if log_level not in LOG_LEVELS:
+        raise ValueError(f'The log level {log_level!r} is not one of {list(LOG_LEVELS)}.')
+    if log_format not in LOG_FORMATS:
+        raise ValueError(f'The log format {log_format!r} is not one of {LOG_FORMATS}.')
+    log.setLevel(LOG_LEVELS[log_level])
+    log.propagate = False
+    if any(isinstance(handler, RecordCapture) for handler in log.handlers):
+        return
+    for handler in [handler for handler in log.handlers if isinstance(handler, ConsoleHandler)]:
+        log.removeHandler(handler)
+    handler = ConsoleHandler()
+    handler.setFormatter(JsonFormatter() if log_format == 'json' else TextFormatter())
+    log.addHandler(handler)
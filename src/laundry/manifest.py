@@ -0,0 +1,172 @@
+"""
+The build manifest used to skip output files whose inputs have not changed. Each output directory contains a
+MANIFEST_FILE that records, for each output file, the content hashes of the inputs it was built from:
+
+    data       The filtered data worksheet rows.
+    structure  The structure worksheet.
+    template   The template file.
+    photos     Each photo referenced by the data rows.
+    options    The laundry version and the options that change the output file, such as --photo-dpi.
+
+An output file is rebuilt if any of the hashes differ, or if the output file has been changed or removed since it was
+built. Photos are only hashed again if their size or modification time has changed.
+"""
+from laundry.constants import laundry_version
+from laundry.worksheet_cache import file_digest
+from typing import Any, Dict, Iterable, NamedTuple, Tuple
+from datetime import datetime, timezone
+from pathlib import Path
+import hashlib
+import json
+import os
+import threading
+import pandas as pd
+
+MANIFEST_FILE = '.laundry-manifest.json'
+
+
+class BuildRecord(NamedTuple):
+    """The inputs of an output file, and the files produced from them."""
+    fingerprint: Dict[str, str]
+    photos: Dict[str, list]
+    files: Dict[str, list] = None
+    skipped: bool = False
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """
+    Return a content hash of a DataFrame's column names, dtypes and values.
+    :param df: The DataFrame to be hashed.
+    :return: str
+    """
+    digest = hashlib.sha256(repr([list(df.columns), [str(dtype) for dtype in df.dtypes]]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=True).values.tobytes())
+    return digest.hexdigest()
+
+
+def options_digest(options: Dict[str, Any]) -> str:
+    """
+    :param options: The options that change the output file.
+    :return: A hash of the options and the laundry version.
+    """
+    return hashlib.sha256(repr([laundry_version, sorted(options.items())]).encode('utf-8')).hexdigest()
+
+
+def file_stat(path: (Path, str)) -> list:
+    """
+    :return: The size and modification time of a file, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class BuildManifest:
+    """
+    Read and update the manifests of the output directories. Manifests are read when they are first needed and written
+    by save(). Manifests may be read on one thread while they are saved on another, see laundry.pipeline.
+    """
+
+    def __init__(self):
+        self._manifests: Dict[Path, Dict[str, Any]] = {}
+        # Photo hashes by path, size and modification time, including those recorded by earlier runs.
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def manifest_path(output_file: (Path, str)) -> Path:
+        return Path(output_file).resolve().parent.joinpath(MANIFEST_FILE)
+
+    def manifest(self, output_file: (Path, str)) -> Dict[str, Any]:
+        """
+        Return the manifest of the output file's directory, reading it if it has not been read. A manifest that cannot
+        be read is treated as empty, so every output file in the directory is rebuilt.
+        :param output_file: The output file.
+        :return: Dict
+        """
+        path = self.manifest_path(output_file)
+        with self._lock:
+            if path not in self._manifests:
+                try:
+                    manifest = json.loads(path.read_text())
+                    if not isinstance(manifest.get('outputs'), dict):
+                        raise ValueError(f'{path} has no outputs.')
+                except (OSError, ValueError):
+                    manifest = {'outputs': {}}
+                for entry in manifest['outputs'].values():
+                    for photo, (size, mtime, digest) in entry.get('photos', {}).items():
+                        self._digests.setdefault((photo, size, mtime), digest)
+                self._manifests[path] = manifest
+            return self._manifests[path]
+
+    def photos_fingerprint(self, photos: Iterable[Path]) -> Tuple[str, Dict[str, list]]:
+        """
+        Hash the photos in the order they are used.
+        :param photos: The photo files.
+        :return: The combined hash, and the size, modification time and hash of each photo.
+        """
+        digest = hashlib.sha256()
+        records: Dict[str, list] = {}
+        for photo in photos:
+            t_photo = str(photo)
+            if t_photo not in records:
+                t_stat = file_stat(photo)
+                if t_stat is None:
+                    records[t_photo] = [None, None, None]
+                else:
+                    key = (t_photo, *t_stat)
+                    if key not in self._digests:
+                        self._digests[key] = file_digest(photo)
+                    records[t_photo] = [*t_stat, self._digests[key]]
+            digest.update(f'{t_photo}\0{records[t_photo][2]}\0'.encode('utf-8'))
+        return digest.hexdigest(), records
+
+    def is_current(self, output_file: (Path, str), build: BuildRecord) -> bool:
+        """
+        :param output_file: The output file.
+        :param build: The inputs the output file would be built from. files is not used.
+        :return: True if the output file was built from the same inputs and its files have not changed since.
+        """
+        entry = self.manifest(output_file)['outputs'].get(Path(output_file).name)
+        if entry is None or entry.get('fingerprint') != build.fingerprint:
+            return False
+        t_directory = Path(output_file).resolve().parent
+        return all(file_stat(t_directory.joinpath(name)) == stat for name, stat in entry.get('files', {}).items())
+
+    def record(self, output_file: (Path, str), build: BuildRecord):
+        """
+        Record the inputs and files of a built output file. A skipped output file keeps its existing entry.
+        :param output_file: The output file.
+        :param build: The BuildRecord returned by Laundry.wash_batch_row().
+        :return:
+        """
+        if build.skipped:
+            return
+        self.manifest(output_file)['outputs'][Path(output_file).name] = {
+            'fingerprint': build.fingerprint, 'photos': build.photos, 'files': build.files,
+            'built': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+
+    def discard(self, output_file: (Path, str)):
+        """
+        Remove the entry of an output file that failed, so that it is rebuilt by the next run.
+        :param output_file: The output file.
+        :return:
+        """
+        self.manifest(output_file)['outputs'].pop(Path(output_file).name, None)
+
+    def save(self):
+        """
+        Write the manifests. Each is written to a temporary file first so an interrupted run never leaves a partially
+        written manifest.
+        :return:
+        """
+        with self._lock:
+            for path, manifest in self._manifests.items():
+                if not path.parent.is_dir():
+                    continue
+                manifest['laundry_version'] = laundry_version
+                t_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+                t_path.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+                os.replace(t_path, path)
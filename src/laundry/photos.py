@@ -0,0 +1,128 @@
+"""
+Index the photo directories referenced by structure worksheets. Each directory is scanned once and shared by every
+batch row and photo column that references it.
+"""
+from laundry.constants import photo_formats
+from typing import Dict, List
+from pathlib import Path
+import os
+
+
+class PhotoIndex:
+    """
+    Map the photos in a directory by file name, and by file name without its extension (stem), to their resolved
+    paths. The directory is read using a single scan and no further file system calls are made when photos are found.
+    """
+
+    def __init__(self, directory: (Path, str)):
+        """
+        :param directory: The directory containing the photos.
+        """
+        self.directory: Path = Path(directory).resolve(strict=True)
+        stat = self.directory.stat()
+        self.mtime_ns: int = stat.st_mtime_ns
+        t_photos: Dict[str, Path] = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                suffix = os.path.splitext(entry.name)[1]
+                if suffix not in photo_formats or not entry.is_file():
+                    continue
+                if entry.is_symlink():
+                    t_photos[entry.name] = Path(entry.path).resolve()
+                else:
+                    t_photos[entry.name] = self.directory.joinpath(entry.name)
+        self._index(t_photos)
+
+    @classmethod
+    def from_paths(cls, photos: Dict[str, Path]) -> 'PhotoIndex':
+        """
+        Return an index of photos that have already been found, rather than of a directory.
+        :param photos: The photos' paths by file name.
+        :return: PhotoIndex
+        """
+        index = cls.__new__(cls)
+        index.directory = None
+        index.mtime_ns = None
+        index._index({name: Path(path) for name, path in photos.items()
+                      if os.path.splitext(name)[1] in photo_formats})
+        return index
+
+    def _index(self, photos: Dict[str, Path]):
+        """
+        Map the photos by file name and by stem.
+        :param photos: The photos' paths by file name.
+        :return:
+        """
+        self._by_name: Dict[str, Path] = dict(photos)
+        self._by_stem: Dict[str, List[Path]] = {}
+        for name, path in photos.items():
+            self._by_stem.setdefault(os.path.splitext(name)[0], []).append(path)
+        # Where more than one photo shares a stem, the photo_formats order decides which is used.
+        for paths in self._by_stem.values():
+            paths.sort(key=lambda p: photo_formats.index(p.suffix))
+
+    def __len__(self) -> int:
+        return len(self._by_name)
+
+    def is_current(self) -> bool:
+        """
+        Return True if the directory has not changed since it was indexed.
+        :return: bool
+        """
+        if self.directory is None:
+            return True
+        try:
+            return self.directory.stat().st_mtime_ns == self.mtime_ns
+        except OSError:
+            return False
+
+    def find(self, photo: str) -> Path:
+        """
+        Return the resolved path of a photo. If the photo has no file extension it is found using its stem.
+        :param photo: The photo's file name, with or without its extension.
+        :return: Path
+        """
+        if os.path.splitext(photo)[1] == '':
+            paths = self._by_stem.get(photo)
+            if paths:
+                return paths[0]
+            raise ValueError(f'The photo {photo} does not exist in the specified directory.')
+        try:
+            return self._by_name[photo]
+        except KeyError:
+            raise ValueError(f'The photo {photo} does not appear to exist in the directory.')
+
+    def ambiguous(self, photo: str) -> List[Path]:
+        """
+        Return the photos sharing the stem if a photo without a file extension matches more than one file, otherwise
+        an empty list.
+        :param photo: The photo's file name.
+        :return: List[Path]
+        """
+        if os.path.splitext(photo)[1] == '':
+            paths = self._by_stem.get(photo, [])
+            if len(paths) > 1:
+                return list(paths)
+        return []
+
+    @property
+    def ambiguous_stems(self) -> Dict[str, List[Path]]:
+        return {stem: list(paths) for stem, paths in self._by_stem.items() if len(paths) > 1}
+
+
+_photo_indexes: Dict[str, PhotoIndex] = {}
+
+
+def get_photo_index(directory: (Path, str)) -> PhotoIndex:
+    """
+    Return the PhotoIndex for a directory. Indexes are shared for the life of the process and are rebuilt only if the
+    directory has changed.
+    :param directory: The directory containing the photos.
+    :return: PhotoIndex
+    """
+    key = str(directory)
+    index = _photo_indexes.get(key)
+    if index is None or not index.is_current():
+        index = PhotoIndex(directory)
+        _photo_indexes[key] = index
+    return index
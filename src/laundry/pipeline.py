@@ -0,0 +1,134 @@
+"""
+Overlap the stages of washing the batch rows in a single process. Washing a batch row reads its worksheets, filters
+and checks them, renders the output document and saves it. Saving zip-compresses the document, and reading and
+checking spend much of their time in pandas and in finding photos, so while one row renders the next row is prepared
+on one thread and the previous row's document is saved on another:
+
+    prepare thread      load, filter and check row N+1
+    main thread         render row N
+    writer thread       save row N-1
+
+The rows are rendered and their results recorded in batch order. The number of rows prepared ahead of the renderer,
+and of documents waiting to be saved, is limited by the pipeline depth, so at most that many prepared rows and
+rendered documents are held in memory. If a row fails while it is prepared, the rows after it are not prepared and
+the failure is raised when the renderer reaches it, as it would be if the rows were washed in sequence.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import deque
+from typing import Any, Callable, Iterable, Iterator
+
+# The number of batch rows prepared ahead of the renderer, and of output documents waiting to be saved.
+DEFAULT_PIPELINE_DEPTH = 2
+
+
+class PipelineStopped(Exception):
+    """Raised in place of preparing a batch row once an earlier row has failed or the pipeline has been closed."""
+    pass
+
+
+class BatchPipeline:
+    """
+    The prepare and writer threads of a pipelined run. The renderer iterates over prepared() and submits each save to
+    the writer.
+    """
+
+    def __init__(self, prepare: Callable[[Any], Any], depth: int = DEFAULT_PIPELINE_DEPTH):
+        """
+        :param prepare: Load, filter and check a batch row, returning what the renderer needs. Called on the prepare
+        thread, one row at a time in batch order.
+        :param depth: The number of rows prepared ahead of the renderer, and of documents waiting to be saved.
+        """
+        if depth < 1:
+            raise ValueError(f'The pipeline depth must be at least 1, not {depth}.')
+        self._prepare: Callable[[Any], Any] = prepare
+        self.depth: int = depth
+        self._stopped: bool = False
+        self._prepare_executor = ThreadPoolExecutor(1, thread_name_prefix='laundry-prepare')
+        self._writer = ThreadPoolExecutor(1, thread_name_prefix='laundry-writer')
+        # The saves submitted to the writer that have not been waited for, in batch order.
+        self._saving: deque = deque()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def prepare(self, item: Any, previous: Future) -> Any:
+        """
+        Prepare a batch row on the prepare thread, unless an earlier row failed.
+        :param item: The batch row.
+        :param previous: The preparation of the row before it, which has finished since rows are prepared in order.
+        :return: The prepared row.
+        """
+        if self._stopped or (previous is not None and previous.exception() is not None):
+            raise PipelineStopped()
+        return self._prepare(item)
+
+    def prepared(self, items: Iterable[Any]) -> Iterator[Any]:
+        """
+        Prepare the batch rows ahead of the caller, yielding each prepared row in order. The exception raised while a
+        row was prepared is raised when it is reached.
+        :param items: The batch rows.
+        :return:
+        """
+        t_items = iter(items)
+        pending: deque = deque()
+        t_previous: Future = None
+        try:
+            while True:
+                while len(pending) <= self.depth:
+                    try:
+                        item = next(t_items)
+                    except StopIteration:
+                        break
+                    t_previous = self._prepare_executor.submit(self.prepare, item, t_previous)
+                    pending.append(t_previous)
+                if not pending:
+                    return
+                yield pending.popleft().result()
+        finally:
+            # The rows that were prepared ahead of a failure are not used.
+            self._stopped = True
+            for future in pending:
+                future.cancel()
+
+    def save(self, save: Callable[[], Any], on_saved: Callable[[Future], Any] = None):
+        """
+        Queue a document to be saved on the writer thread. Once more than depth documents are waiting, the oldest is
+        waited for, so the renderer does not run ahead of the writer.
+        :param save: Save the document.
+        :param on_saved: Called on the caller's thread, in the order the saves were queued, with the save's future
+        once it has finished.
+        :return:
+        """
+        self._saving.append((self._writer.submit(save), on_saved))
+        while len(self._saving) > self.depth or (self._saving and self._saving[0][0].done()):
+            self.saved()
+
+    def saved(self):
+        """
+        Wait for the oldest queued save to finish and pass it to its on_saved callback.
+        :return:
+        """
+        future, on_saved = self._saving.popleft()
+        future.exception()
+        if on_saved is not None:
+            on_saved(future)
+
+    def drain(self):
+        """
+        Wait for every queued save to finish, in order.
+        :return:
+        """
+        while self._saving:
+            self.saved()
+
+    def close(self):
+        """
+        Stop preparing rows and wait for the saves that have started.
+        :return:
+        """
+        self._stopped = True
+        self._prepare_executor.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
@@ -0,0 +1,206 @@
+"""
+Load the photos of an output document ahead of the renderer. Reading a photo from a network share can take longer
+than rendering the rows around it, so while the renderer builds the document a pool of threads reads, and if requested
+resamples, the photos of the rows that follow. The renderer then finds most photos already loaded.
+
+The prefetcher walks the photos in the order that they are rendered. It stops walking ahead while the loaded photos
+that have not been rendered exceed the memory budget, or while twice as many photos as threads are being loaded. A
+photo that has not been loaded when it is needed is waited for, and one that has not been requested is read by the
+renderer as before. The time the renderer spends waiting or reading is reported as stall time.
+"""
+from laundry.images import ImageCache
+from docx.image.image import Image as DocxImage
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+from pathlib import Path
+import threading
+import time
+
+DEFAULT_PREFETCH_THREADS = 4
+DEFAULT_PREFETCH_SIZE_MB = 64
+
+
+class PrefetchStats:
+    """How the photos of one or more output documents were found by the renderer."""
+
+    def __init__(self, ready: int = 0, waited: int = 0, read: int = 0, stall_seconds: float = 0.0):
+        """
+        :param ready: The photos that had been loaded, or were in the image cache, when they were needed.
+        :param waited: The photos that were still being loaded when they were needed.
+        :param read: The photos that had not been requested and were read by the renderer.
+        :param stall_seconds: The time the renderer spent waiting for, or reading, photos.
+        """
+        self.ready: int = ready
+        self.waited: int = waited
+        self.read: int = read
+        self.stall_seconds: float = stall_seconds
+
+    @property
+    def photos(self) -> int:
+        return self.ready + self.waited + self.read
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of the photos that were ready when they were needed."""
+        return self.ready / self.photos if self.photos else 0.0
+
+    def merge(self, stats: Dict[str, Any]):
+        """
+        Add the stats exported by another PrefetchStats, e.g. that of a worker process.
+        :param stats: The output of export().
+        :return:
+        """
+        self.ready += stats['ready']
+        self.waited += stats['waited']
+        self.read += stats['read']
+        self.stall_seconds += stats['stall_seconds']
+
+    def export(self) -> Dict[str, Any]:
+        return {'ready': self.ready, 'waited': self.waited, 'read': self.read, 'stall_seconds': self.stall_seconds}
+
+
+class PhotoPrefetcher:
+    """
+    Load the photos of an output document on a pool of threads, ahead of the renderer. The renderer gets each photo
+    using get(), in the order that the photos were given.
+    """
+
+    def __init__(self, image_cache: ImageCache, photos: Iterable[Tuple[Path, float]],
+                 threads: int = DEFAULT_PREFETCH_THREADS, size_mb: float = DEFAULT_PREFETCH_SIZE_MB,
+                 stats: PrefetchStats = None):
+        """
+        :param image_cache: The image cache used by the renderer. Photos that it holds are not loaded again.
+        :param photos: The photo and width of each photo in the order they are rendered. This is walked lazily.
+        :param threads: The number of threads used to load photos. If 0 the photos are read by the renderer.
+        :param size_mb: The memory budget of the loaded photos that have not been rendered, in megabytes.
+        :param stats: The stats that the renderer's use of photos is added to.
+        """
+        self._image_cache: ImageCache = image_cache
+        self._photos = iter(photos)
+        self._threads: int = threads
+        self._budget: int = int(size_mb * 1024 * 1024)
+        self.stats: PrefetchStats = stats if stats is not None else PrefetchStats()
+        self._executor: ThreadPoolExecutor = None
+        if threads > 0:
+            self._executor = ThreadPoolExecutor(threads, thread_name_prefix='laundry-prefetch')
+        # The load of each photo and width that has been requested, and the number of times it is still to be rendered.
+        self._pending: Dict[Tuple[str, float], List] = {}
+        self._walked: int = 0
+        self._rendered: int = 0
+        # The photos being loaded, and the bytes of the loaded photos that have not been rendered.
+        self._loading: int = 0
+        self._held: int = 0
+        self._lock = threading.Lock()
+        self.fill()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def load(self, photo: Path, width: float) -> Tuple[tuple, DocxImage]:
+        """
+        Load a photo on a prefetch thread.
+        :return: The photo's image cache key, and its image or None if it is already in the image cache.
+        """
+        key = self._image_cache.key(photo, width)
+        if self._image_cache.cached(key):
+            return key, None
+        return key, self._image_cache.load(photo, width)
+
+    def loaded(self, future: Future):
+        """
+        Account for a photo that has finished loading. Called by the thread that loaded it.
+        :param future: The load of the photo.
+        :return:
+        """
+        with self._lock:
+            self._loading -= 1
+            if not future.cancelled() and future.exception() is None and future.result()[1] is not None:
+                self._held += len(future.result()[1].blob)
+
+    def fill(self):
+        """
+        Request the photos that follow the renderer, until the memory budget or the number of photos being loaded is
+        reached.
+        :return:
+        """
+        if self._executor is None:
+            return
+        while True:
+            with self._lock:
+                if self._held >= self._budget or self._loading >= 2 * self._threads:
+                    return
+            try:
+                photo, width = next(self._photos)
+            except StopIteration:
+                return
+            self._walked += 1
+            # The renderer has already passed photos that were not requested because the budget was reached.
+            if self._walked <= self._rendered:
+                continue
+            t_key = (str(photo), width)
+            if t_key in self._pending:
+                self._pending[t_key][1] += 1
+                continue
+            with self._lock:
+                self._loading += 1
+            future = self._executor.submit(self.load, photo, width)
+            self._pending[t_key] = [future, 1]
+            future.add_done_callback(self.loaded)
+
+    def get(self, photo: (Path, str), width: float) -> DocxImage:
+        """
+        Return the photo to be inserted into the document, waiting for it if it is still being loaded.
+        :param photo: The photo's file path.
+        :param width: width of the image in Inches
+        :return: docx.image.image.Image
+        """
+        self._rendered += 1
+        t_key = (str(photo), width)
+        t_start = time.perf_counter()
+        entry = self._pending.get(t_key)
+        if entry is None:
+            t_hits = self._image_cache.hits
+            image = self._image_cache.get(photo, width)
+            if self._image_cache.hits > t_hits:
+                self.stats.ready += 1
+            else:
+                self.stats.read += 1
+                self.stats.stall_seconds += time.perf_counter() - t_start
+        else:
+            future, _ = entry
+            t_ready = future.done()
+            try:
+                loaded = future.result()
+            except Exception:
+                # The renderer reads the photo itself, raising the error where it always has.
+                loaded = None
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._pending[t_key]
+                if loaded is not None and loaded[1] is not None:
+                    with self._lock:
+                        self._held -= len(loaded[1].blob)
+            image = self._image_cache.get(photo, width, loaded)
+            if t_ready:
+                self.stats.ready += 1
+            else:
+                self.stats.waited += 1
+                self.stats.stall_seconds += time.perf_counter() - t_start
+        self.fill()
+        return image
+
+    def close(self):
+        """
+        Stop loading photos. Photos that have not started loading are cancelled.
+        :return:
+        """
+        if self._executor is None:
+            return
+        for future, _ in self._pending.values():
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self._executor = None
+        self._pending.clear()
@@ -0,0 +1,206 @@
+"""
+Record where the time and memory of a run are spent for the --profile report. The wall time of each phase is recorded
+for each batch row, along with the peak memory used by the process and the sections and photos rendered into the
+output file. Work that is shared by the batch rows, such as opening the input file, is recorded against the run.
+
+The phases are:
+    open             Open the input file.
+    read             Parse worksheets.
+    filter           Apply filter_rows to the data worksheet.
+    check_batch      Check the batch worksheet.
+    check_structure  Check the structure worksheet.
+    check_data       Check the data worksheet and resolve its photos.
+    render           Add the data rows to the output document.
+    save             Save the output document.
+
+Phases can be nested, e.g. a worksheet read while the batch worksheet is checked. The time of a nested phase is only
+counted by the nested phase.
+"""
+from laundry.constants import laundry_version
+from contextlib import contextmanager
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from pathlib import Path
+import cProfile
+import json
+import pstats
+import sys
+import time
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    # The resource module is not available on Windows, so the peak memory is not recorded.
+    resource = None
+
+PHASES = ['open', 'read', 'filter', 'check_batch', 'check_structure', 'check_data', 'render', 'save']
+SECTION_TYPES = ['paragraph', 'table', 'photo']
+
+
+def peak_rss_mb() -> (float, None):
+    """
+    :return: The peak resident memory of the process in megabytes, or None if it cannot be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere.
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+class RunProfile:
+    """
+    The profile of a run. If the profile is not enabled nothing is recorded, so the phases can always be marked.
+    """
+
+    def __init__(self, enabled: bool = False, render_stats: bool = False):
+        """
+        :param enabled: If True the phases are recorded.
+        :param render_stats: If True the render phase is also profiled using cProfile.
+        """
+        self.enabled: bool = enabled
+        # The batch row that phases are recorded against. None records them against the run.
+        self.batch_row: Any = None
+        self._rows: Dict[Any, Dict[str, Any]] = {}
+        self._stack: List[list] = []
+        self._profiler: cProfile.Profile = cProfile.Profile() if enabled and render_stats else None
+        # The render phase statistics returned by worker processes.
+        self._worker_stats: List[Dict] = []
+
+    def row(self, batch_row: Any = None) -> Dict[str, Any]:
+        """
+        :param batch_row: The index of the batch row, or None for the run.
+        :return: The record of the batch row.
+        """
+        if batch_row not in self._rows:
+            self._rows[batch_row] = {'batch_row': batch_row, 'output_file': None, 'phases': {}, 'peak_rss_mb': None,
+                                     'sections': {}, 'photos': 0, 'image_bytes': 0}
+        return self._rows[batch_row]
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Record the wall time of the phase against the current batch row, excluding the time of any nested phases.
+        :param name: One of PHASES.
+        """
+        if not self.enabled:
+            yield
+            return
+        self.switch_render_stats(self._stack[-1][0] if self._stack else None, name)
+        self._stack.append([name, time.perf_counter(), 0.0])
+        try:
+            yield
+        finally:
+            t_name, t_start, t_nested = self._stack.pop()
+            t_elapsed = time.perf_counter() - t_start
+            if self._stack:
+                self._stack[-1][2] += t_elapsed
+            self.switch_render_stats(t_name, self._stack[-1][0] if self._stack else None)
+            record = self.row(self.batch_row)
+            record['phases'][t_name] = record['phases'].get(t_name, 0.0) + t_elapsed - t_nested
+            record['peak_rss_mb'] = peak_rss_mb()
+
+    def switch_render_stats(self, from_phase: str, to_phase: str):
+        """cProfile only records the render phase, excluding any phases nested within it."""
+        if self._profiler is None or (from_phase == 'render') == (to_phase == 'render'):
+            return
+        if to_phase == 'render':
+            self._profiler.enable()
+        else:
+            self._profiler.disable()
+
+    def record_output(self, output_file: (Path, str), sections: Dict[str, int], photos: int, image_bytes: int):
+        """
+        Record what was rendered into the current batch row's output file.
+        :param output_file: The output file.
+        :param sections: The number of sections rendered, by section type.
+        :param photos: The number of photos inserted.
+        :param image_bytes: The size of the photos embedded in the output file.
+        :return:
+        """
+        if not self.enabled:
+            return
+        record = self.row(self.batch_row)
+        record['output_file'] = str(output_file)
+        for section_type, count in sections.items():
+            record['sections'][section_type] = record['sections'].get(section_type, 0) + count
+        record['photos'] += photos
+        record['image_bytes'] += image_bytes
+
+    def export(self) -> Dict[str, Any]:
+        """
+        Return the records and render statistics so they can be passed from a worker process and merged.
+        :return: Dict
+        """
+        t_stats = None
+        if self._profiler is not None:
+            self._profiler.create_stats()
+            t_stats = self._profiler.stats
+        return {'rows': list(self._rows.values()), 'render_stats': t_stats}
+
+    def merge(self, exported: Dict[str, Any]):
+        """
+        Add the records returned by export() in a worker process.
+        :param exported: The value returned by export().
+        :return:
+        """
+        for record in exported['rows']:
+            if record['batch_row'] is None:
+                continue
+            self._rows[record['batch_row']] = record
+        if exported['render_stats']:
+            self._worker_stats.append(exported['render_stats'])
+
+    @property
+    def rows(self) -> List[Dict[str, Any]]:
+        """The records of the run and each batch row, with the total time of each."""
+        return [{**record, 'total_seconds': sum(record['phases'].values())} for record in self._rows.values()]
+
+    def table(self) -> pd.DataFrame:
+        """
+        :return: The report as a DataFrame with a row for the run and each batch row.
+        """
+        t_phases = [phase for phase in PHASES if any(phase in record['phases'] for record in self._rows.values())]
+        records = []
+        for record in self.rows:
+            t_row = {'batch_row': 'run' if record['batch_row'] is None else record['batch_row'],
+                     'output_file': Path(record['output_file']).name if record['output_file'] else ''}
+            t_row.update({f'{phase} (s)': round(record['phases'].get(phase, 0.0), 3) for phase in t_phases})
+            t_row['total (s)'] = round(record['total_seconds'], 3)
+            t_row['peak RSS (MB)'] = None if record['peak_rss_mb'] is None else round(record['peak_rss_mb'], 1)
+            t_row.update({section_type: record['sections'].get(section_type, 0) for section_type in SECTION_TYPES})
+            t_row['photos'] = record['photos']
+            t_row['images (MB)'] = round(record['image_bytes'] / (1024 * 1024), 2)
+            records.append(t_row)
+        return pd.DataFrame(records)
+
+    def write_json(self, fp: (Path, str)):
+        """
+        Write the report to a JSON file.
+        :param fp: The file path.
+        :return:
+        """
+        t_report = {'laundry_version': laundry_version, 'phases': PHASES, 'peak_rss_mb': peak_rss_mb(),
+                    'rows': self.rows}
+        Path(fp).write_text(json.dumps(t_report, indent=2, default=str))
+
+    def dump_render_stats(self, fp: (Path, str)) -> bool:
+        """
+        Write the cProfile statistics of the render phase, including those of the worker processes, to a file that
+        can be read using pstats or snakeviz.
+        :param fp: The file path.
+        :return: False if no statistics were recorded.
+        """
+        t_sources = [SimpleNamespace(create_stats=lambda: None, stats=stats) for stats in self._worker_stats]
+        if self._profiler is not None:
+            t_stats = self.export()['render_stats']
+            if t_stats:
+                t_sources.insert(0, SimpleNamespace(create_stats=lambda: None, stats=t_stats))
+        if not t_sources:
+            return False
+        stats = pstats.Stats(t_sources[0])
+        for source in t_sources[1:]:
+            stats.add(source)
+        stats.dump_stats(str(fp))
+        return True
@@ -0,0 +1,349 @@
+"""
+Spreadsheet reader engines. Every engine returns the same DataFrame for a worksheet as pandas.read_excel(), so the
+engine can be chosen based on speed and memory use alone.
+"""
+from laundry.constants import NA_VALUES
+from laundry.filters import RowPrefilter
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List
+from datetime import date, datetime, time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from pandas.errors import EmptyDataError
+from pandas.io.parsers import TextParser
+import janitor
+
+DEFAULT_READER = 'pandas'
+# Cells containing an error are returned as NaN by pandas. Engines that only return values report errors as these codes.
+ERROR_CODES = ('#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#N/A')
+# The text that the parsers read as NaN. See laundry.constants.NA_VALUES.
+PARSER_NA_OPTIONS = {'na_values': sorted(NA_VALUES), 'keep_default_na': False}
+
+
+def convert_cell(value):
+    """
+    Convert a raw cell value in the same way as pandas' Excel readers. Empty cells become '', errors become NaN and
+    numbers that are whole are returned as int.
+    :param value: The cell's value.
+    :return:
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str) and value in ERROR_CODES:
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, time())
+    return value
+
+
+def value_kind(value) -> tuple:
+    """
+    Classify a raw cell value by the effect it has on the type that the parser gives its column. Two values of the same
+    kind never change a column's type differently.
+    :param value: A value as returned by convert_cell().
+    :return: tuple
+    """
+    if isinstance(value, str):
+        if value in NA_VALUES:
+            return str, 'na'
+        if value.lower() in ('true', 'false'):
+            return str, value.lower()
+        if value.strip().lstrip('+-').isdigit():
+            return str, 'int', value.strip().startswith('-'), len(value.strip()) > 18
+        try:
+            float(value)
+            return str, 'float'
+        except ValueError:
+            return str, 'text'
+    if isinstance(value, bool):
+        return bool,
+    if isinstance(value, int):
+        return int, value < 0, value.bit_length() > 63
+    if isinstance(value, float):
+        return float, value != value
+    return type(value),
+
+
+def is_na_value(value) -> bool:
+    """
+    :param value: A value as returned by convert_cell().
+    :return: True if the parser converts the value to NaN.
+    """
+    return (isinstance(value, str) and value in NA_VALUES) or (isinstance(value, float) and value != value)
+
+
+class ColumnProjection:
+    """
+    The columns of a worksheet that are required, by their cleaned names. Reader engines that support_projection only
+    parse these columns. The values of the columns that are not parsed cannot be counted once the worksheet is read,
+    so rows with fewer than min_values values, counting every column, are discarded while the worksheet is read.
+    """
+
+    def __init__(self, columns: Iterable[str], clean_header: bool = True, min_values: int = None):
+        """
+        :param columns: The names of the required columns.
+        :param clean_header: True if the worksheet's column names are cleaned before they are compared to columns.
+        :param min_values: If provided, rows with fewer values than this are discarded.
+        """
+        self.columns: frozenset = frozenset(columns)
+        self.clean_header: bool = clean_header
+        self.min_values: int = min_values
+
+    def positions(self, names: List[str]) -> List[int]:
+        """
+        :param names: The names of every column of the worksheet, as named by the parser.
+        :return: The positions of the required columns.
+        """
+        t_columns = pd.DataFrame(columns=names)
+        if self.clean_header:
+            t_columns = t_columns.clean_names()
+        return [i for i, column in enumerate(t_columns.columns) if column in self.columns]
+
+
+def rows_to_dataframe(rows: Iterable[Iterable], header_row: int = 0, row_filter: RowPrefilter = None,
+                      projection: ColumnProjection = None) -> pd.DataFrame:
+    """
+    Convert the raw rows of a worksheet into a DataFrame using the same parser as pandas.read_excel(). Trailing empty
+    cells and rows are removed, and short rows are padded, in the same way as pandas' Excel readers.
+
+    If a row_filter is provided, rows that cannot meet the filters are discarded before they are parsed. One row of
+    each kind of value that was discarded from each column is parsed with the remaining rows, and then removed, so each
+    column has the same type as it would have if every row had been parsed. The DataFrame's index is the position of
+    each row in the full worksheet.
+
+    If a projection is provided only its columns are parsed. Each column is parsed on its own, so the parsed columns
+    are the same as those of the full worksheet.
+    :param rows: The worksheet's rows.
+    :param header_row: index of the header row in the worksheet.
+    :param row_filter: Discard the rows that this returns False for.
+    :param projection: The columns to be parsed.
+    :return:
+    """
+    data: List[list] = []
+    row_numbers: List[int] = []
+    last_row_with_data = -1
+    max_width = 0
+    # The values of the discarded rows that decide the type of each column, by column position and kind.
+    t_discarded: Dict[int, Dict[tuple, object]] = {}
+    t_discarded_min_width = None
+    t_min_values = projection.min_values if projection is not None else None
+    t_discarding = row_filter is not None or t_min_values is not None
+    for row_number, row in enumerate(rows):
+        converted_row = [convert_cell(value) for value in row]
+        while converted_row and converted_row[-1] == '':
+            converted_row.pop()
+        if converted_row:
+            last_row_with_data = row_number
+        max_width = max(max_width, len(converted_row))
+        if row_filter is not None and row_number == header_row:
+            row_filter.set_header(converted_row)
+        if row_number > header_row and t_discarding and (
+                (row_filter is not None and not row_filter(converted_row)) or
+                (t_min_values is not None and sum(not is_na_value(value) for value in converted_row) < t_min_values)):
+            for position, value in enumerate(converted_row):
+                t_discarded.setdefault(position, {}).setdefault(value_kind(value), value)
+            if t_discarded_min_width is None or len(converted_row) < t_discarded_min_width:
+                t_discarded_min_width = len(converted_row)
+            continue
+        data.append(converted_row)
+        row_numbers.append(row_number)
+    while row_numbers and row_numbers[-1] > last_row_with_data:
+        row_numbers.pop()
+        data.pop()
+    if len(data) == 0 or last_row_with_data < 0:
+        return pd.DataFrame()
+
+    t_witness_rows: List[list] = []
+    if t_discarded_min_width is not None:
+        for position in range(t_discarded_min_width, max_width):
+            t_discarded.setdefault(position, {}).setdefault(value_kind(''), '')
+        t_examples = [list(t_discarded[position].values()) for position in range(max_width)]
+        for i in range(max(len(examples) for examples in t_examples)):
+            t_witness_rows.append([examples[min(i, len(examples) - 1)] for examples in t_examples])
+
+    for data_row in data:
+        data_row.extend([''] * (max_width - len(data_row)))
+    t_names = None
+    if projection is not None and len(data) > header_row:
+        t_names = list(TextParser([data[header_row]], header=0, **PARSER_NA_OPTIONS).read().columns)
+        t_positions = projection.positions(t_names)
+        t_names = [t_names[position] for position in t_positions]
+        data = [[data_row[position] for position in t_positions] for data_row in data]
+        t_witness_rows = [[witness_row[position] for position in t_positions] for witness_row in t_witness_rows]
+    try:
+        df = TextParser(data + t_witness_rows, header=header_row, skip_blank_lines=False, **PARSER_NA_OPTIONS).read()
+    except EmptyDataError:
+        return pd.DataFrame()
+    if t_names is not None:
+        # Duplicate names are numbered by their position in the full worksheet.
+        df.columns = t_names
+    if t_discarding:
+        df = df.iloc[:len(df) - len(t_witness_rows)]
+        df.index = pd.Index([row_number - header_row - 1 for row_number in row_numbers if row_number > header_row])
+    return df
+
+
+def rows_header(rows: Iterable[Iterable], header_row: int = 0) -> List[str]:
+    """
+    Parse the column names of a worksheet from its header row, as rows_to_dataframe() names them. Only the rows up to
+    the header row are read.
+    :param rows: The worksheet's rows.
+    :param header_row: index of the header row in the worksheet.
+    :return: The name of each column, without the unnamed columns after the last named column.
+    """
+    t_header = []
+    for row_number, row in enumerate(rows):
+        if row_number == header_row:
+            t_header = [convert_cell(value) for value in row]
+            break
+    while t_header and t_header[-1] == '':
+        t_header.pop()
+    if not t_header:
+        return []
+    return list(TextParser([t_header], header=0, **PARSER_NA_OPTIONS).read().columns)
+
+
+class WorkbookReader(ABC):
+    """
+    The abstract base class for the reader engines. A reader is opened once per spreadsheet and used to read each of
+    the worksheets that are required. Subclasses implement sheet_names and read_sheet().
+    """
+    name: str = None
+    # True if the reader can discard rows using a RowPrefilter while the worksheet is read.
+    supports_row_filter: bool = False
+    # True if the reader only parses the columns of a ColumnProjection.
+    supports_projection: bool = False
+
+    def __init__(self, path: (Path, str)):
+        """
+        :param path: The file path to the spreadsheet.
+        """
+        self._path: Path = Path(path)
+
+    @property
+    @abstractmethod
+    def sheet_names(self) -> List[str]:
+        """The names of the worksheets in the spreadsheet."""
+
+    @abstractmethod
+    def read_sheet(self, worksheet: str, header_row: int = 0, row_filter: RowPrefilter = None,
+                   projection: ColumnProjection = None) -> pd.DataFrame:
+        """
+        Read a worksheet into a DataFrame.
+        :param worksheet: The worksheet's name.
+        :param header_row: index of the header row in the worksheet.
+        :param row_filter: If the reader supports_row_filter, rows that cannot meet the filters may be discarded.
+        Otherwise it is ignored.
+        :param projection: If the reader supports_projection, only these columns are read. Otherwise it is ignored.
+        :return:
+        """
+
+    def header(self, worksheet: str, header_row: int = 0) -> List[str]:
+        """
+        :param worksheet: The worksheet's name.
+        :param header_row: index of the header row in the worksheet.
+        :return: The name of every column of the worksheet, as named by the parser, whether or not it is projected.
+        """
+        return list(self.read_sheet(worksheet, header_row).columns)
+
+    def check_sheet_name(self, worksheet: str):
+        if worksheet not in self.sheet_names:
+            raise ValueError(f'Worksheet named {worksheet!r} not found')
+
+
+class PandasReader(WorkbookReader):
+    """Read worksheets using pandas.read_excel() and its default engine."""
+    name = 'pandas'
+
+    def __init__(self, path: (Path, str)):
+        super().__init__(path)
+        self._excel_file = pd.ExcelFile(self._path)
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return self._excel_file.sheet_names
+
+    def read_sheet(self, worksheet: str, header_row: int = 0, row_filter: RowPrefilter = None,
+                   projection: ColumnProjection = None) -> pd.DataFrame:
+        return pd.read_excel(self._excel_file, sheet_name=worksheet, header=header_row, **PARSER_NA_OPTIONS)
+
+    def header(self, worksheet: str, header_row: int = 0) -> List[str]:
+        return list(pd.read_excel(self._excel_file, sheet_name=worksheet, header=header_row, nrows=0).columns)
+
+
+class OpenpyxlStreamReader(WorkbookReader):
+    """
+    Stream worksheet rows from openpyxl's read-only mode as plain values. No cell objects are created, and each
+    worksheet is only held in memory as the rows passed to the parser.
+    """
+    name = 'openpyxl-stream'
+    supports_row_filter = True
+    supports_projection = True
+
+    def __init__(self, path: (Path, str)):
+        super().__init__(path)
+        from openpyxl import load_workbook
+        self._workbook = load_workbook(self._path, read_only=True, data_only=True, keep_links=False)
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return self._workbook.sheetnames
+
+    def read_sheet(self, worksheet: str, header_row: int = 0, row_filter: RowPrefilter = None,
+                   projection: ColumnProjection = None) -> pd.DataFrame:
+        self.check_sheet_name(worksheet)
+        sheet = self._workbook[worksheet]
+        # The stored dimensions of a worksheet are not always correct. Read every row that exists.
+        sheet.reset_dimensions()
+        return rows_to_dataframe(sheet.iter_rows(values_only=True), header_row, row_filter, projection)
+
+    def header(self, worksheet: str, header_row: int = 0) -> List[str]:
+        self.check_sheet_name(worksheet)
+        sheet = self._workbook[worksheet]
+        sheet.reset_dimensions()
+        return rows_header(sheet.iter_rows(values_only=True), header_row)
+
+
+class CalamineReader(WorkbookReader):
+    """Read worksheets using the Rust based calamine parser. Requires the python-calamine package."""
+    name = 'calamine'
+    supports_row_filter = True
+    supports_projection = True
+
+    def __init__(self, path: (Path, str)):
+        super().__init__(path)
+        try:
+            from python_calamine import CalamineWorkbook
+        except ImportError:
+            raise ImportError(f'The {self.name} reader requires the python-calamine package. Install it using '
+                              f'"pip install python-calamine".')
+        self._workbook = CalamineWorkbook.from_path(str(self._path))
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return self._workbook.sheet_names
+
+    def read_sheet(self, worksheet: str, header_row: int = 0, row_filter: RowPrefilter = None,
+                   projection: ColumnProjection = None) -> pd.DataFrame:
+        self.check_sheet_name(worksheet)
+        sheet = self._workbook.get_sheet_by_name(worksheet)
+        return rows_to_dataframe(sheet.to_python(skip_empty_area=False), header_row, row_filter, projection)
+
+
+READER_ENGINES: Dict[str, type] = {reader.name: reader for reader in (PandasReader, OpenpyxlStreamReader,
+                                                                       CalamineReader)}
+
+
+def open_workbook(path: (Path, str), reader: str = DEFAULT_READER) -> WorkbookReader:
+    """
+    Open a spreadsheet using the named reader engine.
+    :param path: The file path to the spreadsheet.
+    :param reader: The name of the reader engine. One of READER_ENGINES.
+    :return: WorkbookReader
+    """
+    if reader not in READER_ENGINES:
+        raise ValueError(f'The reader {reader!r} does not exist. Use one of {list(READER_ENGINES)}.')
+    return READER_ENGINES[reader](path)
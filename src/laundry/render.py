@@ -0,0 +1,102 @@
+"""
+Render an output document from DataFrames held in memory. This is the API for programs that embed Laundry: the
+structure and data are passed as DataFrames, the template as a path or the bytes of a .docx file, and the document is
+returned as bytes or written to a binary stream. Nothing is written to disk, the console output is not configured, and
+problems are raised as exceptions rather than ending the process.
+
+The structure and data are checked in the same way as the worksheets of a batch row, see laundry.validation. Every
+problem found is raised together as a ValidationError.
+"""
+from laundry.laundryclass import SingleLoad
+from laundry.filters import RowFilter, parse_filters, filter_mask
+from laundry.images import ImageCache, ImagePipeline, DEFAULT_IMAGE_CACHE_SIZE_MB
+from laundry.prefetch import DEFAULT_PREFETCH_THREADS, DEFAULT_PREFETCH_SIZE_MB
+from laundry.validation import ValidationReport, validate_structure, validate_photos, existing_file
+from typing import BinaryIO, List
+from io import BytesIO
+from pathlib import Path
+import pandas as pd
+import janitor
+
+
+def read_template(template: (Path, str, bytes, BinaryIO)) -> (Path, bytes):
+    """
+    :param template: The template's file path, its bytes, a binary stream holding it, or None.
+    :return: The template's resolved file path or bytes, or None for the default template.
+    """
+    if template is None or isinstance(template, bytes):
+        return template
+    if hasattr(template, 'read'):
+        return template.read()
+    return existing_file(template)
+
+
+def prepare_render(structure: pd.DataFrame, data: pd.DataFrame, filter_rows: (str, List[RowFilter]) = None,
+                   root: (Path, str) = None, clean_header: bool = True, report: ValidationReport = None,
+                   confine: bool = False) -> tuple:
+    """
+    Filter and check the structure and data for rendering. The DataFrames passed are not changed.
+    :param structure: The structure, with the columns of a structure worksheet.
+    :param data: The data, with a row for each record rendered.
+    :param filter_rows: The filters that the rendered rows must meet, as filter_rows text or a list of RowFilters.
+    :param root: The directory that the structure's photo paths are relative to. Defaults to the current directory.
+    :param clean_header: If True the column names are cleaned, as those of the worksheets are.
+    :param report: If provided, the problems found, including warnings, are added to it.
+    :param confine: If True the structure's photo paths must be inside the root, so that a caller cannot read photos
+    from elsewhere.
+    :return: The checked structure and data DataFrames.
+    """
+    report = report if report is not None else ValidationReport()
+    t_structure = structure.clean_names() if clean_header else structure.copy()
+    t_data = data.clean_names() if clean_header else data.copy()
+    try:
+        t_filters = parse_filters(filter_rows) if isinstance(filter_rows, str) else filter_rows
+        if t_filters:
+            t_data = t_data.loc[filter_mask(t_data, t_filters)]
+    except ValueError as e:
+        report.add('data', str(e), column='filter_rows')
+    t_root = Path.cwd() if root is None else Path(root)
+    t_structure, t_photo_paths = validate_structure(t_structure, report, 'structure', t_root, list(t_data.columns),
+                                                    confine=confine)
+    t_data = validate_photos(t_data, t_photo_paths, report, 'data')
+    report.raise_for_errors('The render check')
+    return t_structure, t_data
+
+
+def render_document(structure: pd.DataFrame, data: pd.DataFrame, template: (Path, str, bytes, BinaryIO) = None,
+                    output: BinaryIO = None, filter_rows: (str, List[RowFilter]) = None, root: (Path, str) = None,
+                    clean_header: bool = True, stream: bool = False, image_cache: ImageCache = None,
+                    photo_dpi: int = None, prefetch_threads: int = DEFAULT_PREFETCH_THREADS,
+                    prefetch_size_mb: float = DEFAULT_PREFETCH_SIZE_MB,
+                    report: ValidationReport = None, confine: bool = False) -> (bytes, None):
+    """
+    Render a document from a structure and data DataFrame.
+    :param structure: The structure, with the columns of a structure worksheet.
+    :param data: The data, with a row for each record rendered. Photo columns hold the photo names as they would in a
+    data worksheet.
+    :param template: The Word .docx template's file path, its bytes, or a binary stream holding it. If None the
+    default python-docx template is used. Templates are parsed once and shared by later calls, see laundry.templates.
+    :param output: If provided, the document is written to this writable binary stream and None is returned.
+    :param filter_rows: The filters that the rendered rows must meet, as filter_rows text or a list of RowFilters.
+    :param root: The directory that the structure's photo paths are relative to. Defaults to the current directory.
+    :param clean_header: If True the column names are cleaned, as those of the worksheets are.
+    :param stream: If True, the document is written to the output as each data row is rendered. See
+    laundry.streaming.
+    :param image_cache: The photos shared with other documents. Pass the same ImageCache to each call to read each
+    photo once, and call its new_run() method when photos may have changed. If None the photos are only shared within
+    this document.
+    :param photo_dpi: If provided, and image_cache is not, photos are resampled to this resolution.
+    :param prefetch_threads: The number of threads that load photos ahead of the renderer. See laundry.prefetch.
+    :param prefetch_size_mb: The memory budget of the photos loaded ahead of the renderer.
+    :param report: If provided, the problems found, including warnings, are added to it.
+    :param confine: If True the structure's photo paths must be inside the root.
+    :return: The document's bytes, or None if it was written to output.
+    """
+    t_template = read_template(template)
+    t_structure, t_data = prepare_render(structure, data, filter_rows, root, clean_header, report, confine)
+    if image_cache is None:
+        image_cache = ImageCache(DEFAULT_IMAGE_CACHE_SIZE_MB, ImagePipeline(photo_dpi) if photo_dpi else None)
+    t_output = output if output is not None else BytesIO()
+    SingleLoad(t_structure, t_data, t_template, t_output, image_cache=image_cache, stream=stream,
+               prefetch_threads=prefetch_threads, prefetch_size_mb=prefetch_size_mb)
+    return t_output.getvalue() if output is None else None
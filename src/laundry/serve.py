@@ -0,0 +1,489 @@
+"""
+A local HTTP service that renders documents, for systems that request many reports. Starting Python and importing
+pandas and python-docx takes longer than rendering most reports, so the service keeps a pool of worker processes that
+have already done so. Each worker keeps the templates, photo directory indexes and photos it has read between requests.
+
+    POST /render    Render a document. The body is either an .xlsx workbook holding the data and structure
+                    worksheets, or a JSON object. The response is the .docx file.
+    GET /status     The queue depth, request counts and request latency, as JSON.
+
+A workbook is rendered using these query parameters, which match the single command's options:
+
+    template              The id of the template, i.e. the name of a .docx file in the templates directory without
+                          its extension. If omitted the default python-docx template is used.
+    data_worksheet        The data worksheet. The default is "Master List".
+    structure_worksheet   The structure worksheet. The default is "_structure".
+    header_row            The row number of the data worksheet's header row. The default is 0.
+    filter_rows           The filters that the rendered rows must meet, see laundry.filters.
+
+A JSON body holds "structure" and "data", each a list of records with the columns of the worksheet, and optionally
+"template" and "filter_rows". See laundry.render.render_document().
+
+Photo paths in the structure are relative to the service's root directory. A request that fails its checks is
+answered with 400 and the validation report. Once the workers are busy and the queue is full, requests are refused
+with 503 and a Retry-After header rather than held, so clients back off instead of timing out. If a worker process
+ends while rendering, for instance because it ran out of memory, the pool of workers is replaced and the requests it
+held are answered with 503.
+"""
+from laundry.laundryclass import Laundry
+from laundry.render import render_document
+from laundry.images import ImageCache, ImagePipeline, DEFAULT_IMAGE_CACHE_SIZE_MB
+from laundry.prefetch import DEFAULT_PREFETCH_THREADS, DEFAULT_PREFETCH_SIZE_MB
+from laundry.templates import new_document
+from laundry.validation import ValidationError
+from laundry.log import log, notice, style, OUTPUT_TITLE
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from collections import deque
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Dict, List, NamedTuple, Tuple
+from urllib.parse import urlsplit, parse_qs
+from io import BytesIO
+from pathlib import Path
+import json
+import os
+import signal
+import threading
+import time
+import numpy as np
+import pandas as pd
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8750
+DEFAULT_QUEUE_SIZE = 16
+DEFAULT_MAX_REQUEST_MB = 64
+# The number of recent requests that the latency statistics are calculated from.
+LATENCY_WINDOW = 1000
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+JSON_CONTENT_TYPE = 'application/json'
+
+# The photos read by each worker process, keyed by the options that created them, are shared by its requests.
+_worker_image_caches: Dict[str, ImageCache] = {}
+
+
+class RenderRequest(NamedTuple):
+    """A render request, as passed to a worker process. Either workbook, or structure and data, is given."""
+    template: Path = None
+    workbook: bytes = None
+    structure: List[Dict[str, Any]] = None
+    data: List[Dict[str, Any]] = None
+    data_worksheet: str = 'Master List'
+    structure_worksheet: str = '_structure'
+    header_row: int = 0
+    filter_rows: str = None
+
+
+class RenderResponse(NamedTuple):
+    """The HTTP response to a request."""
+    status: int
+    content_type: str
+    body: bytes
+
+
+def json_response(status: int, content: Dict[str, Any]) -> RenderResponse:
+    return RenderResponse(status, JSON_CONTENT_TYPE, json.dumps(content, default=str).encode('utf-8'))
+
+
+def warm_worker(templates: List[Path]):
+    """
+    Parse the templates in a worker process, so its first requests do not wait for them.
+    :param templates: The template files.
+    :return:
+    """
+    if threading.current_thread() is threading.main_thread():
+        # A worker started after the service has begun ignores Ctrl+C here. See RenderService.start_workers().
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for template in templates:
+        new_document(template)
+
+
+def render_request(request: RenderRequest, root: Path, options: Dict[str, Any]) -> RenderResponse:
+    """
+    Render a request inside a worker process. Errors are returned as responses, since a ValidationError cannot be
+    passed back from a worker process.
+    :param request: The request.
+    :param root: The directory that photo paths are relative to. A photo path outside it is refused.
+    :param options: The service's render options: photo_dpi, image_cache_dir, image_cache_size_mb, prefetch_threads
+    and prefetch_size_mb.
+    :return: RenderResponse
+    """
+    t_key = repr(sorted(options.items()))
+    if t_key not in _worker_image_caches:
+        t_pipeline = None
+        if options['photo_dpi'] is not None:
+            t_pipeline = ImagePipeline(options['photo_dpi'], options['image_cache_dir'])
+        _worker_image_caches[t_key] = ImageCache(options['image_cache_size_mb'], t_pipeline)
+    # Photos changed since the last request are read again.
+    _worker_image_caches[t_key].new_run()
+    try:
+        if request.workbook is not None:
+            workbook = pd.ExcelFile(BytesIO(request.workbook))
+            structure = Laundry.excel_to_dataframe(workbook, request.structure_worksheet, clean_header=True)
+            data = Laundry.excel_to_dataframe(workbook, request.data_worksheet, request.header_row, clean_header=True,
+                                              drop_empty_rows=True)
+        else:
+            # JSON nulls are empty cells, as they would be if read from a worksheet.
+            structure = pd.DataFrame.from_records(request.structure)
+            structure = structure.where(structure.notna(), np.nan)
+            data = pd.DataFrame.from_records(request.data)
+            data = data.where(data.notna(), np.nan)
+        document = render_document(structure, data, request.template, filter_rows=request.filter_rows, root=root,
+                                   image_cache=_worker_image_caches[t_key],
+                                   prefetch_threads=options['prefetch_threads'],
+                                   prefetch_size_mb=options['prefetch_size_mb'], confine=True)
+        return RenderResponse(200, DOCX_CONTENT_TYPE, document)
+    except ValidationError as e:
+        return json_response(400, {'error': str(e), **e.report.to_dict()})
+    except (ValueError, KeyError, TypeError) as e:
+        return json_response(400, {'error': f'{type(e).__name__}: {e}'})
+    except Exception as e:
+        return json_response(500, {'error': f'{type(e).__name__}: {e}'})
+
+
+class ServiceStats:
+    """The requests handled by the service, and the latency of the most recent."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        """
+        :param window: The number of recent requests that the latency statistics are calculated from.
+        """
+        self.started: float = time.time()
+        self.requests: Dict[str, int] = {'total': 0, 'rendered': 0, 'invalid': 0, 'failed': 0, 'rejected': 0}
+        self._latencies: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, status: int, seconds: float):
+        """
+        :param status: The HTTP status of the response to a render request.
+        :param seconds: The time from receiving the request to sending the response.
+        :return:
+        """
+        t_outcome = 'rendered' if status == 200 else 'rejected' if status == 503 else \
+            'invalid' if status < 500 else 'failed'
+        with self._lock:
+            self.requests['total'] += 1
+            self.requests[t_outcome] += 1
+            if status != 503:
+                self._latencies.append(seconds)
+
+    def latency(self) -> Dict[str, float]:
+        """
+        :return: The count, mean, median, 95th percentile and maximum of the recent latencies in seconds.
+        """
+        with self._lock:
+            t_latencies = np.array(self._latencies)
+        if len(t_latencies) == 0:
+            return {'count': 0}
+        return {'count': len(t_latencies), 'mean': float(t_latencies.mean()),
+                'p50': float(np.percentile(t_latencies, 50)), 'p95': float(np.percentile(t_latencies, 95)),
+                'max': float(t_latencies.max())}
+
+
+class RenderService:
+    """
+    Queue render requests on a pool of worker processes. At most workers + queue_size requests are held; more are
+    refused.
+    """
+
+    def __init__(self, templates_dir: (Path, str) = None, root: (Path, str) = None, workers: int = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, photo_dpi: int = None, image_cache_dir: (Path, str) = None,
+                 image_cache_size_mb: int = DEFAULT_IMAGE_CACHE_SIZE_MB,
+                 prefetch_threads: int = DEFAULT_PREFETCH_THREADS, prefetch_size_mb: float = DEFAULT_PREFETCH_SIZE_MB,
+                 executor: Executor = None):
+        """
+        :param templates_dir: The directory holding the templates, which requests name by their file's stem.
+        :param root: The directory that photo paths are relative to. Defaults to the current directory.
+        :param workers: The number of worker processes. Defaults to the number of cores.
+        :param queue_size: The number of requests held while every worker is busy.
+        :param photo_dpi: If provided, photos are resampled to this resolution before they are inserted.
+        :param image_cache_dir: The directory used to store the resampled photos.
+        :param image_cache_size_mb: The maximum size of the photos held in memory by each worker.
+        :param prefetch_threads: The number of threads that load photos ahead of the renderer.
+        :param prefetch_size_mb: The memory budget of the photos loaded ahead of the renderer.
+        :param executor: If provided, requests are rendered by this executor in place of a pool of workers processes.
+        """
+        self.templates_dir: Path = Path(templates_dir).resolve() if templates_dir is not None else None
+        self.root: Path = Path(root).resolve() if root is not None else Path.cwd()
+        self.workers: int = workers or os.cpu_count()
+        self.queue_size: int = queue_size
+        self.options: Dict[str, Any] = {'photo_dpi': photo_dpi, 'image_cache_dir': image_cache_dir,
+                                        'image_cache_size_mb': image_cache_size_mb,
+                                        'prefetch_threads': prefetch_threads, 'prefetch_size_mb': prefetch_size_mb}
+        self.stats: ServiceStats = ServiceStats()
+        self._templates: Dict[str, Path] = {}
+        self._in_flight: int = 0
+        self._lock = threading.Lock()
+        # The pool of workers is only replaced if the service created it.
+        self._own_executor: bool = executor is None
+        self._executor: Executor = executor
+        self.restarts: int = 0
+        self._restart_lock = threading.Lock()
+        self.start_workers()
+
+    def start_workers(self):
+        """
+        Start the pool of worker processes, unless an executor was given, and warm each worker.
+        :return:
+        """
+        t_handler = None
+        if self._own_executor:
+            # The workers ignore Ctrl+C, which is handled by the service, and are started now so they are warm. The
+            # handler can only be changed on the main thread. A pool started on another thread is replaced after a
+            # worker ended, and its workers ignore Ctrl+C once they are warm.
+            if threading.current_thread() is threading.main_thread():
+                t_handler = signal.signal(signal.SIGINT, signal.SIG_IGN)
+            self._executor = ProcessPoolExecutor(self.workers)
+        try:
+            for _ in range(self.workers):
+                self._executor.submit(warm_worker, list(self.scan_templates().values()))
+        finally:
+            if t_handler is not None:
+                signal.signal(signal.SIGINT, t_handler)
+
+    def restart_workers(self, executor: Executor):
+        """
+        Replace a pool of workers that is broken because a worker process ended. Each of the requests it held fails,
+        and the pool is replaced once, by the first to fail.
+        :param executor: The broken pool.
+        :return:
+        """
+        with self._restart_lock:
+            if executor is not self._executor or not self._own_executor:
+                return
+            log.warning('A worker process ended unexpectedly. The workers are being restarted.')
+            executor.shutdown(wait=False)
+            self.restarts += 1
+            self.start_workers()
+
+    def scan_templates(self) -> Dict[str, Path]:
+        """
+        :return: The template files in the templates directory, by id.
+        """
+        if self.templates_dir is not None:
+            self._templates = {fp.stem: fp for fp in sorted(self.templates_dir.glob('*.docx'))
+                               if not fp.name.startswith('~$')}
+        return self._templates
+
+    def template(self, template_id: str) -> Path:
+        """
+        :param template_id: The template's id, or None for the default template.
+        :return: The template's file path, or None for the default template. Raises KeyError if it does not exist.
+        """
+        if template_id is None:
+            return None
+        # Templates added since the last scan are found by scanning again.
+        if template_id not in self._templates and template_id not in self.scan_templates():
+            raise KeyError(f'The template {template_id!r} does not exist. The templates are '
+                           f'{sorted(self._templates)}.')
+        return self._templates[template_id]
+
+    @property
+    def in_flight(self) -> int:
+        """The number of requests being rendered or waiting for a worker."""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """The number of requests waiting for a worker."""
+        return max(0, self._in_flight - self.workers)
+
+    def submit(self, request: RenderRequest) -> (Future, None):
+        """
+        Queue a request for rendering.
+        :param request: The request.
+        :return: The future of the RenderResponse, or None if the queue is full.
+        """
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue_size:
+                return None
+            self._in_flight += 1
+        t_executor = self._executor
+        try:
+            future = t_executor.submit(render_request, request, self.root, self.options)
+        except BrokenProcessPool:
+            # A worker ended since the last request. Its replacement takes the request.
+            self.restart_workers(t_executor)
+            t_executor = self._executor
+            try:
+                future = t_executor.submit(render_request, request, self.root, self.options)
+            except BaseException:
+                self.done(t_executor, None)
+                raise
+        future.add_done_callback(partial(self.done, t_executor))
+        return future
+
+    def done(self, executor: Executor, future: Future):
+        """
+        Called when a request has been rendered or has failed.
+        :param executor: The pool that the request was submitted to. It is replaced if a worker ended.
+        :param future: The request's future, or None if it could not be submitted.
+        :return:
+        """
+        with self._lock:
+            self._in_flight -= 1
+        if future is not None and not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self.restart_workers(executor)
+
+    def status(self) -> Dict[str, Any]:
+        """
+        :return: The state of the service, for the status endpoint.
+        """
+        return {'uptime_seconds': time.time() - self.stats.started, 'workers': self.workers,
+                'queue_size': self.queue_size, 'in_flight': self.in_flight, 'queue_depth': self.queue_depth,
+                'worker_restarts': self.restarts,
+                'requests': dict(self.stats.requests), 'latency_seconds': self.stats.latency(),
+                'templates': sorted(self.scan_templates())}
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+def parse_request(query: Dict[str, List[str]], content_type: str, body: bytes,
+                  service: RenderService) -> RenderRequest:
+    """
+    Convert a POST /render request into a RenderRequest. Raises ValueError or KeyError if the request is not valid.
+    :param query: The parsed query string.
+    :param content_type: The request's content type.
+    :param body: The request's body.
+    :param service: The service, which finds the template.
+    :return: RenderRequest
+    """
+    t_params = {key: values[-1] for key, values in query.items()}
+    if content_type.split(';')[0].strip().lower() == JSON_CONTENT_TYPE:
+        content = json.loads(body.decode('utf-8'))
+        if not isinstance(content, dict) or not isinstance(content.get('structure'), list) or \
+                not isinstance(content.get('data'), list):
+            raise ValueError('A JSON request must be an object holding "structure" and "data" lists of records.')
+        return RenderRequest(service.template(content.get('template', t_params.get('template'))),
+                             structure=content['structure'], data=content['data'],
+                             filter_rows=content.get('filter_rows', t_params.get('filter_rows')))
+    if not body:
+        raise ValueError('The request has no workbook.')
+    try:
+        t_header_row = int(t_params.get('header_row', 0))
+    except ValueError:
+        raise ValueError(f'The header_row {t_params["header_row"]!r} must be a whole number.')
+    t_options = {key: t_params[key] for key in ('data_worksheet', 'structure_worksheet', 'filter_rows')
+                 if key in t_params}
+    return RenderRequest(service.template(t_params.get('template')), workbook=body, header_row=t_header_row,
+                         **t_options)
+
+
+class RenderRequestHandler(BaseHTTPRequestHandler):
+    """Handle the requests of a RenderServer. Each request is handled on its own thread."""
+    server_version = 'laundry'
+
+    def send(self, response: RenderResponse, headers: Dict[str, str] = None):
+        self.send_response(response.status)
+        self.send_header('Content-Type', response.content_type)
+        self.send_header('Content-Length', str(len(response.body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(response.body)
+
+    def do_GET(self):
+        if urlsplit(self.path).path.rstrip('/') == '/status':
+            self.send(json_response(200, self.server.service.status()))
+        else:
+            self.send(json_response(404, {'error': f'{self.path} not found. Use POST /render or GET /status.'}))
+
+    def do_POST(self):
+        t_start = time.perf_counter()
+        t_url = urlsplit(self.path)
+        if t_url.path.rstrip('/') != '/render':
+            self.send(json_response(404, {'error': f'{self.path} not found. Use POST /render or GET /status.'}))
+            return
+        response, headers = self.render(parse_qs(t_url.query))
+        # The request is counted before it is answered, so a client that then asks for the status finds it counted.
+        t_seconds = time.perf_counter() - t_start
+        self.server.service.stats.record(response.status, t_seconds)
+        self.send(response, headers)
+        log.info('POST %s %s %.3fs', self.path, response.status, t_seconds,
+                 extra=style(status=response.status, seconds=t_seconds))
+
+    def render(self, query: Dict[str, List[str]]) -> Tuple[RenderResponse, Dict[str, str]]:
+        """
+        Read the request's body, queue it and wait for the document.
+        :param query: The parsed query string.
+        :return: The response and any extra headers.
+        """
+        service: RenderService = self.server.service
+        t_length = self.headers.get('Content-Length')
+        if t_length is None:
+            return json_response(411, {'error': 'The request must have a Content-Length.'}), {}
+        if not t_length.strip().isdigit():
+            # The length of the body is not known, so it is not read and the connection is closed.
+            self.close_connection = True
+            return json_response(400, {'error': f'The Content-Length {t_length!r} is not a whole number of '
+                                                f'bytes.'}), {}
+        t_length = int(t_length)
+        if t_length > self.server.max_request_bytes:
+            # The body is not read, so the connection is closed.
+            self.close_connection = True
+            return json_response(413, {'error': f'The request is larger than {self.server.max_request_bytes} '
+                                                f'bytes.'}), {}
+        t_body = self.rfile.read(t_length)
+        try:
+            request = parse_request(query, self.headers.get('Content-Type', ''), t_body, service)
+        except KeyError as e:
+            return json_response(404, {'error': str(e.args[0])}), {}
+        except ValueError as e:
+            return json_response(400, {'error': str(e)}), {}
+        future = service.submit(request)
+        if future is None:
+            return json_response(503, {'error': 'The render queue is full. Try again shortly.',
+                                       'queue_depth': service.queue_depth}), {'Retry-After': '1'}
+        try:
+            return future.result(), {}
+        except BrokenProcessPool:
+            # The workers are restarted, see RenderService.done(), and the request can be made again.
+            return json_response(503, {'error': 'A worker process ended while the request was rendered. The workers '
+                                                'have been restarted. Try again shortly.'}), {'Retry-After': '1'}
+        except Exception as e:
+            # The worker process ended without answering.
+            return json_response(500, {'error': f'{type(e).__name__}: {e}'}), {}
+
+    def log_message(self, format: str, *args):
+        log.debug(format, *args)
+
+
+class RenderServer(ThreadingMixIn, HTTPServer):
+    """An HTTP server that handles each request on its own thread and renders using a RenderService."""
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], service: RenderService,
+                 max_request_mb: float = DEFAULT_MAX_REQUEST_MB):
+        """
+        :param address: The host and port to listen on. Port 0 chooses a free port.
+        :param service: The service that renders the requests.
+        :param max_request_mb: The largest request body accepted, in megabytes.
+        """
+        super().__init__(address, RenderRequestHandler)
+        self.service: RenderService = service
+        self.max_request_bytes: int = int(max_request_mb * 1024 * 1024)
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, max_request_mb: float = DEFAULT_MAX_REQUEST_MB,
+          **service_options):
+    """
+    Run the render service until it is interrupted. See RenderService.
+    :param host: The host to listen on.
+    :param port: The port to listen on.
+    :param max_request_mb: The largest request body accepted, in megabytes.
+    :param service_options: The keyword arguments passed to RenderService.
+    :return:
+    """
+    service = RenderService(**service_options)
+    server = RenderServer((host, port), service, max_request_mb)
+    notice('Serving on http://%s:%s with %s workers. Press Ctrl+C to stop.', server.server_address[0],
+           server.server_address[1], service.workers, extra=style(OUTPUT_TITLE))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        notice('Stopped serving.')
+    finally:
+        server.server_close()
+        service.close()
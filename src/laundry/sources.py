@@ -0,0 +1,214 @@
+"""
+Data sources outside of the input spreadsheet. A data_worksheet may be a typed URI in place of a worksheet name:
+
+    csv:path/to/data.csv
+    parquet:path/to/data.parquet
+    sqlite:path/to/data.db#table_or_query
+
+Each source is read using its format's own reader, in chunks, so rows that cannot meet the batch row's filters and the
+columns that are not used are discarded before the whole source is held in memory. Relative paths are relative to the
+current directory, as are those of the template_file and output_file. The structure and batch worksheets are always
+read from the input spreadsheet.
+"""
+from laundry.filters import RowPrefilter, filter_mask
+from laundry.readers import WorkbookReader, ColumnProjection, PARSER_NA_OPTIONS
+from abc import abstractmethod
+from contextlib import closing
+from typing import Dict, Iterator, List
+from pathlib import Path
+import re
+import sqlite3
+import pandas as pd
+import janitor
+
+# The number of rows read from a source at a time.
+DEFAULT_CHUNK_ROWS = 100_000
+SOURCE_URI = re.compile(r'^(?P<scheme>[A-Za-z]+):(?P<location>.+)$', re.DOTALL)
+# A SQLite table name that can be used without quoting. Anything else is treated as a query.
+SQL_TABLE_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class DataSource(WorkbookReader):
+    """
+    The abstract base class for the data sources. Subclasses implement column_names() and chunks(). A source holds a
+    single worksheet, named by its URI, and returns the same DataFrame for it whether or not rows and columns are
+    discarded while it is read.
+
+    Each chunk is parsed on its own, so the rows of a chunk are parsed the same way whether or not the chunks around
+    them are kept. A row is discarded once its chunk has been parsed, using the same filters that are applied to the
+    returned DataFrame. The values of the columns that are not projected are counted for the projection's min_values
+    before the columns are discarded.
+    """
+    scheme: str = None
+    supports_row_filter = True
+    supports_projection = True
+
+    def __init__(self, uri: str, location: str):
+        """
+        :param uri: The source's URI, which is also the name of its only worksheet.
+        :param location: The part of the URI following the scheme.
+        """
+        super().__init__(Path(location).resolve())
+        self.uri: str = uri
+
+    @property
+    def path(self) -> Path:
+        """The file that holds the source."""
+        return self._path
+
+    @property
+    def sheet_names(self) -> List[str]:
+        return [self.uri]
+
+    def check_header_row(self, header_row: int):
+        if header_row != 0:
+            raise ValueError(f'The {self.scheme} data source {self.uri!r} names its columns itself, so its header_row '
+                             f'must be 0.')
+
+    @abstractmethod
+    def column_names(self, header_row: int) -> List[str]:
+        """
+        :param header_row: index of the header row in the source.
+        :return: The name of every column of the source, as named by its reader.
+        """
+
+    def header(self, worksheet: str, header_row: int = 0) -> List[str]:
+        self.check_sheet_name(worksheet)
+        return self.column_names(header_row)
+
+    @abstractmethod
+    def chunks(self, header_row: int, columns: List[str] = None) -> Iterator[pd.DataFrame]:
+        """
+        Read the source a chunk of rows at a time.
+        :param header_row: index of the header row in the source.
+        :param columns: If provided, only these columns are read.
+        :return:
+        """
+
+    def read_sheet(self, worksheet: str, header_row: int = 0, row_filter: RowPrefilter = None,
+                   projection: ColumnProjection = None) -> pd.DataFrame:
+        self.check_sheet_name(worksheet)
+        t_names = self.column_names(header_row)
+        t_keep = None
+        if projection is not None:
+            t_keep = [t_names[position] for position in projection.positions(t_names)]
+        t_min_values = projection.min_values if projection is not None else None
+        # The filters are applied to the cleaned column names. Duplicate names are left to the returned DataFrame.
+        t_clean = pd.DataFrame(columns=t_names)
+        if row_filter is not None and row_filter.clean_header:
+            t_clean = t_clean.clean_names()
+        t_filters = []
+        if row_filter is not None:
+            t_filters = [f for f in row_filter.filters if list(t_clean.columns).count(f.column) == 1]
+
+        frames: List[pd.DataFrame] = []
+        t_rows = 0
+        # Every column is read if the values of each row are counted.
+        for chunk in self.chunks(header_row, t_keep if t_min_values is None else None):
+            chunk.index = pd.RangeIndex(t_rows, t_rows + len(chunk))
+            t_rows += len(chunk)
+            mask = pd.Series(True, index=chunk.index)
+            if t_min_values is not None:
+                mask &= chunk.notna().sum(axis=1) >= t_min_values
+            if t_filters:
+                t_view = chunk.copy(deep=False)
+                t_view.columns = t_clean.columns
+                mask &= filter_mask(t_view, t_filters)
+            if t_keep is not None:
+                chunk = chunk.loc[:, t_keep]
+            frames.append(chunk if mask.all() else chunk.loc[mask])
+        if not frames:
+            return pd.DataFrame(columns=t_keep if t_keep is not None else t_names)
+        return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+
+class CsvSource(DataSource):
+    """Read a CSV file using pandas' C parser."""
+    scheme = 'csv'
+
+    def column_names(self, header_row: int) -> List[str]:
+        return list(pd.read_csv(self._path, header=header_row, nrows=0, **PARSER_NA_OPTIONS).columns)
+
+    def chunks(self, header_row: int, columns: List[str] = None) -> Iterator[pd.DataFrame]:
+        # The file is always read in chunks, so its columns are parsed the same way whether or not rows are discarded.
+        with closing(pd.read_csv(self._path, header=header_row, usecols=columns, chunksize=DEFAULT_CHUNK_ROWS,
+                                 **PARSER_NA_OPTIONS)) as reader:
+            yield from reader
+
+
+class ParquetSource(DataSource):
+    """Read a Parquet file a row group batch at a time using pyarrow. Requires the pyarrow package."""
+    scheme = 'parquet'
+
+    def parquet_file(self):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError(f'The {self.scheme} data source requires the pyarrow package. Install it using '
+                              f'"pip install pyarrow".')
+        return pq.ParquetFile(self._path)
+
+    def column_names(self, header_row: int) -> List[str]:
+        self.check_header_row(header_row)
+        # The index of a DataFrame written by pandas is stored as a column, and is not part of the data.
+        return [name for name in self.parquet_file().schema_arrow.names if not name.startswith('__index_level_')]
+
+    def chunks(self, header_row: int, columns: List[str] = None) -> Iterator[pd.DataFrame]:
+        t_columns = columns if columns is not None else self.column_names(header_row)
+        for batch in self.parquet_file().iter_batches(batch_size=DEFAULT_CHUNK_ROWS, columns=t_columns):
+            yield batch.to_pandas()
+
+
+class SqliteSource(DataSource):
+    """
+    Read a table or query from a SQLite database using pandas.read_sql_query(). The database is opened read only. The
+    location is the database file followed by '#' and either a table name or a SELECT query.
+    """
+    scheme = 'sqlite'
+
+    def __init__(self, uri: str, location: str):
+        t_database, _, self.query = location.partition('#')
+        self.query: str = self.query.strip().rstrip(';').strip()
+        if not self.query:
+            raise ValueError(f'The sqlite data source {uri!r} must name a table or query after "#", e.g. '
+                             f'"sqlite:data.db#table".')
+        super().__init__(uri, t_database)
+
+    def select(self, columns: List[str] = None) -> str:
+        """
+        :param columns: If provided, only these columns are selected.
+        :return: The query that reads the source.
+        """
+        t_from = f'"{self.query}"' if SQL_TABLE_NAME.match(self.query) else f'({self.query})'
+        t_columns = '*' if columns is None else ', '.join('"' + column.replace('"', '""') + '"' for column in columns)
+        return f'SELECT {t_columns} FROM {t_from}'
+
+    def connect(self) -> sqlite3.Connection:
+        if not self._path.is_file():
+            raise FileNotFoundError(f'The sqlite database {str(self._path)!r} does not exist.')
+        return sqlite3.connect(f'{self._path.as_uri()}?mode=ro', uri=True)
+
+    def column_names(self, header_row: int) -> List[str]:
+        self.check_header_row(header_row)
+        with closing(self.connect()) as connection:
+            return [column[0] for column in connection.execute(self.select() + ' LIMIT 0').description]
+
+    def chunks(self, header_row: int, columns: List[str] = None) -> Iterator[pd.DataFrame]:
+        with closing(self.connect()) as connection:
+            yield from pd.read_sql_query(self.select(columns), connection, chunksize=DEFAULT_CHUNK_ROWS)
+
+
+DATA_SOURCES: Dict[str, type] = {source.scheme: source for source in (CsvSource, ParquetSource, SqliteSource)}
+
+
+def parse_source(worksheet) -> (DataSource, None):
+    """
+    :param worksheet: A data_worksheet value.
+    :return: The DataSource named by the value, or None if it is not the URI of a data source.
+    """
+    if not isinstance(worksheet, str):
+        return None
+    match = SOURCE_URI.match(worksheet.strip())
+    if match is None or match.group('scheme').lower() not in DATA_SOURCES:
+        return None
+    return DATA_SOURCES[match.group('scheme').lower()](worksheet, match.group('location'))
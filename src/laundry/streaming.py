@@ -0,0 +1,127 @@
+"""
+Write an output document to its file while it is rendered. Rendering is unchanged: paragraphs, tables and photos are
+added to a python-docx Document created from the template. After each data row the new body elements are serialised
+to a temporary file and removed from the document, and new photos are written straight into the output file, so the
+memory used does not grow with the number of rows. The template's styles, headers and section properties are written
+once, when the document is closed.
+"""
+from laundry.templates import new_document
+from docx import Document
+from docx.opc.packuri import PACKAGE_URI, CONTENT_TYPES_URI
+from docx.opc.pkgwriter import _ContentTypesItem
+from docx.oxml.ns import qn
+from lxml import etree
+from zipfile import ZipFile, ZIP_DEFLATED
+from tempfile import TemporaryFile
+from typing import BinaryIO, List, Set
+from pathlib import Path
+import shutil
+
+BODY_MARKER = 'laundry streamed body'
+
+
+class StreamingDocument:
+    """
+    A python-docx Document whose body is written to the output file as it is rendered. Call flush() after each data
+    row and close() once the document is complete. The Document to render into is available as document.
+
+    Photos are released once they are written, so Document.add_picture() does not recognise a photo added before the
+    last flush and adds it again. SingleLoad finds the photos it has already added using their hash.
+    """
+
+    def __init__(self, file_template: (Path, str, bytes), file_output_path: (Path, str, BinaryIO)):
+        """
+        :param file_template: The Word .docx file that contains the formatting styles to be used, its bytes, or None.
+        :param file_output_path: The path to the output file location, or a writable binary stream.
+        """
+        self.document: Document() = new_document(file_template)
+        self._body = self.document.element.body
+        # Each body element is serialised on its own, so lxml declares the document's namespaces on every element.
+        # These declarations are removed since the document element already declares them.
+        self._declarations: List[bytes] = [f' xmlns:{prefix}="{uri}"'.encode('utf-8')
+                                           for prefix, uri in self.document.element.nsmap.items() if prefix]
+        self._zip = ZipFile(file_output_path, 'w', compression=ZIP_DEFLATED)
+        self._body_file = TemporaryFile()
+        self._written_media: Set[str] = set()
+        # The template's photos are shared with other documents created from the template and are never released.
+        self._template_media: Set[str] = {part.partname for part in self.document.part.package.image_parts}
+        # The largest id of the body elements that have been written. Drawing ids must be unique in the document.
+        self._last_id: int = 0
+
+    @property
+    def next_id(self) -> int:
+        """
+        The next id that is unique in the document, including the body elements that have already been written. This
+        replaces DocumentPart.next_id, which only sees the elements that remain in the document.
+        :return: int
+        """
+        return max(self.document.part.next_id, self._last_id + 1)
+
+    def flush(self):
+        """
+        Write the body elements and photos added since the last flush to the output file, and remove them from the
+        document.
+        :return:
+        """
+        for child in list(self._body):
+            if child.tag == qn('w:sectPr'):
+                continue
+            t_xml = etree.tostring(child, encoding='UTF-8')
+            t_start_tag_end = t_xml.index(b'>')
+            t_start_tag = t_xml[:t_start_tag_end]
+            for declaration in self._declarations:
+                t_start_tag = t_start_tag.replace(declaration, b'')
+            self._body_file.write(t_start_tag + t_xml[t_start_tag_end:])
+            t_ids = [int(t_id) for t_id in child.xpath('.//@id') if t_id.isdigit()]
+            self._last_id = max([self._last_id] + t_ids)
+            self._body.remove(child)
+
+        for image_part in self.document.part.package.image_parts:
+            if image_part.partname in self._written_media:
+                continue
+            self._zip.writestr(image_part.partname.membername, image_part.blob)
+            self._written_media.add(image_part.partname)
+            if image_part.partname in self._template_media:
+                continue
+            # The photo is no longer needed by the document. Photos used again are found by SingleLoad using their
+            # hash, which does not require the part's bytes.
+            image_part._blob = None
+            image_part._image = None
+
+    def close(self):
+        """
+        Write the remaining body, the document part and the template's other parts to the output file.
+        :return:
+        """
+        self.flush()
+        # The document is serialised with a marker in place of the body elements that have already been written.
+        marker = etree.Comment(BODY_MARKER)
+        t_sect_pr = self._body.find(qn('w:sectPr'))
+        if t_sect_pr is not None:
+            t_sect_pr.addprevious(marker)
+        else:
+            self._body.append(marker)
+        t_head, t_tail = etree.tostring(self.document.element, encoding='UTF-8', standalone=True).split(
+            etree.tostring(marker))
+        self._body.remove(marker)
+
+        document_part = self.document.part
+        package = document_part.package
+        parts = list(package.iter_parts())
+        for part in parts:
+            part.before_marshal()
+        with self._zip.open(document_part.partname.membername, 'w') as document_xml:
+            document_xml.write(t_head)
+            self._body_file.seek(0)
+            shutil.copyfileobj(self._body_file, document_xml)
+            document_xml.write(t_tail)
+        self._body_file.close()
+
+        for part in parts:
+            if part is not document_part and part.partname not in self._written_media:
+                self._zip.writestr(part.partname.membername, part.blob)
+            if len(part.rels):
+                self._zip.writestr(part.partname.rels_uri.membername, part.rels.xml)
+        self._zip.writestr(PACKAGE_URI.rels_uri.membername, package.rels.xml)
+        self._zip.writestr(CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(parts).blob)
+        self._zip.close()
@@ -0,0 +1,111 @@
+"""
+Create output documents from their templates. Each template is parsed once and every output document is a clone that
+shares the template's parts, other than the document body, so an output document is created without reading or
+parsing the template again. A template may also be given as the bytes of a .docx file, in which case it is keyed by
+the hash of its bytes.
+"""
+from docx import Document
+from docx.api import _default_docx_path
+from docx.package import Package
+from docx.parts.document import DocumentPart
+from collections import OrderedDict
+from copy import deepcopy
+from io import BytesIO
+from pathlib import Path
+import hashlib
+import os
+import threading
+
+DEFAULT_TEMPLATE_CACHE_SIZE = 32
+
+
+def clone_document(template: Document()) -> Document():
+    """
+    Return a new document containing a copy of the template's body. The styles, numbering, headers, footers, media and
+    other parts of the template are shared with the new document and must not be changed.
+    :param template: The parsed template.
+    :return: Document
+    """
+    source_part = template.part
+    source_package = source_part.package
+    package = Package()
+    document_part = DocumentPart(source_part.partname, source_part.content_type, deepcopy(source_part.element),
+                                 package)
+    for rel in source_part.rels.values():
+        target = rel.target_ref if rel.is_external else rel.target_part
+        document_part.rels.add_relationship(rel.reltype, target, rel.rId, is_external=rel.is_external)
+    for rel in source_package.rels.values():
+        if rel.is_external:
+            target = rel.target_ref
+        else:
+            target = document_part if rel.target_part is source_part else rel.target_part
+        package.rels.add_relationship(rel.reltype, target, rel.rId, is_external=rel.is_external)
+    for image_part in source_package.image_parts:
+        package.image_parts.append(image_part)
+    return document_part.document
+
+
+class TemplateCache:
+    """
+    Hold each parsed template, keyed by its resolved path or the hash of its bytes. A template file is parsed again if
+    its modification time or size has changed. The least recently used templates are evicted once more than max_size
+    are held, so a long running process, such as the render service, does not keep every template it has been sent.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_TEMPLATE_CACHE_SIZE):
+        """
+        :param max_size: The maximum number of parsed templates held. 0 disables the cache.
+        """
+        self.max_size: int = max_size
+        self._templates: OrderedDict = OrderedDict()
+        self.hits: int = 0
+        self.misses: int = 0
+        # Documents may be created from the cache on more than one thread at once.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+    def new_document(self, file_template: (Path, str, bytes) = None) -> Document():
+        """
+        Return a new document created from the template.
+        :param file_template: The Word .docx file that contains the formatting styles to be used, or its bytes. If None
+        the default python-docx template is used.
+        :return: Document
+        """
+        if isinstance(file_template, bytes):
+            stamp = (0, len(file_template))
+            key = f'sha1:{hashlib.sha1(file_template).hexdigest()}'
+        else:
+            t_path = Path(_default_docx_path() if file_template is None else file_template).resolve()
+            stat = os.stat(t_path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            key = str(t_path)
+        with self._lock:
+            cached = self._templates.get(key)
+            if cached is not None and cached[0] == stamp:
+                self.hits += 1
+                self._templates.move_to_end(key)
+                return clone_document(cached[1])
+            self.misses += 1
+        t_source = BytesIO(file_template) if isinstance(file_template, bytes) else str(t_path)
+        cached = (stamp, Document(t_source))
+        with self._lock:
+            if self.max_size > 0:
+                self._templates[key] = cached
+                self._templates.move_to_end(key)
+            while len(self._templates) > self.max_size:
+                self._templates.popitem(last=False)
+        return clone_document(cached[1])
+
+
+_template_cache = TemplateCache()
+
+
+def new_document(file_template: (Path, str) = None) -> Document():
+    """
+    Return a new document created from the template, using the template cache shared for the life of the process.
+    :param file_template: The Word .docx file that contains the formatting styles to be used, its bytes, or None.
+    :return: Document
+    """
+    return _template_cache.new_document(file_template)
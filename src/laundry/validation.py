@@ -0,0 +1,467 @@
+"""
+Validate the batch, structure and data worksheets. Each worksheet is checked in a single pass over its columns, and
+every problem found is added to a ValidationReport rather than stopping at the first, so a run that fails lists every
+problem at once.
+
+Each check works on whole columns. Values that must be looked up on the file system, such as template files, output
+directories, photo directories and photos, are looked up once for each distinct value and the result is mapped back to
+the rows that hold it. Rows that share a problem are reported as a single issue.
+"""
+from laundry.constants import invalid, photo_formats, EXPECTED_BATCH_HEADERS, VOLUME_BATCH_HEADERS, \
+    EXPECTED_STRUCTURE_HEADERS, EXPECTED_SECTION_TYPES
+from laundry.filters import parse_filters
+from laundry.photos import PhotoIndex, get_photo_index
+from laundry.sources import parse_source
+from laundry.log import log, style
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# Data worksheet photo cells that do not reference a photo.
+NO_PHOTO_VALUES = ['no photo', 'none', 'nan', '-']
+# The number of rows listed in the text of an issue.
+ISSUE_ROWS_SHOWN = 10
+
+
+class ValidationIssue(NamedTuple):
+    """A problem found in a worksheet. rows is empty if the problem is with the worksheet rather than its rows."""
+    worksheet: str
+    message: str
+    rows: tuple = ()
+    column: str = None
+    severity: str = 'error'
+
+    def __str__(self) -> str:
+        t_location = [f'Worksheet {self.worksheet!r}']
+        if self.column is not None:
+            t_location.append(f'column {self.column!r}')
+        if self.rows:
+            t_rows = ', '.join(str(row) for row in self.rows[:ISSUE_ROWS_SHOWN])
+            if len(self.rows) > ISSUE_ROWS_SHOWN:
+                t_rows += f', ... ({len(self.rows)} rows)'
+            t_location.append(f'row{"s" if len(self.rows) > 1 else ""} {t_rows}')
+        return f'{", ".join(t_location)}: {self.message}'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'worksheet': self.worksheet, 'column': self.column, 'rows': list(self.rows),
+                'severity': self.severity, 'message': self.message}
+
+
+class ValidationReport:
+    """
+    The problems found by the validate functions. Rows are identified by their DataFrame index, as in the rest of the
+    console output.
+    """
+
+    def __init__(self):
+        self.issues: List[ValidationIssue] = []
+
+    def __len__(self) -> int:
+        return len(self.issues)
+
+    @property
+    def errors(self) -> List[ValidationIssue]:
+        return [issue for issue in self.issues if issue.severity == 'error']
+
+    @property
+    def warnings(self) -> List[ValidationIssue]:
+        return [issue for issue in self.issues if issue.severity == 'warning']
+
+    @property
+    def ok(self) -> bool:
+        return len(self.errors) == 0
+
+    def add(self, worksheet: str, message: str, rows: (pd.Index, List, tuple) = (), column: str = None,
+            severity: str = 'error'):
+        """
+        :param worksheet: The name of the worksheet.
+        :param message: A description of the problem.
+        :param rows: The index of each row with the problem.
+        :param column: The column with the problem.
+        :param severity: 'error' or 'warning'. Only errors fail a run.
+        :return:
+        """
+        self.issues.append(ValidationIssue(worksheet, message, tuple(rows), column, severity))
+
+    def add_rows(self, worksheet: str, mask: pd.Series, column: str, message: str):
+        """
+        Add an error for the rows selected by a boolean mask, if there are any.
+        :param worksheet: The name of the worksheet.
+        :param mask: True for each row with the problem.
+        :param column: The column with the problem.
+        :param message: A description of the problem.
+        :return:
+        """
+        if mask.any():
+            self.add(worksheet, message, mask.index[mask.to_numpy()], column)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        :return: The issues as a DataFrame, one row per issue.
+        """
+        return pd.DataFrame([issue.to_dict() for issue in self.issues],
+                            columns=['worksheet', 'column', 'rows', 'severity', 'message'])
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'errors': len(self.errors), 'warnings': len(self.warnings),
+                'issues': [issue.to_dict() for issue in self.issues]}
+
+    def log_issues(self):
+        """
+        Log every issue. Each is logged with its worksheet, column and rows for the json log format.
+        :return:
+        """
+        for issue in self.issues:
+            t_log = log.error if issue.severity == 'error' else log.warning
+            t_log('  %s', issue, extra=style(worksheet=issue.worksheet, column=issue.column, rows=list(issue.rows)))
+
+    def raise_for_errors(self, title: str = 'Validation'):
+        """
+        Raise a ValidationError if any errors have been found.
+        :param title: What was validated, used to start the exception's message.
+        :return:
+        """
+        if not self.ok:
+            raise ValidationError(self, title)
+
+
+class ValidationError(ValueError):
+    """Raised when a ValidationReport contains errors. The report is held by the exception."""
+
+    def __init__(self, report: ValidationReport, title: str = 'Validation'):
+        self.report: ValidationReport = report
+        t_errors = len(report.errors)
+        super().__init__(f'{title} failed with {t_errors} error{"s" if t_errors != 1 else ""}.')
+
+
+def missing_headers(report: ValidationReport, worksheet: str, df: pd.DataFrame, expected: List[str]) -> bool:
+    """
+    Add an error if any expected column is not in the worksheet. The other checks need these columns, so they are not
+    made if any are missing.
+    :return: True if any are missing.
+    """
+    t_missing = [header for header in expected if header not in df.columns]
+    if t_missing:
+        report.add(worksheet, f'The required headers {t_missing} are missing. The worksheet has the headers '
+                              f'{list(df.columns)}.')
+    return len(t_missing) > 0
+
+
+def resolve_path(path: (Path, str), root: Path = None) -> (Path, None):
+    """
+    :param path: A path from a worksheet. Windows separators are accepted.
+    :param root: The directory that a relative path is relative to. If None the current directory is used.
+    :return: The resolved path, or None if it does not exist.
+    """
+    t_path = Path(str(path).replace('\\', '/'))
+    if root is not None:
+        t_path = root.joinpath(t_path)
+    try:
+        return t_path.resolve(strict=True)
+    except (OSError, RuntimeError):
+        return None
+
+
+def is_empty(values: pd.Series) -> pd.Series:
+    """
+    :return: True for each value that is empty, i.e. null or one of the invalid values.
+    """
+    return values.isna() | values.astype(str).isin(invalid)
+
+
+class ColumnLookup:
+    """
+    Call a function once for each distinct value of a column and map the results back to the rows. A ValueError raised
+    by the function is recorded as the problem of the value, and the value's result is None.
+    """
+
+    def __init__(self, values: pd.Series, function: Callable):
+        """
+        :param values: The column.
+        :param function: Called with each distinct value.
+        """
+        self.column: str = str(values.name)
+        self._index: pd.Index = values.index
+        self._codes, t_values = pd.factorize(values.to_numpy(dtype=object), use_na_sentinel=False)
+        self._results = np.empty(len(t_values), dtype=object)
+        self.problems: Dict[int, str] = {}
+        for position, value in enumerate(t_values):
+            try:
+                self._results[position] = function(value)
+            except ValueError as e:
+                self.problems[position] = f'{e}'
+
+    def results(self) -> pd.Series:
+        """
+        :return: The result for each row.
+        """
+        return pd.Series(self._results[self._codes], index=self._index, dtype=object)
+
+    def report(self, report: ValidationReport, worksheet: str):
+        """
+        Add an error for each problem, listing the rows with the value.
+        :param report: The report that problems are added to.
+        :param worksheet: The name of the worksheet.
+        :return:
+        """
+        for position, message in self.problems.items():
+            report.add(worksheet, message, self._index[self._codes == position], self.column)
+
+
+def volume_limit(value, limit_type: type, default=None):
+    """
+    Convert a volume limit from the batch worksheet. Empty values are replaced by the default.
+    :param value: The value from the batch worksheet.
+    :param limit_type: int or float.
+    :param default: The value used if the batch worksheet does not set a limit.
+    :return: The limit, or None if there is no limit.
+    """
+    if value is None or str(value) in invalid or str(value) == '':
+        value = default
+    if value is None:
+        return None
+    try:
+        limit = limit_type(value)
+    except (TypeError, ValueError):
+        raise ValueError(f'The volume limit {value!r} is not a number.')
+    if limit <= 0:
+        raise ValueError(f'The volume limit {value!r} must be greater than 0.')
+    return limit
+
+
+def existing_file(path: (Path, str)) -> Path:
+    """
+    :return: The resolved path of a file. Raises ValueError if it does not exist.
+    """
+    t_path = resolve_path(path)
+    if t_path is None or not t_path.is_file():
+        raise ValueError(f'The file {path} does not exist.')
+    return t_path
+
+
+def existing_directory(path: (Path, str), root: Path = None, confine: bool = False) -> Path:
+    """
+    :param path: A path from a worksheet.
+    :param root: The directory that a relative path is relative to.
+    :param confine: If True the directory must be inside the root, after symbolic links and '..' are resolved.
+    :return: The resolved path of a directory. Raises ValueError if it does not exist, or is outside a confining root.
+    """
+    t_path = resolve_path(path, root)
+    if t_path is None or not t_path.is_dir():
+        raise ValueError(f'The directory {path} does not exist.')
+    if confine:
+        try:
+            t_path.relative_to((root if root is not None else Path.cwd()).resolve())
+        except ValueError:
+            raise ValueError(f'The directory {path} is outside {root}.')
+    return t_path
+
+
+def validate_batch(batch_df: pd.DataFrame, sheet_names: List[str], report: ValidationReport,
+                   worksheet: str = 'batch', volume_defaults: Dict[str, Any] = None) -> pd.DataFrame:
+    """
+    Check the batch worksheet and return it with its values converted for washing:
+        1. The expected headers exist.
+        2. The data and structure worksheets referenced exist. A data worksheet may instead be the URI of a data
+           source whose file exists, see laundry.sources.
+        3. The template files exist. Each is resolved, and an empty template_file is replaced by None.
+        4. An output file is given and its directory exists. Each is resolved.
+        5. filter_rows can be parsed. Each is replaced by its list of RowFilters.
+        6. An empty drop_empty_columns is replaced by False.
+        7. header_row is a row number. An empty header_row is replaced by 0.
+        8. The optional volume limits, max_rows_per_file and max_output_mb, are positive numbers. Empty limits are
+           replaced by the volume_defaults.
+    :param batch_df: The batch worksheet.
+    :param sheet_names: The names of the worksheets in the input file.
+    :param report: The report that problems are added to.
+    :param worksheet: The name of the batch worksheet, used in the report.
+    :param volume_defaults: The volume limit used for each volume header when a row does not set one.
+    :return: The converted batch worksheet. It is only complete if no errors were added to the report.
+    """
+    df = batch_df.copy()
+    if missing_headers(report, worksheet, df, EXPECTED_BATCH_HEADERS):
+        return df
+
+    # Check 2.
+    def existing_sheet(sheet: str) -> str:
+        if sheet not in sheet_names:
+            raise ValueError(f'The worksheet {sheet!r} does not exist. The input file has the worksheets '
+                             f'{sheet_names}.')
+        return sheet
+
+    def existing_data_sheet(sheet: str) -> str:
+        source = parse_source(sheet) if sheet not in sheet_names else None
+        if source is None:
+            return existing_sheet(sheet)
+        if not source.path.is_file():
+            raise ValueError(f'The {source.scheme} data source file {str(source.path)!r} does not exist.')
+        return sheet
+    ColumnLookup(df['data_worksheet'], existing_data_sheet).report(report, worksheet)
+    ColumnLookup(df['structure_worksheet'], existing_sheet).report(report, worksheet)
+
+    # Check 3.
+    t_no_template = is_empty(df['template_file'])
+    t_templates = ColumnLookup(df.loc[~t_no_template, 'template_file'], existing_file)
+    t_templates.report(report, worksheet)
+    df['template_file'] = t_templates.results().reindex(df.index)
+    df.loc[t_no_template, 'template_file'] = None
+
+    # Check 4.
+    t_no_output = is_empty(df['output_file'])
+    report.add_rows(worksheet, t_no_output, 'output_file', 'The name of the output file has not been provided.')
+    t_outputs = df.loc[~t_no_output, 'output_file']
+    t_directories = ColumnLookup(t_outputs.map(lambda output: str(Path(output).parent)).rename('output_file'),
+                                 existing_directory)
+    t_directories.report(report, worksheet)
+    t_resolved = [output if directory is None else directory.joinpath(Path(output).name)
+                  for directory, output in zip(t_directories.results(), t_outputs)]
+    df['output_file'] = df['output_file'].astype(object)
+    df.loc[~t_no_output, 'output_file'] = pd.Series(t_resolved, index=t_outputs.index, dtype=object)
+
+    # Check 5.
+    t_has_filter = df['filter_rows'].notna() & ~df['filter_rows'].astype(str).str.lower().isin(invalid)
+    t_filters = ColumnLookup(df.loc[t_has_filter, 'filter_rows'], parse_filters)
+    t_filters.report(report, worksheet)
+    df['filter_rows'] = df['filter_rows'].astype(object)
+    df.loc[t_has_filter, 'filter_rows'] = t_filters.results()
+
+    # Check 6.
+    df['drop_empty_columns'] = df['drop_empty_columns'].where(df['drop_empty_columns'].notna(), False)
+
+    # Check 7.
+    t_header_row = pd.to_numeric(df['header_row'].where(df['header_row'].notna(), 0), errors='coerce')
+    t_bad_header_row = t_header_row.isna() | (t_header_row < 0) | (t_header_row % 1 != 0)
+    report.add_rows(worksheet, t_bad_header_row, 'header_row', 'The header row must be a whole number, 0 or more.')
+    if not t_bad_header_row.any():
+        df['header_row'] = t_header_row.astype(int)
+
+    # Check 8.
+    volume_defaults = volume_defaults or {}
+    for header, limit_type in zip(VOLUME_BATCH_HEADERS, (int, float)):
+        t_default = volume_defaults.get(header)
+        if header not in df.columns:
+            df[header] = t_default
+        t_limits = ColumnLookup(df[header], lambda value: volume_limit(value, limit_type, t_default))
+        t_limits.report(report, worksheet)
+        df[header] = t_limits.results()
+    return df
+
+
+def validate_structure(structure_df: pd.DataFrame, report: ValidationReport, worksheet: str = 'structure',
+                       root: Path = None, data_columns: List[str] = None,
+                       confine: bool = False) -> Tuple[pd.DataFrame, Dict[str, Path]]:
+    """
+    Check a structure worksheet and return it with its values converted for washing:
+        1. The expected headers exist.
+        2. Each section_type is one of EXPECTED_SECTION_TYPES.
+        3. Each section_contains is given and, if the data_columns are given, every column it names exists.
+        4. The path of each photo section is a directory.
+        5. An empty section_break or page_break is replaced by False.
+    :param structure_df: The structure worksheet.
+    :param report: The report that problems are added to.
+    :param worksheet: The name of the structure worksheet, used in the report.
+    :param root: The directory that photo paths are relative to, normally that of the input file.
+    :param data_columns: The columns of the data worksheet.
+    :param confine: If True each photo path must be inside the root.
+    :return: The converted structure worksheet, and the photo directory of each photo section's data column.
+    """
+    df = structure_df.copy()
+    t_photo_paths: Dict[str, Path] = {}
+    if missing_headers(report, worksheet, df, EXPECTED_STRUCTURE_HEADERS):
+        return df, t_photo_paths
+
+    # Check 2.
+    t_section_types = df['section_type'].astype(str).str.lower()
+    t_unknown = ~t_section_types.isin(EXPECTED_SECTION_TYPES)
+    for section_type in pd.unique(t_section_types[t_unknown]):
+        report.add_rows(worksheet, t_section_types == section_type, 'section_type',
+                        f'The section type {section_type!r} is not one of {EXPECTED_SECTION_TYPES}.')
+
+    # Check 3. Multiple columns are split as laundryclass.split_str() splits them.
+    t_no_contains = df['section_contains'].isna()
+    report.add_rows(worksheet, t_no_contains, 'section_contains', 'The data worksheet column has not been provided.')
+    if data_columns is not None:
+        t_columns = df.loc[~t_no_contains, 'section_contains'].astype(str).map(
+            lambda contains: contains.splitlines() if '\n' in contains else contains.split(',')).explode()
+        t_missing = t_columns[~t_columns.str.lower().isin(list(data_columns))]
+        for column in pd.unique(t_missing):
+            report.add(worksheet, f'The column {column!r} does not exist in the data worksheet. The data worksheet '
+                                  f'has the columns {list(data_columns)}.',
+                       pd.unique(t_missing.index[(t_missing == column).to_numpy()]), 'section_contains')
+
+    # Check 4.
+    t_photo_rows = (t_section_types == 'photo') & ~t_no_contains
+    t_directories = ColumnLookup(df.loc[t_photo_rows, 'path'], lambda path: existing_directory(path, root, confine))
+    t_directories.report(report, worksheet)
+    for contains, directory in zip(df.loc[t_photo_rows, 'section_contains'], t_directories.results()):
+        if directory is not None:
+            t_photo_paths[contains] = directory
+
+    # Check 5.
+    for column in ['section_break', 'page_break']:
+        df[column] = df[column].where(df[column].notna(), False)
+    return df, t_photo_paths
+
+
+def find_photo(photo: str, photos: PhotoIndex) -> Tuple[Path, List[Path]]:
+    """
+    Find a photo referenced by the data worksheet. A photo without a file extension is found using the photo_formats
+    order. Raises ValueError if the photo is not an image file or cannot be found.
+    :param photo: The photo's file name, with or without its extension.
+    :param photos: The PhotoIndex of the photo directory.
+    :return: The photo, and the files that share its name if it is ambiguous.
+    """
+    photo = photo.strip()
+    if Path(photo).suffix != '' and Path(photo).suffix not in photo_formats:
+        raise ValueError(f'The data worksheet photo {photo} is not been specified as a photo. Ensure that the file '
+                         f'format is one of the following formats {photo_formats}.')
+    return photos.find(photo), photos.ambiguous(photo)
+
+
+def validate_photos(data_df: pd.DataFrame, photo_paths: Dict[str, Path], report: ValidationReport,
+                    worksheet: str = 'data') -> pd.DataFrame:
+    """
+    Find the photos referenced by the data worksheet. Each cell of a photo column lists one or more photos, which are
+    replaced by a list of their paths. Each distinct cell is resolved once using the photo directory's PhotoIndex.
+    Photos that cannot be found are errors, and photos whose name matches more than one file are warnings.
+    :param data_df: The data worksheet.
+    :param photo_paths: The photo directory of each photo column.
+    :param report: The report that problems are added to.
+    :param worksheet: The name of the data worksheet, used in the report.
+    :return: The data worksheet with its photo columns resolved.
+    """
+    df = data_df.copy()
+    for column, directory in photo_paths.items():
+        column = str(column).lower()
+        if column not in df.columns:
+            continue
+        t_photos = get_photo_index(directory)
+        t_ambiguous: Dict[str, List[Path]] = {}
+
+        def resolve_cell(cell) -> (List[Path], None):
+            t_cell = str(cell)
+            if t_cell.lower() in NO_PHOTO_VALUES:
+                return None
+            t_found, t_problems = [], []
+            for photo in (t_cell.splitlines() if '\n' in t_cell else t_cell.split(',')):
+                try:
+                    t_path, t_matches = find_photo(photo, t_photos)
+                except ValueError as e:
+                    t_problems.append(f'{e}')
+                    continue
+                t_found.append(t_path)
+                if t_matches:
+                    t_ambiguous[photo.strip()] = t_matches
+            if t_problems:
+                raise ValueError(f'{" ".join(t_problems)} Photo directory: {directory}')
+            return t_found
+
+        t_cells = ColumnLookup(df[column], resolve_cell)
+        t_cells.report(report, worksheet)
+        for photo, matches in t_ambiguous.items():
+            report.add(worksheet, f'The photo {photo} matches more than one file {[p.name for p in matches]}. '
+                                  f'{matches[0].name} will be used.', column=column, severity='warning')
+        t_resolved = [value if found is None else found for found, value in zip(t_cells.results(), df[column])]
+        df[column] = pd.Series(t_resolved, index=df.index, dtype=object)
+    return df
@@ -0,0 +1,247 @@
+"""
+Run Laundry again each time the input file, or a template or photo that it uses, is saved. The parsed worksheets,
+templates, photo indexes and photos are kept in memory between runs. Only the worksheets that have changed are parsed
+again, and only the output files whose inputs have changed are rebuilt, see laundry.manifest.
+
+The worksheets of an .xlsx or .xlsm file that have changed are found without parsing them, by hashing each worksheet's
+XML with the shared strings that it uses. Every worksheet of any other type of file is parsed again when it changes.
+A data source, see laundry.sources, is read again when its file changes.
+"""
+from laundry.laundryclass import Laundry, SessionCaches
+from laundry.manifest import BuildManifest, file_stat
+from laundry.images import ImageCache, DEFAULT_IMAGE_CACHE_SIZE_MB
+from laundry.sources import parse_source
+from laundry.log import log, notice, style, OUTPUT_TITLE
+from typing import Any, Dict, List, Set
+from pathlib import Path
+import hashlib
+import pandas as pd
+import posixpath
+import re
+import time
+import zipfile
+import xml.etree.ElementTree as ElementTree
+
+DEFAULT_INTERVAL = 1.0
+# A cell that holds the index of a shared string, e.g. <c r="A1" t="s"><v>3</v></c>.
+SHARED_STRING_CELL = re.compile(rb'<c\b[^>]*\bt="s"[^>]*>\s*<v>(\d+)</v>')
+
+
+def part_name(target: str) -> str:
+    """
+    :param target: The target of a workbook relationship.
+    :return: The name of the part within the file.
+    """
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join('xl', target))
+
+
+def shared_strings(xml: bytes) -> List[bytes]:
+    """
+    :param xml: The shared strings part.
+    :return: The text of each shared string, encoded.
+    """
+    strings = []
+    for item in ElementTree.fromstring(xml).findall('{*}si'):
+        t_text = ''.join(t.text or '' for t in item.findall('{*}t') + item.findall('{*}r/{*}t'))
+        strings.append(t_text.encode('utf-8'))
+    return strings
+
+
+def sheet_digests(input_fp: (Path, str)) -> (Dict[str, str], None):
+    """
+    Return a hash of each worksheet's content. The shared strings used by a worksheet are hashed in place of their
+    index, so a worksheet's hash only changes if the worksheet changes, even when the shared strings are reordered.
+    :param input_fp: The input file.
+    :return: The hash of each worksheet by name, or None if the file is not an .xlsx or .xlsm file.
+    """
+    try:
+        workbook_file = zipfile.ZipFile(input_fp)
+    except (OSError, zipfile.BadZipFile):
+        return None
+    with workbook_file:
+        try:
+            workbook = ElementTree.fromstring(workbook_file.read('xl/workbook.xml'))
+            relationships = ElementTree.fromstring(workbook_file.read('xl/_rels/workbook.xml.rels'))
+        except (KeyError, ElementTree.ParseError):
+            return None
+        # The worksheet parts by relationship id, and the shared strings and styles parts.
+        t_sheets: Dict[str, str] = {}
+        t_parts: Dict[str, str] = {}
+        for relationship in relationships:
+            t_kind = relationship.get('Type', '').rsplit('/', 1)[-1]
+            if t_kind == 'worksheet':
+                t_sheets[relationship.get('Id')] = part_name(relationship.get('Target'))
+            elif t_kind in ('sharedStrings', 'styles'):
+                t_parts[t_kind] = part_name(relationship.get('Target'))
+
+        strings: List[bytes] = []
+        if 'sharedStrings' in t_parts:
+            strings = shared_strings(workbook_file.read(t_parts['sharedStrings']))
+        # Styles decide which numbers are dates, so a change to the styles may change every worksheet.
+        t_common = hashlib.sha256()
+        if 'styles' in t_parts:
+            t_common.update(workbook_file.read(t_parts['styles']))
+        for properties in workbook.findall('{*}workbookPr'):
+            t_common.update(repr(sorted(properties.attrib.items())).encode('utf-8'))
+
+        digests: Dict[str, str] = {}
+        for sheet in workbook.findall('{*}sheets/{*}sheet'):
+            t_id = next((value for key, value in sheet.attrib.items() if key.endswith('}id')), None)
+            if t_id not in t_sheets:
+                continue
+            xml = workbook_file.read(t_sheets[t_id])
+            digest = t_common.copy()
+            t_start = 0
+            for match in SHARED_STRING_CELL.finditer(xml):
+                t_index = int(match.group(1))
+                t_string = strings[t_index] if t_index < len(strings) else b''
+                digest.update(xml[t_start:match.start(1)])
+                digest.update(b'%d:' % len(t_string) + t_string)
+                t_start = match.end(1)
+            digest.update(xml[t_start:])
+            digests[sheet.get('name')] = digest.hexdigest()
+    return digests
+
+
+class WatchSession:
+    """
+    Hold the worksheets, photos and manifest of an input file between runs, and decide when it must be run again.
+    """
+
+    def __init__(self, input_fp: (Path, str), laundry_options: Dict[str, Any] = None,
+                 image_cache_size_mb: int = DEFAULT_IMAGE_CACHE_SIZE_MB):
+        """
+        :param input_fp: The input file.
+        :param laundry_options: The keyword arguments passed to Laundry on each run, other than the input file.
+        :param image_cache_size_mb: The maximum size of the photos held in memory between runs.
+        """
+        self.input_fp: Path = Path(input_fp).resolve()
+        self.laundry_options: Dict[str, Any] = dict(laundry_options or {})
+        self.laundry_options.setdefault('batch_worksheet', '_batch')
+        self.caches: SessionCaches = SessionCaches({}, ImageCache(image_cache_size_mb), BuildManifest())
+        self._digests: Dict[str, str] = None
+        # The size and modification time of the file of each data source read by the last run, by URI.
+        self._source_stamps: Dict[str, list] = {}
+        # The templates and photos used by the last run, which are watched along with the input file.
+        self._dependencies: Set[Path] = set()
+        self.runs: int = 0
+
+    def changed_worksheets(self) -> (Set[str], None):
+        """
+        Remove the parsed worksheets that have changed since the last run.
+        :return: The names of the changed worksheets, or None if every worksheet is treated as changed.
+        """
+        t_digests = sheet_digests(self.input_fp)
+        if t_digests is None or self._digests is None:
+            changed = None
+        else:
+            changed = {sheet for sheet in set(t_digests) | set(self._digests)
+                       if t_digests.get(sheet) != self._digests.get(sheet)}
+            changed |= {uri for uri, stamp in self.source_stamps().items() if stamp != self._source_stamps.get(uri)}
+        self._digests = t_digests
+        for key in list(self.caches.worksheet_frames):
+            if changed is None or key[0] in changed:
+                del self.caches.worksheet_frames[key]
+        return changed
+
+    def source_stamps(self) -> Dict[str, list]:
+        """
+        :return: The size and modification time of the file of each data source that has been read, by URI.
+        """
+        t_stamps = {}
+        for key in self.caches.worksheet_frames:
+            source = parse_source(key[0]) if key[0] not in (self._digests or {}) else None
+            if source is not None:
+                t_stamps[key[0]] = file_stat(source.path)
+        return t_stamps
+
+    def run(self) -> bool:
+        """
+        Run Laundry on the input file, parsing only the worksheets that have changed.
+        :return: True if the run succeeded.
+        """
+        t_changed = self.changed_worksheets()
+        if t_changed is not None:
+            log.info('Changed worksheets: %s', ', '.join(sorted(t_changed)) or 'none', extra=style(OUTPUT_TITLE))
+        self.runs += 1
+        t_start = time.perf_counter()
+        laundry = None
+        success = True
+        try:
+            laundry = Laundry(self.input_fp, incremental=True, session=self.caches, **self.laundry_options)
+        except SystemExit as e:
+            # A run that stops early for any reason other than exit status 0 has failed its checks.
+            success = e.code == 0
+        except Exception as e:
+            log.error('%s: %s', type(e).__name__, e)
+            success = False
+        if laundry is not None:
+            success = all(result.success for result in laundry.batch_results)
+            self._dependencies = self.dependencies(laundry)
+        self._source_stamps = self.source_stamps()
+        notice('Run %s %s in %.1fs.', self.runs, 'completed' if success else 'failed', time.perf_counter() - t_start,
+               extra=style(run=self.runs, success=success))
+        return success
+
+    def dependencies(self, laundry: Laundry) -> Set[Path]:
+        """
+        :param laundry: The completed run.
+        :return: The templates, data sources and photos used by the run.
+        """
+        t_paths = {Path(template) for template in laundry.batch_df['template_file']
+                   if isinstance(template, (str, Path))}
+        t_sources = [laundry.data_source(sheet) for sheet in pd.unique(laundry.batch_df['data_worksheet'])]
+        t_paths.update(source.path for source in t_sources if source is not None)
+        for result in laundry.batch_results:
+            entry = self.caches.manifest.manifest(result.output_file)['outputs'].get(Path(result.output_file).name, {})
+            t_paths.update(Path(photo) for photo in entry.get('photos', {}))
+        return t_paths
+
+    def stamps(self) -> Dict[Path, list]:
+        """
+        :return: The size and modification time of the input file and the files it uses.
+        """
+        return {path: file_stat(path) for path in [self.input_fp, *sorted(self._dependencies)]}
+
+    def watch(self, interval: float = DEFAULT_INTERVAL, max_runs: int = None):
+        """
+        Run Laundry, then run it again each time a watched file changes. A change is only acted on once the files
+        have stopped changing for an interval, so a file that is still being saved is not read.
+        :param interval: The number of seconds between checks for changes.
+        :param max_runs: If provided, stop after this many runs.
+        :return:
+        """
+        self.run()
+        t_stamps = self.stamps()
+        notice('Watching %s for changes. Press Ctrl+C to stop.', self.input_fp, extra=style(OUTPUT_TITLE))
+        try:
+            while max_runs is None or self.runs < max_runs:
+                time.sleep(interval)
+                t_current = self.stamps()
+                if t_current == t_stamps:
+                    continue
+                # Wait for the files to stop changing.
+                t_stamps = t_current
+                time.sleep(interval)
+                if self.stamps() != t_stamps:
+                    continue
+                self.run()
+                t_stamps = self.stamps()
+        except KeyboardInterrupt:
+            notice('Stopped watching.')
+
+
+def watch(input_fp: (Path, str), interval: float = DEFAULT_INTERVAL, max_runs: int = None,
+          image_cache_size_mb: int = DEFAULT_IMAGE_CACHE_SIZE_MB, **laundry_options):
+    """
+    Watch the input file and run Laundry each time it changes. See WatchSession.
+    :param input_fp: The input file.
+    :param interval: The number of seconds between checks for changes.
+    :param max_runs: If provided, stop after this many runs.
+    :param image_cache_size_mb: The maximum size of the photos held in memory between runs.
+    :param laundry_options: The keyword arguments passed to Laundry.
+    :return:
+    """
+    WatchSession(input_fp, laundry_options, image_cache_size_mb).watch(interval, max_runs)
@@ -0,0 +1,170 @@
+"""
+A persistent on-disk cache of cleaned worksheet DataFrames. Parsing .xlsx files is the slowest step of a run, so the
+output of Laundry.excel_to_dataframe() is stored between runs and reused while the spreadsheet is unchanged.
+"""
+from laundry.constants import laundry_version
+from typing import Dict, Tuple
+from stat import S_IWOTH
+from pathlib import Path
+import hashlib
+import os
+import pickle
+import tempfile
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_SIZE_MB = 1024
+PARQUET_SUFFIX = '.parquet'
+PICKLE_SUFFIX = '.pkl'
+
+
+def file_digest(path: (Path, str), chunk_size: int = 1 << 20) -> str:
+    """
+    Return the sha256 hex digest of a file's contents.
+    :param path: The file to be hashed.
+    :param chunk_size: The number of bytes read at a time.
+    :return: str
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def private_directory(path: Path) -> bool:
+    """
+    :param path: A directory.
+    :return: True if the directory belongs to the current user and is not writable by everyone. Always True where
+    files have no owner, e.g. on Windows.
+    """
+    if not hasattr(os, 'getuid'):
+        return True
+    t_stat = path.stat()
+    return t_stat.st_uid == os.getuid() and not t_stat.st_mode & S_IWOTH
+
+
+class WorksheetCache:
+    """
+    Store cleaned worksheet DataFrames in a cache directory. Entries are keyed by the spreadsheet's content hash, the
+    worksheet name, the header row and the cleaning flags, so a changed spreadsheet will never return a stale entry.
+    DataFrames are stored as Parquet when pyarrow is installed and the DataFrame can be represented, otherwise they are
+    pickled. Unpickling a file can run arbitrary code, so pickled entries are only used if the cache directory belongs
+    to the current user and is not writable by everyone. The least recently used entries are removed once the cache
+    exceeds max_size_mb.
+    """
+
+    def __init__(self, cache_dir: (Path, str), max_size_mb: int = DEFAULT_CACHE_SIZE_MB):
+        """
+        :param cache_dir: The directory used to store the cache. It will be created if it does not exist.
+        :param max_size_mb: The maximum size of the cache directory in megabytes.
+        """
+        self._cache_dir: Path = Path(cache_dir)
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        self._max_size: int = int(max_size_mb * 1024 * 1024)
+        self._pickle: bool = private_directory(self._cache_dir)
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def workbook_digest(self, workbook: (Path, str)) -> str:
+        """
+        Return the content hash of the spreadsheet. The hash is only recalculated if the file's size or modification
+        time has changed.
+        :param workbook: The spreadsheet's file path.
+        :return: str
+        """
+        stat = os.stat(workbook)
+        key = (str(workbook), stat.st_size, stat.st_mtime_ns)
+        if key not in self._digests:
+            self._digests[key] = file_digest(workbook)
+        return self._digests[key]
+
+    def entry_key(self, workbook: (Path, str), worksheet: str, header_row: int, clean_header: bool,
+                  drop_empty_rows: bool, *args) -> str:
+        """
+        Return the key for a worksheet. Any additional arguments that change the loaded DataFrame are included in the
+        key.
+        :return: str
+        """
+        parts = [laundry_version, pd.__version__, self.workbook_digest(workbook), worksheet, header_row, clean_header,
+                 drop_empty_rows, *args]
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> (pd.DataFrame, None):
+        """
+        Return the cached DataFrame, or None if the key is not cached.
+        :param key: The key returned by entry_key().
+        :return:
+        """
+        for suffix in (PARQUET_SUFFIX, PICKLE_SUFFIX) if self._pickle else (PARQUET_SUFFIX,):
+            path = self._cache_dir.joinpath(key + suffix)
+            try:
+                if suffix == PARQUET_SUFFIX:
+                    df = self.restore_missing(pd.read_parquet(path))
+                else:
+                    df = pd.read_pickle(path)
+            except (OSError, ImportError, ValueError, pickle.UnpicklingError):
+                continue
+            # Touch the entry so it is the most recently used.
+            os.utime(path)
+            self.hits += 1
+            return df
+        self.misses += 1
+        return None
+
+    def put(self, key: str, df: pd.DataFrame):
+        """
+        Store the DataFrame and remove old entries if the cache is over its size limit. Entries are written to a
+        temporary file first so parallel workers never read a partially written entry. A DataFrame that can only be
+        pickled is not stored if pickled entries are not used, see WorksheetCache.
+        :param key: The key returned by entry_key().
+        :param df: The DataFrame to be stored.
+        :return:
+        """
+        t_fd, t_path = tempfile.mkstemp(suffix='.tmp', prefix=key + '.', dir=str(self._cache_dir))
+        os.close(t_fd)
+        try:
+            df.to_parquet(t_path)
+            suffix = PARQUET_SUFFIX
+        except Exception:
+            # pyarrow is not installed, or the DataFrame contains mixed types or column names that it cannot store.
+            if not self._pickle:
+                os.remove(t_path)
+                return
+            df.to_pickle(t_path)
+            suffix = PICKLE_SUFFIX
+        os.replace(t_path, self._cache_dir.joinpath(key + suffix))
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is within its size limit.
+        :return:
+        """
+        entries = []
+        for path in self._cache_dir.iterdir():
+            if path.suffix in (PARQUET_SUFFIX, PICKLE_SUFFIX):
+                stat = path.stat()
+                entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self._max_size:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+
+    @staticmethod
+    def restore_missing(df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Parquet returns empty cells in text columns as None where pandas.read_excel() returns NaN. Restore the NaN
+        values so cached DataFrames are identical to freshly parsed ones.
+        :param df: The DataFrame read from Parquet.
+        :return:
+        """
+        for col in df.columns[df.dtypes == object]:
+            df[col] = df[col].where(df[col].notna(), np.nan)
+        return df
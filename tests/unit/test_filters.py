@@ -0,0 +1,92 @@
+import datetime
+import pytest
+import pandas as pd
+from openpyxl import Workbook
+from laundry.filters import RowFilter, RowPrefilter, parse_filters, filter_mask
+from laundry.readers import open_workbook, READER_ENGINES
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({'component': ['iso', 'cb', 'iso', None, 'pump'],
+                         'score': [1, 5, 10, 2.5, None],
+                         'inspected': pd.to_datetime(['2020-01-01', '2020-06-01', None, '2021-01-01', '2019-12-31']),
+                         'notes': ['Cracked', 'ok', '', 'CRACK at A12', None]})
+
+
+@pytest.mark.parametrize('filters,expected', [
+    ('component: iso, cb', [RowFilter('component', 'in', ('iso', 'cb'))]),
+    ('score > 2', [RowFilter('score', '>', (2.0,))]),
+    ('score<=2', [RowFilter('score', '<=', (2.0,))]),
+    ('score between 1 and 5', [RowFilter('score', 'between', (1.0, 5.0))]),
+    ('inspected >= 2020-06-01', [RowFilter('inspected', '>=', (pd.Timestamp('2020-06-01'),))]),
+    ('notes contains crack', [RowFilter('notes', 'contains', ('crack',))]),
+    ('notes matches ^C', [RowFilter('notes', 'matches', ('^C',))]),
+    ('notes is empty', [RowFilter('notes', 'empty', ())]),
+    ('notes is not empty', [RowFilter('notes', 'empty', (), True)]),
+    ('not component: iso\nscore > 1', [RowFilter('component', 'in', ('iso',), True), RowFilter('score', '>', (1.0,))]),
+])
+def test_parse_filters(filters, expected):
+    assert parse_filters(filters) == expected
+
+
+@pytest.mark.parametrize('filters', ['component iso', 'score > high', 'score between 1 and 2020-01-01',
+                                     'notes matches ('])
+def test_parse_filters_invalid(filters):
+    with pytest.raises(ValueError):
+        parse_filters(filters)
+
+
+@pytest.mark.parametrize('filters,expected', [
+    ('component: iso, cb', [0, 1, 2]),
+    ('not component: iso', [1, 3, 4]),
+    ('score > 2', [1, 2, 3]),
+    ('score between 1 and 5', [0, 1, 3]),
+    ('inspected < 2020-06-01', [0, 4]),
+    ('notes contains crack', [0, 3]),
+    ('notes matches ^C', [0, 3]),
+    ('notes is empty', [2, 4]),
+    ('notes is not empty\ncomponent: iso', [0]),
+])
+def test_filter_mask(df, filters, expected):
+    assert list(df.loc[filter_mask(df, parse_filters(filters))].index) == expected
+
+
+def test_filter_mask_missing_column(df):
+    with pytest.raises(ValueError):
+        filter_mask(df, parse_filters('colour: red'))
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Master List'
+    ws.append(['A title row'])
+    ws.append(['Asset Name', 'Score', 'Inspected', 'Notes'])
+    ws.append(['iso', 1, datetime.datetime(2020, 1, 2), 'Cracked'])
+    ws.append(['cb', '7', datetime.datetime(2020, 3, 4), 'ok'])
+    ws.append(['iso', 'n/a', None, 12])
+    ws.append([None, None, None, None])
+    ws.append(['pump', 12.5, 'not a date', 'NA'])
+    ws.append(['iso', 3, datetime.datetime(2021, 5, 6), None])
+    ws.append([None, None, None, None])
+    fp = tmp_path / 'book.xlsx'
+    wb.save(fp)
+    return fp
+
+
+@pytest.mark.parametrize('reader', [reader for reader in READER_ENGINES if reader != 'pandas'])
+@pytest.mark.parametrize('filters', ['asset_name: iso', 'score > 2', 'score between 1 and 10', 'notes contains CRACK',
+                                     'notes matches ^o', 'inspected >= 2020-03-01', 'notes is empty',
+                                     'not asset_name: iso', 'asset_name: iso\nscore < 3'])
+def test_row_prefilter_matches_full_read(workbook, reader, filters):
+    if reader == 'calamine':
+        pytest.importorskip('python_calamine')
+    t_filters = parse_filters(filters)
+    wb = open_workbook(workbook, reader)
+    assert wb.supports_row_filter
+    full = wb.read_sheet('Master List', 1).clean_names()
+    prefiltered = wb.read_sheet('Master List', 1, RowPrefilter(t_filters)).clean_names()
+    pd.testing.assert_frame_equal(prefiltered.loc[filter_mask(prefiltered, t_filters)],
+                                  full.loc[filter_mask(full, t_filters)])
@@ -0,0 +1,89 @@
+import os
+import pytest
+from pathlib import Path
+from laundry.images import ImagePipeline, ImageCache
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def photo_dir(tmp_path):
+    Image.new('RGB', (2000, 1500), (120, 30, 200)).save(tmp_path / 'large.jpg')
+    Image.new('RGB', (200, 150), (120, 30, 200)).save(tmp_path / 'small.jpg')
+    Image.new('RGB', (200, 150), (120, 30, 200)).save(tmp_path / 'small.tiff')
+    Image.new('RGBA', (2000, 1000), (0, 0, 0, 0)).save(tmp_path / 'clear.png')
+    return tmp_path
+
+
+def test_image_pipeline_resample(photo_dir):
+    pipeline = ImagePipeline(dpi=100)
+    with Image.open(pipeline.prepare(photo_dir / 'large.jpg', 4)) as img:
+        assert img.format == 'JPEG'
+        assert img.size == (400, 300)
+    with Image.open(pipeline.prepare(photo_dir / 'clear.png', 4)) as img:
+        assert img.format == 'PNG'
+        assert img.size == (400, 200)
+
+
+def test_image_pipeline_unchanged(photo_dir):
+    pipeline = ImagePipeline(dpi=100)
+    assert pipeline.prepare(photo_dir / 'small.jpg', 4) == photo_dir / 'small.jpg'
+    # TIFF photos are always converted, even if they are small enough.
+    with Image.open(pipeline.prepare(photo_dir / 'small.tiff', 4)) as img:
+        assert img.format == 'JPEG'
+        assert img.size == (200, 150)
+
+
+def test_image_pipeline_cache(photo_dir, tmp_path):
+    pipeline = ImagePipeline(dpi=100, cache_dir=tmp_path / 'cache')
+    prepared = pipeline.prepare(photo_dir / 'large.jpg', 4)
+    assert isinstance(prepared, Path)
+    assert prepared.parent == tmp_path / 'cache'
+    mtime = prepared.stat().st_mtime_ns
+    assert ImagePipeline(dpi=100, cache_dir=tmp_path / 'cache').prepare(photo_dir / 'large.jpg', 4) == prepared
+    assert prepared.stat().st_mtime_ns == mtime
+    # A different size is a different cache entry.
+    assert pipeline.prepare(photo_dir / 'large.jpg', 2) != prepared
+    assert pipeline.prepare(photo_dir / 'small.jpg', 4) == photo_dir / 'small.jpg'
+    assert pipeline.prepare(photo_dir / 'small.jpg', 4) == photo_dir / 'small.jpg'
+
+
+def test_image_cache(photo_dir):
+    cache = ImageCache()
+    image = cache.get(photo_dir / 'small.jpg', 4)
+    assert (image.px_width, image.px_height) == (200, 150)
+    assert cache.get(photo_dir / 'small.jpg', 2) is image
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.size == len(image.blob)
+
+
+def test_image_cache_evict(photo_dir):
+    for name in ['a.jpg', 'b.jpg', 'c.jpg']:
+        (photo_dir / name).write_bytes((photo_dir / 'small.jpg').read_bytes())
+    cache = ImageCache(max_size_mb=2 * (photo_dir / 'small.jpg').stat().st_size / 1024 / 1024)
+    cache.get(photo_dir / 'a.jpg', 4)
+    cache.get(photo_dir / 'b.jpg', 4)
+    cache.get(photo_dir / 'a.jpg', 4)
+    cache.get(photo_dir / 'c.jpg', 4)
+    # The least recently used photo is evicted first.
+    assert len(cache) == 2
+    cache.get(photo_dir / 'a.jpg', 4)
+    cache.get(photo_dir / 'b.jpg', 4)
+    assert (cache.hits, cache.misses) == (2, 4)
+    assert cache.size <= cache.max_size
+
+
+def test_image_cache_new_run(photo_dir, monkeypatch):
+    cache = ImageCache()
+    image = cache.get(photo_dir / 'small.jpg', 4)
+    Image.new('RGB', (300, 150), (0, 0, 0)).save(photo_dir / 'small.jpg')
+    os.utime(photo_dir / 'small.jpg', ns=(0, 1_000_000_000))
+    # Each photo is only stat'ed once per run, so a change is found by the next run.
+    stats = []
+    monkeypatch.setattr(os, 'stat', lambda path: stats.append(path) or os.lstat(path))
+    assert cache.get(photo_dir / 'small.jpg', 4) is image
+    assert stats == []
+    cache.new_run()
+    assert cache.get(photo_dir / 'small.jpg', 4).px_width == 300
+    assert cache.get(photo_dir / 'small.jpg', 4).px_width == 300
+    assert len(stats) == 1
@@ -1,6 +1,9 @@
 import pytest
+import pandas as pd
 import laundry.laundryclass as laundry
+from docx import Document
 from pathlib import Path, PurePath
+from types import SimpleNamespace
 
 struct_dict = {1: 'a', 2: 'b'}
 data_dict = {3: 'c', 4: 'd'}
@@ -40,11 +43,51 @@ def test_sort_table_data(record, header, format_title, expected):
     assert expected == result
 
 
+def test_compile_render_plan():
+    structure = pd.DataFrame({'section_type': ['Heading', 'table', 'photo', 'other'],
+                              'section_contains': ['Asset_Name', 'component\ndefect_type', 'photos', 'asset_name'],
+                              'section_style': ['Normal', 'Table Grid', None, None],
+                              'title_style': ['Heading 1', None, None, None],
+                              'section_break': [False, True, False, False],
+                              'page_break': [False, False, True, False],
+                              'path': [None, None, 'photos', None]})
+    columns = ['asset_name', 'component', 'defect_type', 'photos']
+    plan = laundry.compile_render_plan(structure, columns)
+    assert [op.section_type for op in plan] == ['paragraph', 'table', 'photo', 'unknown']
+    assert plan[0].positions == (1,)
+    assert plan[0].title == 'Asset_Name'
+    assert plan[0].title_style == 'Heading 1'
+    assert plan[1].positions == (2, 3)
+    assert plan[1].headers == ('Component', 'Defect Type')
+    assert plan[1].section_style == 'Table Grid'
+    assert plan[1].section_break is True
+    assert plan[2].positions == (4,)
+    assert plan[2].page_break is True
+
+
 def test_remove_underscore():
     expected = 'this is a test'
     assert laundry.remove_underscore('this_is_a_test') == expected
 
 
+@pytest.mark.parametrize('stream', [False, True])
+@pytest.mark.parametrize('max_rows_per_file,expected', [(2, [2, 2, 1]), (5, [5]), (10, [5])])
+def test_single_load_volumes(tmp_path, max_rows_per_file, expected, stream):
+    structure = pd.DataFrame({'section_type': ['para'], 'section_contains': ['asset_name'],
+                              'section_style': ['Normal'], 'title_style': ['nan'], 'section_break': [False],
+                              'page_break': [False]})
+    data = pd.DataFrame({'asset_name': [f'Asset {i}' for i in range(5)]})
+    load = laundry.SingleLoad(structure, data, None, tmp_path / 'output.docx', max_rows_per_file=max_rows_per_file,
+                              stream=stream)
+    assert [volume['rows'] for volume in load.volumes] == expected
+    assert load.volumes[-1]['last_row'] == 4
+    for volume in load.volumes:
+        t_document = Document(tmp_path / f"output_{volume['volume']:03d}.docx")
+        assert len(t_document.paragraphs) == volume['rows']
+    assert pd.read_csv(tmp_path / 'output_index.csv')['rows'].tolist() == expected
+    assert not (tmp_path / 'output.docx').exists()
+
+
 # @pytest.mark.parametrize('test_path,expected', [[[r'\\..\unit'], Path(r'../unit')],
 #                                                 [[r'/../../src'], Path(r'../../src')],
 #                                                 [[r'/test_laundryclass.py'], r'Incorrect path.']
@@ -94,8 +137,19 @@ def test_format_docx():
     pass
 
 
-def test_insert_table():
-    pass
+@pytest.mark.parametrize('rows,cols', [(2, 10), (5, 3)])
+def test_insert_table(rows, cols):
+    data = [tuple(f'{i}, {j}' for j in range(cols)) for i in range(rows)]
+    bulk = Document()
+    load = SimpleNamespace(_file_template=bulk, _volume_bytes=0)
+    laundry.SingleLoad.insert_table(load, cols, rows, data, 'Table Grid', False)
+    per_cell = Document()
+    table = per_cell.add_table(rows=rows, cols=cols, style='Table Grid')
+    table.autofit = False
+    for i, cell_contents in enumerate(data):
+        for j, text in enumerate(cell_contents):
+            table.rows[i].cells[j].text = str(text)
+    assert bulk.tables[0]._tbl.xml == per_cell.tables[0]._tbl.xml
 
 
 def test_insert_paragraph():
@@ -136,13 +190,108 @@ def test_laundry_resolve_file_path():
     exception_msg = excinfo.value.args[1]
     assert exception_msg == 'No such file or directory'
 
-def test_laundry_check_batch_data():
-    pass
+
+def test_wash_batch_row_worker_failure():
+    """Test that a worker reports a failed batch row rather than raising."""
+    batch_row = {'Index': 3, 'data_worksheet': 'Master List', 'structure_worksheet': '_structure', 'header_row': 0,
+                 'drop_empty_columns': True, 'template_file': None, 'filter_rows': None, 'output_file': 'out.docx'}
+    result = laundry.wash_batch_row_worker(Path('this_file_does_not_exist.xlsx'), [], batch_row, {'verbose': False})
+    assert result.index == 3
+    assert result.output_file == 'out.docx'
+    assert result.success is False
+    assert result.message.startswith('FileNotFoundError')
+
+
+@pytest.mark.parametrize('reader', ['pandas', 'openpyxl-stream'])
+def test_laundry_check_batch_data(tmp_path, monkeypatch, capsys, reader):
+    monkeypatch.chdir(tmp_path)
+    Document().save(tmp_path / 'template.docx')
+    (tmp_path / 'photos').mkdir()
+    batch = pd.DataFrame({'data_worksheet': 'data', 'structure_worksheet': ['structure', 'missing_column'],
+                          'header_row': 0, 'drop_empty_columns': True, 'template_file': 'template.docx',
+                          'filter_rows': ['component: iso', None], 'output_file': ['iso.docx', 'all.docx']})
+    structure = {'section_type': ['table', 'photo'], 'section_contains': ['name\ncomponent', 'photo'],
+                 'section_style': ['Table Grid', None], 'title_style': [None, None], 'section_break': [None, None],
+                 'page_break': [None, None], 'path': [None, 'photos']}
+    data = pd.DataFrame({'name': ['a', 'b'], 'component': ['sw', 'iso'], 'photo': ['none', 'zzz'],
+                         'notes': ['x', 'y']})
+    with pd.ExcelWriter(tmp_path / 'book.xlsx') as writer:
+        batch.to_excel(writer, sheet_name='batch', index=False)
+        pd.DataFrame(structure).to_excel(writer, sheet_name='structure', index=False)
+        pd.DataFrame(dict(structure, section_contains=['name\nmissing', 'photo'])).to_excel(
+            writer, sheet_name='missing_column', index=False)
+        data.to_excel(writer, sheet_name='data', index=False)
+
+    # Every batch row is checked before any output file is produced.
+    with pytest.raises(SystemExit) as excinfo:
+        laundry.Laundry(tmp_path / 'book.xlsx', batch_worksheet='batch', reader=reader, log_level='error')
+    assert excinfo.value.code == 1
+    assert not (tmp_path / 'iso.docx').exists()
+    output = capsys.readouterr().out
+    assert "The photo zzz does not exist" in output
+    # The data worksheet's header is listed, not only the columns that were loaded.
+    assert "has the columns ['name', 'component', 'photo', 'notes']" in output
+    assert 'data worksheet check failed with 2 errors' in output
+
+
+def test_laundry_check_dataframe_exit_status():
+    """Test that a failed check exits with status 1."""
+    def failed_check():
+        raise ValueError('The check failed.')
+
+    with pytest.raises(SystemExit) as excinfo:
+        laundry.Laundry.__new__(laundry.Laundry).check_dataframe('Data', pd.DataFrame(), 'Check: Data', failed_check,
+                                                                 'Data checked')
+    assert excinfo.value.code == 1
+
+
+def test_laundry_check_photo_paths(tmp_path):
+    for name in ['p1.jpg', 'p2.png', 'p2.jpg']:
+        (tmp_path / name).write_bytes(b'')
+    photos = {path.name: path for path in tmp_path.iterdir()}
+    assert laundry.Laundry.check_photo_paths(' p1 ', photos) == tmp_path / 'p1.jpg'
+    assert laundry.Laundry.check_photo_paths('p2', laundry.PhotoIndex(tmp_path)) == tmp_path / 'p2.jpg'
+    for photo in ['p3.jpg', 'p1.txt']:
+        with pytest.raises(ValueError):
+            laundry.Laundry.check_photo_paths(photo, photos)
+
+
+def test_laundry_data_check():
+    check = laundry.Laundry.__new__(laundry.Laundry)
+    assert laundry.Laundry.in_lists(['a', 'b'], ['A'])
+    check.data_check('Check', 'Ok', [(['a'], ['a', 'b'])], 'subset')
+    check.data_check('Check', 'Ok', [(['a', 'b'], ['B'])], 'part')
+    with pytest.raises(SystemExit) as excinfo:
+        check.data_check('Check', 'Ok', [(['a', 'b'], ['c'])], 'part')
+    assert excinfo.value.code == 1
 
 
 def test_laundry_excel_to_dataframe():
     pass
 
 
+@pytest.mark.parametrize('reader', ['pandas', 'openpyxl-stream'])
+def test_laundry_excel_to_dataframe_columns(tmp_path, reader):
+    df = pd.DataFrame({'Asset Name': ['iso', None, 'cb', None], 'Component': ['a', 'b', None, None],
+                       'Notes': [None, 'x', 'y', None], 'Score': [1, None, 3, 4]})
+    fp = tmp_path / 'book.xlsx'
+    df.to_excel(fp, sheet_name='Master List', index=False)
+    wb = laundry.open_workbook(fp, reader)
+    full = laundry.Laundry.excel_to_dataframe(wb, 'Master List', clean_header=True, drop_empty_rows=True)
+    result = laundry.Laundry.excel_to_dataframe(wb, 'Master List', clean_header=True, drop_empty_rows=True,
+                                                columns=('asset_name', 'score', 'not_a_column'),
+                                                dtypes={'asset_name': 'category', 'not_a_column': 'category'})
+    assert list(full.index) == [0, 1, 2]
+    pd.testing.assert_frame_equal(result, full.loc[:, ['asset_name', 'score']].astype({'asset_name': 'category'}))
+
+
 def test_laundry_prepare_row_filters():
     pass
+
+
+def test_laundry_filter_dataframe():
+    df = pd.DataFrame({'component': ['iso', 'sw', 'iso', 'cb'], 'defect_type': ['A', 'A', 'B', 'A']})
+    filters = laundry.Laundry.prepare_row_filters('component: iso, cb\ndefect_type: A')
+    result = laundry.Laundry.filter_dataframe(df, filters)
+    assert list(result.index) == [0, 3]
+    assert len(df) == 4
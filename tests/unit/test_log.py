@@ -0,0 +1,82 @@
+import json
+import pickle
+import pytest
+from contextlib import redirect_stdout
+from io import StringIO
+from laundry.log import log, notice, style, configure_logging, replay, OUTPUT_TITLE
+from laundry.log import captured as captured_records
+
+
+@pytest.fixture(autouse=True)
+def reset_logging():
+    yield
+    configure_logging()
+
+
+def captured(function) -> str:
+    output = StringIO()
+    with redirect_stdout(output):
+        function()
+    return output.getvalue()
+
+
+def test_configure_logging_levels():
+    configure_logging('notice')
+    output = captured(lambda: (log.info('hidden'), notice('shown'), log.error('failed')))
+    assert 'hidden' not in output
+    assert 'shown' in output and 'failed' in output
+
+
+def test_configure_logging_invalid():
+    with pytest.raises(ValueError):
+        configure_logging('loud')
+    with pytest.raises(ValueError):
+        configure_logging('info', 'xml')
+
+
+def test_text_format_end():
+    configure_logging('info')
+    output = captured(lambda: (log.info('Check', extra=style(OUTPUT_TITLE, end='...')), log.info('Ok')))
+    assert output.count('\n') == 1
+    assert 'Check' in output.split('\n')[0] and 'Ok' in output.split('\n')[0]
+
+
+def test_debug_formatted_lazily():
+    class Expensive:
+        formatted = 0
+
+        def __str__(self):
+            Expensive.formatted += 1
+            return 'expensive'
+
+    configure_logging('info')
+    captured(lambda: log.debug('%s', Expensive()))
+    assert Expensive.formatted == 0
+    configure_logging('debug')
+    assert 'expensive' in captured(lambda: log.debug('%s', Expensive()))
+
+
+def test_json_format():
+    configure_logging('info', 'json')
+    output = captured(lambda: (log.info('  Check', extra=style(end='...')),
+                               notice('Document completed', extra=style(output_file='out.docx'))))
+    records = [json.loads(line) for line in output.splitlines()]
+    assert [record['level'] for record in records] == ['info', 'notice']
+    assert records[0]['message'] == 'Check'
+    assert records[1]['output_file'] == 'out.docx'
+    assert '\x1b' not in output
+
+
+def test_captured_records_replayed_as_json():
+    configure_logging('info', 'json')
+    # The messages logged in a worker process are captured, not written, and logged again by the parent process.
+    with captured_records() as capture:
+        assert captured(lambda: (log.info('  Row %s', 1, extra=style(end='...')),
+                                 notice('Document completed', extra=style(output_file='out.docx')))) == ''
+    records = pickle.loads(pickle.dumps(capture.records))
+    output = captured(lambda: replay(records))
+    messages = [json.loads(line) for line in output.splitlines()]
+    assert [message['message'] for message in messages] == ['Row 1', 'Document completed']
+    assert messages[1]['output_file'] == 'out.docx'
+    configure_logging('notice')
+    assert 'Row 1' not in captured(lambda: replay(records))
@@ -0,0 +1,85 @@
+import json
+import pandas as pd
+from laundry.laundryclass import Laundry
+from laundry.manifest import BuildManifest, BuildRecord, MANIFEST_FILE, frame_digest, file_stat
+
+
+def test_frame_digest():
+    df = pd.DataFrame({'a': [1, 2], 'b': ['x', None]})
+    assert frame_digest(df) == frame_digest(df.copy())
+    assert frame_digest(df) != frame_digest(df.assign(b=['x', 'y']))
+    assert frame_digest(df) != frame_digest(df.rename(columns={'b': 'c'}))
+    assert frame_digest(df) != frame_digest(df.iloc[:1])
+
+
+def test_build_manifest_roundtrip(tmp_path):
+    output_file = tmp_path / 'out.docx'
+    output_file.write_bytes(b'document')
+    photo = tmp_path / 'photo.jpg'
+    photo.write_bytes(b'photo')
+
+    manifest = BuildManifest()
+    photos, records = manifest.photos_fingerprint([photo, photo])
+    build = BuildRecord({'data': 'a', 'photos': photos}, records)
+    assert not manifest.is_current(output_file, build)
+    manifest.record(output_file, build._replace(files={output_file.name: file_stat(output_file)}))
+    manifest.save()
+    assert set(json.loads((tmp_path / MANIFEST_FILE).read_text())['outputs']) == {'out.docx'}
+
+    manifest = BuildManifest()
+    photos, records = manifest.photos_fingerprint([photo, photo])
+    assert manifest.is_current(output_file, BuildRecord({'data': 'a', 'photos': photos}, records))
+    assert not manifest.is_current(output_file, BuildRecord({'data': 'b', 'photos': photos}, records))
+
+    photo.write_bytes(b'changed photo')
+    changed, _ = manifest.photos_fingerprint([photo])
+    assert changed != photos
+
+
+def test_build_manifest_output_changed(tmp_path):
+    output_file = tmp_path / 'out.docx'
+    output_file.write_bytes(b'document')
+    build = BuildRecord({'data': 'a'}, {})
+    manifest = BuildManifest()
+    manifest.record(output_file, build._replace(files={output_file.name: file_stat(output_file)}))
+    assert manifest.is_current(output_file, build)
+    output_file.write_bytes(b'edited document')
+    assert not manifest.is_current(output_file, build)
+    output_file.unlink()
+    assert not manifest.is_current(output_file, build)
+
+
+def test_build_manifest_discard_and_skipped(tmp_path):
+    output_file = tmp_path / 'out.docx'
+    manifest = BuildManifest()
+    manifest.record(output_file, BuildRecord({'data': 'a'}, {}, {}))
+    manifest.record(output_file, BuildRecord({'data': 'b'}, {}, {}, skipped=True))
+    assert manifest.is_current(output_file, BuildRecord({'data': 'a'}, {}))
+    manifest.discard(output_file)
+    assert not manifest.is_current(output_file, BuildRecord({'data': 'a'}, {}))
+
+
+def test_build_manifest_unreadable(tmp_path):
+    (tmp_path / MANIFEST_FILE).write_text('not json')
+    assert BuildManifest().manifest(tmp_path / 'out.docx') == {'outputs': {}}
+
+
+def test_incremental_run_without_template(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    batch = pd.DataFrame({'data_worksheet': ['data'], 'structure_worksheet': ['structure'], 'header_row': [0],
+                          'drop_empty_columns': [True], 'template_file': [None], 'filter_rows': [None],
+                          'output_file': ['report.docx']})
+    structure = pd.DataFrame({'section_type': ['table'], 'section_contains': ['name\nscore'],
+                              'section_style': ['Table Grid'], 'title_style': [None], 'section_break': [None],
+                              'page_break': [None], 'path': [None]})
+    with pd.ExcelWriter(tmp_path / 'book.xlsx') as writer:
+        batch.to_excel(writer, sheet_name='batch', index=False)
+        structure.to_excel(writer, sheet_name='structure', index=False)
+        pd.DataFrame({'name': ['a', 'b'], 'score': [1, 2]}).to_excel(writer, sheet_name='data', index=False)
+
+    # A batch row without a template uses the default template, which is not hashed.
+    for skipped in (False, True):
+        laundry = Laundry(tmp_path / 'book.xlsx', batch_worksheet='batch', verbose=False, incremental=True)
+        assert laundry.batch_results[0].build.fingerprint['template'] is None
+        assert laundry.batch_results[0].build.skipped is skipped
+    assert (tmp_path / 'report.docx').exists()
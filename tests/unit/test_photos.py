@@ -0,0 +1,38 @@
+import pytest
+from laundry.photos import PhotoIndex, get_photo_index
+
+
+@pytest.fixture
+def photo_dir(tmp_path):
+    for name in ['shed.jpg', 'pump.png', 'pump.jpg', 'isolator.tiff', 'notes.txt']:
+        (tmp_path / name).write_bytes(b'')
+    return tmp_path
+
+
+def test_photo_index_find(photo_dir):
+    index = PhotoIndex(photo_dir)
+    assert len(index) == 4
+    assert index.find('shed.jpg') == photo_dir.resolve() / 'shed.jpg'
+    assert index.find('isolator') == photo_dir.resolve() / 'isolator.tiff'
+    # The photo_formats order decides which file is used when the stem is ambiguous.
+    assert index.find('pump') == photo_dir.resolve() / 'pump.jpg'
+
+
+@pytest.mark.parametrize('photo', ['notes.txt', 'notes', 'missing', 'missing.jpg'])
+def test_photo_index_not_found(photo_dir, photo):
+    index = PhotoIndex(photo_dir)
+    with pytest.raises(ValueError):
+        index.find(photo)
+
+
+def test_photo_index_ambiguous(photo_dir):
+    index = PhotoIndex(photo_dir)
+    assert [p.name for p in index.ambiguous('pump')] == ['pump.jpg', 'pump.png']
+    assert index.ambiguous('pump.png') == []
+    assert index.ambiguous('shed') == []
+    assert list(index.ambiguous_stems) == ['pump']
+
+
+def test_get_photo_index_shared(photo_dir):
+    index = get_photo_index(photo_dir)
+    assert get_photo_index(photo_dir) is index
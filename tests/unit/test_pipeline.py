@@ -0,0 +1,95 @@
+import threading
+import time
+from pathlib import Path
+import pytest
+import pandas as pd
+from docx import Document
+from laundry.laundryclass import Laundry
+from laundry.pipeline import BatchPipeline, PipelineStopped
+
+
+def test_prepared_in_order_and_ahead():
+    prepared = []
+    with BatchPipeline(lambda item: prepared.append(item) or item * 10, depth=2) as pipeline:
+        rows = pipeline.prepared(range(6))
+        assert next(rows) == 0
+        # The rows after the one being rendered are prepared on the prepare thread, up to the depth.
+        time.sleep(0.1)
+        assert prepared == [0, 1, 2]
+        assert list(rows) == [10, 20, 30, 40, 50]
+    assert prepared == [0, 1, 2, 3, 4, 5]
+
+
+def test_prepared_stops_after_failure():
+    prepared = []
+
+    def prepare(item):
+        prepared.append(item)
+        if item == 1:
+            raise SystemExit()
+        return item
+
+    with BatchPipeline(prepare, depth=3) as pipeline:
+        rows = pipeline.prepared(range(5))
+        assert next(rows) == 0
+        with pytest.raises(SystemExit):
+            next(rows)
+    # The rows after the failed row are not prepared.
+    assert prepared == [0, 1]
+    with BatchPipeline(prepare, depth=1) as pipeline:
+        assert pipeline.prepare(2, None) == 2
+        pipeline.close()
+        with pytest.raises(PipelineStopped):
+            pipeline.prepare(3, None)
+
+
+def test_save_bounded_and_in_order():
+    release = threading.Event()
+    saved, recorded = [], []
+
+    def save(item):
+        release.wait(10)
+        saved.append(item)
+
+    with BatchPipeline(lambda item: item, depth=2) as pipeline:
+        for item in range(2):
+            pipeline.save(lambda item=item: save(item), lambda future, item=item: recorded.append(item))
+        # Two saves may wait. The renderer waits for the oldest before a third is queued.
+        assert recorded == []
+        release.set()
+        pipeline.save(lambda: save(2), lambda future: recorded.append(2))
+        assert recorded[:1] == [0]
+        pipeline.drain()
+    assert saved == recorded == [0, 1, 2]
+    with pytest.raises(ValueError):
+        BatchPipeline(lambda item: item, depth=0)
+
+
+def test_laundry_pipeline_depth(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Document().save(tmp_path / 'template.docx')
+    batch = pd.DataFrame({'data_worksheet': 'data', 'structure_worksheet': 'structure', 'header_row': 0,
+                          'drop_empty_columns': True, 'template_file': 'template.docx',
+                          'filter_rows': ['component: iso', None, 'component: sw'],
+                          'output_file': ['iso.docx', 'all.docx', 'sw.docx']})
+    structure = pd.DataFrame({'section_type': ['heading', 'table'], 'section_contains': ['name', 'component\nscore'],
+                              'section_style': ['Heading 1', 'Table Grid'], 'title_style': [None, None],
+                              'section_break': [None, True], 'page_break': [None, None], 'path': [None, None]})
+    data = pd.DataFrame({'name': ['a', 'b', 'c', 'd'], 'component': ['iso', 'sw', 'iso', 'sw'],
+                         'score': [1, 2, 3, 4]})
+    with pd.ExcelWriter(tmp_path / 'book.xlsx') as writer:
+        batch.to_excel(writer, sheet_name='batch', index=False)
+        structure.to_excel(writer, sheet_name='structure', index=False)
+        data.to_excel(writer, sheet_name='data', index=False)
+
+    texts = {}
+    for depth in (0, 2):
+        laundry = Laundry(tmp_path / 'book.xlsx', batch_worksheet='batch', verbose=False, incremental=True,
+                          force=True, pipeline_depth=depth)
+        assert [Path(result.output_file).name for result in laundry.batch_results] == \
+            ['iso.docx', 'all.docx', 'sw.docx']
+        assert all(result.build.files for result in laundry.batch_results)
+        texts[depth] = {name: [p.text for p in Document(tmp_path / name).paragraphs]
+                        for name in ('iso.docx', 'all.docx', 'sw.docx')}
+    assert texts[2] == texts[0]
+    assert [text for text in texts[2]['sw.docx'] if text] == ['b', 'd']
@@ -0,0 +1,83 @@
+import pytest
+import threading
+import time
+from laundry.images import ImageCache
+from laundry.prefetch import PhotoPrefetcher, PrefetchStats
+
+Image = pytest.importorskip('PIL.Image')
+
+
+class SlowImageCache(ImageCache):
+    """An image cache whose photos take a while to read, as they would from a network share."""
+
+    def __init__(self, *args, delay: float = 0.05, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.delay = delay
+        self.threads = set()
+
+    def load(self, photo, width):
+        self.threads.add(threading.current_thread().name)
+        time.sleep(self.delay)
+        return super().load(photo, width)
+
+
+@pytest.fixture
+def photos(tmp_path):
+    paths = []
+    for number in range(8):
+        paths.append(tmp_path / f'photo_{number}.png')
+        Image.new('RGB', (20, 10), (number, 0, 0)).save(paths[-1])
+    return paths
+
+
+def test_prefetch_loads_ahead(photos):
+    cache = SlowImageCache()
+    sequence = [(photo, 4) for photo in photos + photos[:2]]
+    with PhotoPrefetcher(cache, sequence, threads=4) as prefetcher:
+        time.sleep(0.3)
+        images = [prefetcher.get(photo, width) for photo, width in sequence]
+    assert [image.sha1 for image in images] == [cache.load(photo, 4).sha1 for photo, _ in sequence]
+    assert all(name.startswith('laundry-prefetch') for name in cache.threads if name != 'MainThread')
+    assert prefetcher.stats.photos == len(sequence)
+    assert prefetcher.stats.read == 0
+    # The first photos were loaded while the renderer slept.
+    assert prefetcher.stats.ready >= len(photos)
+    assert cache.misses == len(photos)
+
+
+def test_prefetch_memory_budget(photos):
+    cache = SlowImageCache(0, delay=0)
+    # The budget is smaller than one photo, so only the photos being loaded are held.
+    prefetcher = PhotoPrefetcher(cache, [(photo, 4) for photo in photos], threads=1, size_mb=1e-6)
+    time.sleep(0.1)
+    assert len(prefetcher._pending) <= 2
+    for photo in photos:
+        prefetcher.get(photo, 4)
+    prefetcher.close()
+    assert prefetcher._held == 0
+    assert prefetcher.stats.photos == len(photos)
+
+
+def test_prefetch_disabled(photos):
+    cache = SlowImageCache(delay=0.01)
+    stats = PrefetchStats()
+    with PhotoPrefetcher(cache, [(photo, 4) for photo in photos], threads=0, stats=stats) as prefetcher:
+        for photo in photos + photos[:1]:
+            prefetcher.get(photo, 4)
+    assert cache.threads == {'MainThread'}
+    assert (stats.ready, stats.waited, stats.read) == (1, 0, len(photos))
+    assert stats.stall_seconds >= 0.01 * len(photos)
+
+
+def test_prefetch_missing_photo(photos, tmp_path):
+    missing = tmp_path / 'missing.png'
+    with PhotoPrefetcher(ImageCache(), [(missing, 4), (photos[0], 4)], threads=2) as prefetcher:
+        with pytest.raises(FileNotFoundError):
+            prefetcher.get(missing, 4)
+        assert prefetcher.get(photos[0], 4) is not None
+
+
+def test_prefetch_stats_merge():
+    stats = PrefetchStats(3, 1, 0, 0.5)
+    stats.merge(PrefetchStats(1, 0, 1, 0.25).export())
+    assert (stats.photos, stats.hit_rate, stats.stall_seconds) == (6, 4 / 6, 0.75)
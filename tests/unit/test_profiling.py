@@ -0,0 +1,58 @@
+import json
+import pstats
+import time
+import pytest
+from laundry.profiling import RunProfile, PHASES
+
+
+def test_run_profile_disabled():
+    profile = RunProfile()
+    with profile.phase('read'):
+        pass
+    profile.record_output('out.docx', {'table': 1}, 1, 10)
+    assert profile.rows == []
+
+
+def test_run_profile_nested_phases():
+    profile = RunProfile(enabled=True)
+    profile.batch_row = 3
+    with profile.phase('render'):
+        time.sleep(0.01)
+        with profile.phase('save'):
+            time.sleep(0.02)
+    profile.record_output('out.docx', {'table': 2, 'photo': 1}, 4, 1024)
+    profile.record_output('out.docx', {'table': 1}, 0, 0)
+    (record,) = profile.rows
+    assert record['batch_row'] == 3
+    assert set(record['phases']) == {'render', 'save'}
+    assert 0.01 <= record['phases']['render'] < 0.02
+    assert record['phases']['save'] >= 0.02
+    assert record['total_seconds'] == pytest.approx(sum(record['phases'].values()))
+    assert record['sections'] == {'table': 3, 'photo': 1}
+    assert (record['photos'], record['image_bytes']) == (4, 1024)
+
+
+def test_run_profile_merge(tmp_path):
+    worker = RunProfile(enabled=True, render_stats=True)
+    worker.batch_row = 1
+    with worker.phase('render'):
+        sorted(range(1000))
+    profile = RunProfile(enabled=True)
+    with profile.phase('open'):
+        pass
+    profile.merge(worker.export())
+    assert [record['batch_row'] for record in profile.rows] == [None, 1]
+    table = profile.table()
+    assert list(table['batch_row']) == ['run', 1]
+    assert {'open (s)', 'render (s)', 'total (s)', 'peak RSS (MB)'} <= set(table.columns)
+
+    profile.write_json(tmp_path / 'profile.json')
+    report = json.loads((tmp_path / 'profile.json').read_text())
+    assert report['phases'] == PHASES
+    assert len(report['rows']) == 2
+    assert profile.dump_render_stats(tmp_path / 'render.stats')
+    assert pstats.Stats(str(tmp_path / 'render.stats')).total_calls > 0
+
+
+def test_run_profile_no_render_stats(tmp_path):
+    assert RunProfile(enabled=True).dump_render_stats(tmp_path / 'render.stats') is False
@@ -0,0 +1,74 @@
+import datetime
+import pytest
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from laundry.readers import open_workbook, convert_cell, ColumnProjection, WorkbookReader, READER_ENGINES
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Master List'
+    ws.append(['A title row'])
+    ws.append([])
+    ws.append(['Asset Name', 'Score', 'Inspected', 'Defect', None, 'Asset Name', 'Notes'])
+    ws.append(['Storage shed', 1, datetime.datetime(2020, 1, 2), True, None, 'x', '12'])
+    ws.append(['Pump', 2.5, None, False, None, None, 3])
+    ws.append([None, None, None, None, None, None, None])
+    ws.append(['Isolator', 3, datetime.datetime(2020, 3, 4, 5, 6), None, 'late', 'y', 'text'])
+    wb.create_sheet('_structure').append(['section_type', 'section_contains'])
+    fp = tmp_path / 'book.xlsx'
+    wb.save(fp)
+    return fp
+
+
+@pytest.mark.parametrize('reader', list(READER_ENGINES))
+@pytest.mark.parametrize('worksheet,header_row', [('Master List', 2), ('Master List', 0), ('_structure', 0)])
+def test_readers_match_read_excel(workbook, reader, worksheet, header_row):
+    if reader == 'calamine':
+        pytest.importorskip('python_calamine')
+    expected = pd.read_excel(workbook, sheet_name=worksheet, header=header_row)
+    wb = open_workbook(workbook, reader)
+    assert wb.sheet_names == ['Master List', '_structure']
+    pd.testing.assert_frame_equal(wb.read_sheet(worksheet, header_row), expected)
+
+
+@pytest.mark.parametrize('reader', [reader for reader, engine in READER_ENGINES.items()
+                                    if engine.supports_projection])
+@pytest.mark.parametrize('columns', [['asset_name', 'notes'], ['score'], ['asset_name_1', 'unnamed_4'], ['missing']])
+def test_readers_projection(workbook, reader, columns):
+    if reader == 'calamine':
+        pytest.importorskip('python_calamine')
+    wb = open_workbook(workbook, reader)
+    expected = wb.read_sheet('Master List', 2).clean_names().dropna(thresh=2)
+    expected = expected.loc[:, [column in columns for column in expected.columns]]
+    result = wb.read_sheet('Master List', 2, projection=ColumnProjection(columns, True, 2)).clean_names()
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_open_workbook_unknown_reader(workbook):
+    with pytest.raises(ValueError):
+        open_workbook(workbook, 'this_reader_does_not_exist')
+
+
+@pytest.mark.parametrize('value,expected', [(None, ''), (2.0, 2), (2.5, 2.5), ('text', 'text'),
+                                            (datetime.date(2020, 1, 2), datetime.datetime(2020, 1, 2))])
+def test_convert_cell(value, expected):
+    assert convert_cell(value) == expected
+
+
+def test_convert_cell_error():
+    assert np.isnan(convert_cell('#DIV/0!'))
+
+
+def test_workbook_reader_abstract(tmp_path):
+    with pytest.raises(TypeError):
+        WorkbookReader(tmp_path / 'book.xlsx')
+
+    class NamesOnly(WorkbookReader):
+        sheet_names = ['Master List']
+
+    with pytest.raises(TypeError):
+        NamesOnly(tmp_path / 'book.xlsx')
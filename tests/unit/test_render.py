@@ -0,0 +1,72 @@
+import io
+import pytest
+import numpy as np
+import pandas as pd
+from docx import Document
+from laundry.render import render_document
+from laundry.validation import ValidationReport, ValidationError
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def structure() -> pd.DataFrame:
+    return pd.DataFrame({'Section Type': ['heading', 'table', 'photo'],
+                         'Section Contains': ['asset_name', 'component\nscore', 'photos'],
+                         'Section Style': ['Heading 1', 'Table Grid', 'Normal'], 'Title Style': [np.nan] * 3,
+                         'Section Break': [None, True, None], 'Page Break': [None, None, None],
+                         'Path': [None, None, 'photos']})
+
+
+@pytest.fixture
+def data(tmp_path) -> pd.DataFrame:
+    (tmp_path / 'photos').mkdir()
+    for number in range(3):
+        Image.new('RGB', (20, 10), (number, 0, 0)).save(tmp_path / 'photos' / f'p{number}.jpg')
+    return pd.DataFrame({'Asset Name': ['asset 0', 'asset 1', 'asset 2'], 'Component': ['iso', 'sw', 'iso'],
+                         'Score': [0, 1, 2], 'Photos': ['p0', 'p1\np2', np.nan]})
+
+
+@pytest.fixture
+def template() -> bytes:
+    document = Document()
+    document.add_paragraph('Template heading', style='Heading 1')
+    stream = io.BytesIO()
+    document.save(stream)
+    return stream.getvalue()
+
+
+def test_render_document(structure, data, template, tmp_path):
+    structure_before, data_before = structure.copy(), data.copy()
+    result = Document(io.BytesIO(render_document(structure, data, template, root=tmp_path)))
+    assert [p.text for p in result.paragraphs if p.text][:3] == ['Template heading', 'asset 0', 'asset 1']
+    assert [t.cell(1, 0).text for t in result.tables] == ['iso', 'sw', 'iso']
+    assert len(result.inline_shapes) == 3
+    # The DataFrames passed are not changed, and nothing is written to disk.
+    pd.testing.assert_frame_equal(structure, structure_before)
+    pd.testing.assert_frame_equal(data, data_before)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['photos']
+
+
+def test_render_document_to_stream(structure, data, template, tmp_path):
+    template_fp = tmp_path / 'template.docx'
+    template_fp.write_bytes(template)
+    expected = render_document(structure, data, template, root=tmp_path, filter_rows='component: iso')
+    for stream in (False, True):
+        output = io.BytesIO()
+        assert render_document(structure, data, template_fp, output, filter_rows='component: iso', root=tmp_path,
+                               stream=stream) is None
+        result = Document(output)
+        assert [p.text for p in result.paragraphs] == [p.text for p in Document(io.BytesIO(expected)).paragraphs]
+        assert [t.cell(1, 0).text for t in result.tables] == ['iso', 'iso']
+
+
+def test_render_document_errors(structure, data, template, tmp_path):
+    report = ValidationReport()
+    with pytest.raises(ValidationError) as e:
+        render_document(structure, data.assign(Photos='missing'), template, root=tmp_path,
+                        filter_rows='no_column: 1', report=report)
+    assert e.value.report is report
+    assert {issue.column for issue in report.errors} == {'filter_rows', 'photos'}
+    with pytest.raises(ValueError):
+        render_document(structure, data, tmp_path / 'missing.docx', root=tmp_path)
@@ -0,0 +1,171 @@
+import http.client
+import importlib
+import io
+import json
+import multiprocessing
+import os
+import threading
+import urllib.request
+from urllib.error import HTTPError
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import pandas as pd
+from docx import Document
+from laundry.serve import RenderService, RenderServer, RenderResponse
+
+STRUCTURE = {'Section Type': ['heading', 'table'], 'Section Contains': ['asset_name', 'component\nscore'],
+             'Section Style': ['Heading 1', 'Table Grid'], 'Title Style': [None, None],
+             'Section Break': [None, True], 'Page Break': [None, None], 'Path': [None, None]}
+DATA = {'Asset Name': ['asset 0', 'asset 1', 'asset 2'], 'Component': ['iso', 'sw', 'iso'], 'Score': [0, 1, 2]}
+# The serve command, exported by the laundry package, hides the module of the same name.
+SERVE = importlib.import_module('laundry.serve')
+RENDER_REQUEST = SERVE.render_request
+
+
+def crashing_render(request, root, options):
+    # Stands in for a worker that runs out of memory while the crash file exists.
+    if (root / 'crash').exists():
+        os._exit(1)
+    return RENDER_REQUEST(request, root, options)
+
+
+@pytest.fixture
+def templates_dir(tmp_path):
+    (tmp_path / 'templates').mkdir()
+    document = Document()
+    document.add_paragraph('Template heading', style='Heading 1')
+    document.save(tmp_path / 'templates' / 'report.docx')
+    return tmp_path / 'templates'
+
+
+@pytest.fixture
+def server(templates_dir, tmp_path):
+    service = RenderService(templates_dir, tmp_path, workers=1, queue_size=1, executor=ThreadPoolExecutor(1))
+    server = RenderServer(('127.0.0.1', 0), service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.close()
+
+
+def post(server, query: str, body: bytes, content_type: str) -> (int, bytes):
+    url = f'http://127.0.0.1:{server.server_address[1]}/render?{query}'
+    request = urllib.request.Request(url, body, {'Content-Type': content_type}, method='POST')
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.read()
+    except HTTPError as e:
+        return e.code, e.read()
+
+
+def workbook() -> bytes:
+    stream = io.BytesIO()
+    with pd.ExcelWriter(stream) as writer:
+        pd.DataFrame(STRUCTURE).to_excel(writer, sheet_name='_structure', index=False)
+        pd.DataFrame(DATA).to_excel(writer, sheet_name='Master List', index=False)
+    return stream.getvalue()
+
+
+def test_render_workbook_and_json(server):
+    status, body = post(server, 'template=report&filter_rows=component:%20iso', workbook(),
+                        'application/octet-stream')
+    assert status == 200, body
+    result = Document(io.BytesIO(body))
+    assert [p.text for p in result.paragraphs if p.text][:3] == ['Template heading', 'asset 0', 'asset 2']
+
+    content = {'template': 'report', 'structure': pd.DataFrame(STRUCTURE).to_dict('records'),
+               'data': pd.DataFrame(DATA).to_dict('records')}
+    status, body = post(server, '', json.dumps(content).encode('utf-8'), 'application/json')
+    assert status == 200, body
+    assert [t.cell(1, 0).text for t in Document(io.BytesIO(body)).tables] == ['iso', 'sw', 'iso']
+
+
+def test_render_errors(server):
+    status, body = post(server, 'template=missing', workbook(), 'application/octet-stream')
+    assert status == 404
+    assert 'report' in json.loads(body)['error']
+    status, body = post(server, 'filter_rows=no_column:%201', workbook(), 'application/octet-stream')
+    assert status == 400
+    assert [issue['column'] for issue in json.loads(body)['issues']] == ['filter_rows']
+    status, body = post(server, '', b'{"data": []}', 'application/json')
+    assert status == 400
+
+    with urllib.request.urlopen(f'http://127.0.0.1:{server.server_address[1]}/status') as response:
+        status = json.loads(response.read())
+    assert status['requests'] == {'total': 3, 'rendered': 0, 'invalid': 3, 'failed': 0, 'rejected': 0}
+    assert status['templates'] == ['report']
+
+
+def test_render_photo_path_outside_root(server, tmp_path):
+    # Photo directories must be inside the service's root, however the path is written.
+    for path in ['..', str(tmp_path.parent), 'templates/../..']:
+        structure = {'section_type': ['photo'], 'section_contains': ['photo'], 'section_style': [None],
+                     'title_style': [None], 'section_break': [None], 'page_break': [None], 'path': [path]}
+        content = {'structure': pd.DataFrame(structure).to_dict('records'), 'data': [{'photo': 'a.jpg'}]}
+        status, body = post(server, '', json.dumps(content).encode('utf-8'), 'application/json')
+        assert status == 400
+        issues = json.loads(body)['issues']
+        assert [issue['column'] for issue in issues] == ['path']
+        assert 'outside' in issues[0]['message']
+
+
+def test_render_queue_full(server, monkeypatch):
+    release = threading.Event()
+
+    def blocked_render(request, root, options):
+        release.wait(10)
+        return RenderResponse(200, 'application/octet-stream', b'')
+
+    monkeypatch.setattr(SERVE, 'render_request', blocked_render)
+    # One request is rendered and one is queued. The third is refused.
+    threads = [threading.Thread(target=post, args=(server, '', workbook(), 'application/octet-stream'))
+               for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    while server.service.in_flight < 2:
+        threading.Event().wait(0.01)
+    status, body = post(server, '', workbook(), 'application/octet-stream')
+    assert status == 503
+    assert json.loads(body)['queue_depth'] == 1
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert server.service.stats.requests['rejected'] == 1
+    assert server.service.stats.requests['rendered'] == 2
+
+
+def test_render_content_length(server):
+    for length in ['abc', '-1']:
+        connection = http.client.HTTPConnection('127.0.0.1', server.server_address[1])
+        connection.putrequest('POST', '/render')
+        connection.putheader('Content-Length', length)
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == 400
+        assert 'Content-Length' in json.loads(response.read())['error']
+        connection.close()
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != 'fork', reason='The workers must inherit the test render.')
+def test_render_worker_restarted(templates_dir, tmp_path, monkeypatch):
+    monkeypatch.setattr(SERVE, 'render_request', crashing_render)
+    service = RenderService(templates_dir, tmp_path, workers=1, queue_size=1)
+    server = RenderServer(('127.0.0.1', 0), service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        (tmp_path / 'crash').touch()
+        status, body = post(server, 'template=report', workbook(), 'application/octet-stream')
+        assert status == 503
+        assert 'restarted' in json.loads(body)['error']
+        # The replacement workers render the next request.
+        (tmp_path / 'crash').unlink()
+        status, body = post(server, 'template=report', workbook(), 'application/octet-stream')
+        assert status == 200, body
+        assert service.restarts == 1
+        assert service.in_flight == 0
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
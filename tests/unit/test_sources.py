@@ -0,0 +1,93 @@
+import sqlite3
+import pytest
+import pandas as pd
+from laundry.filters import RowPrefilter, parse_filters
+from laundry.readers import ColumnProjection
+from laundry.sources import DataSource, CsvSource, ParquetSource, SqliteSource, parse_source
+from laundry.validation import ValidationReport, validate_batch
+
+
+@pytest.fixture
+def data() -> pd.DataFrame:
+    return pd.DataFrame({'Asset Name': [f'asset {i}' for i in range(6)],
+                         'Component': ['iso', 'sw', None, 'iso', 'sw', 'iso'],
+                         'Score': [0, 1, 2, 3, 4, 5],
+                         'Notes': ['a', None, None, 'd', 'e', 'f']})
+
+
+@pytest.fixture
+def sources(tmp_path, data, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    data.to_csv('data.csv', index=False)
+    with sqlite3.connect('data.db') as connection:
+        data.to_sql('data', connection, index=False)
+    uris = ['csv:data.csv', 'sqlite:data.db#data', 'sqlite:data.db#SELECT * FROM data;']
+    try:
+        data.to_parquet('data.parquet')
+        uris.append('parquet:data.parquet')
+    except ImportError:
+        pass
+    return uris
+
+
+def test_parse_source(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    assert isinstance(parse_source('csv:data.csv'), CsvSource)
+    assert isinstance(parse_source('PARQUET:data.parquet'), ParquetSource)
+    source = parse_source('sqlite:dir/data.db#SELECT name FROM data')
+    assert isinstance(source, SqliteSource)
+    assert source.path == tmp_path.resolve() / 'dir' / 'data.db'
+    assert source.query == 'SELECT name FROM data'
+    assert source.sheet_names == ['sqlite:dir/data.db#SELECT name FROM data']
+    for worksheet in ['Master List', 'C:\\data.xlsx', 'http://example.com', None, 3]:
+        assert parse_source(worksheet) is None
+    with pytest.raises(ValueError):
+        parse_source('sqlite:data.db')
+
+
+def test_read_sheet(sources, data):
+    for uri in sources:
+        df = parse_source(uri).read_sheet(uri)
+        pd.testing.assert_frame_equal(df, data, check_dtype=False)
+
+
+def test_read_sheet_filter_and_projection(sources, data):
+    filters = parse_filters('component: iso\nscore > 0')
+    projection = ColumnProjection(['asset_name', 'score'], min_values=3)
+    for uri in sources:
+        df = parse_source(uri).read_sheet(uri, row_filter=RowPrefilter(filters), projection=projection)
+        # The row index is the position in the full source, as it is for worksheets.
+        assert df.index.tolist() == [3, 5]
+        assert list(df.columns) == ['Asset Name', 'Score']
+        # Rows with fewer than 3 values, counting the columns that are not projected, are discarded.
+        df = parse_source(uri).read_sheet(uri, projection=projection)
+        assert df.index.tolist() == [0, 1, 3, 4, 5]
+
+
+def test_read_sheet_header_row(sources):
+    with pytest.raises(ValueError, match='header_row'):
+        parse_source('sqlite:data.db#data').read_sheet('sqlite:data.db#data', header_row=1)
+    df = parse_source('csv:data.csv').read_sheet('csv:data.csv', header_row=1)
+    assert list(df.columns)[0] == 'asset 0'
+
+
+def test_validate_batch_sources(sources, tmp_path):
+    batch = pd.DataFrame({'data_worksheet': ['csv:data.csv', 'csv:missing.csv', 'sqlite:data.db'],
+                          'structure_worksheet': ['structure', 'csv:data.csv', 'structure'],
+                          'header_row': 0, 'drop_empty_columns': True, 'template_file': None, 'filter_rows': None,
+                          'output_file': str(tmp_path / 'out.docx')}, index=[1, 2, 3])
+    report = ValidationReport()
+    validate_batch(batch, ['structure'], report)
+    assert {(issue.column, issue.rows) for issue in report.errors} == {
+        ('data_worksheet', (2,)), ('data_worksheet', (3,)), ('structure_worksheet', (2,))}
+
+
+def test_data_source_abstract(tmp_path):
+    class ColumnsOnly(DataSource):
+        scheme = 'columns'
+
+        def column_names(self, header_row):
+            return ['asset_name']
+
+    with pytest.raises(TypeError):
+        ColumnsOnly('columns:data', str(tmp_path / 'data'))
@@ -0,0 +1,48 @@
+import pytest
+from docx import Document
+from docx.shared import Inches
+from laundry.streaming import StreamingDocument
+
+Image = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture
+def template(tmp_path):
+    document = Document()
+    document.add_paragraph('Template heading', style='Heading 1')
+    document.save(tmp_path / 'template.docx')
+    for row in range(3):
+        Image.new('RGB', (20, 10), (120, 30, row)).save(tmp_path / f'photo_{row}.jpg')
+    return tmp_path / 'template.docx'
+
+
+def render(document, photo_dir, rows):
+    for row in range(rows):
+        document.add_paragraph(f'Row {row}', style='Normal')
+        table = document.add_table(rows=1, cols=2, style='Table Grid')
+        table.cell(0, 0).text = f'Cell {row}'
+        document.add_picture(str(photo_dir / f'photo_{row}.jpg'), width=Inches(1))
+        yield
+
+
+def test_streaming_document(template, tmp_path):
+    streamed = StreamingDocument(template, tmp_path / 'streamed.docx')
+    for _ in render(streamed.document, tmp_path, 3):
+        streamed.flush()
+        # The ids of the photos that have been written are still in use.
+        assert streamed.next_id > 1
+        assert len(streamed.document.paragraphs) == 0
+    streamed.close()
+    saved = Document(template)
+    for _ in render(saved, tmp_path, 3):
+        pass
+    saved.save(tmp_path / 'saved.docx')
+
+    expected = Document(tmp_path / 'saved.docx')
+    result = Document(tmp_path / 'streamed.docx')
+    assert [p.text for p in result.paragraphs] == [p.text for p in expected.paragraphs]
+    assert [p.style.name for p in result.paragraphs] == [p.style.name for p in expected.paragraphs]
+    assert [t.cell(0, 0).text for t in result.tables] == ['Cell 0', 'Cell 1', 'Cell 2']
+    assert len(result.inline_shapes) == 3
+    assert len(result.part.package.image_parts) == 3
+    assert result.sections[0].page_width == expected.sections[0].page_width
@@ -0,0 +1,72 @@
+import io
+import os
+from docx import Document
+from laundry.templates import TemplateCache, clone_document
+
+
+def test_clone_document():
+    template = Document()
+    template.add_paragraph('Template heading', style='Heading 1')
+    clone = clone_document(template)
+    clone.add_paragraph('Row 1')
+    assert [p.text for p in template.paragraphs] == ['Template heading']
+    assert [p.text for p in clone.paragraphs] == ['Template heading', 'Row 1']
+    # The template's unchanged parts are shared by the clone.
+    assert clone.styles.element is template.styles.element
+    stream = io.BytesIO()
+    clone.save(stream)
+    assert [p.text for p in Document(stream).paragraphs] == ['Template heading', 'Row 1']
+
+
+def test_template_cache(tmp_path):
+    fp = tmp_path / 'template.docx'
+    template = Document()
+    template.add_paragraph('First')
+    template.save(fp)
+    cache = TemplateCache()
+    first = cache.new_document(fp)
+    first.add_paragraph('Row')
+    assert [p.text for p in cache.new_document(fp).paragraphs] == ['First']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    template.add_paragraph('Second')
+    template.save(fp)
+    os.utime(fp, ns=(fp.stat().st_atime_ns, fp.stat().st_mtime_ns + 1_000_000_000))
+    assert [p.text for p in cache.new_document(fp).paragraphs] == ['First', 'Second']
+    assert cache.misses == 2
+    assert len(cache) == 1
+
+
+def test_template_cache_bytes(tmp_path):
+    template = Document()
+    template.add_paragraph('From bytes')
+    stream = io.BytesIO()
+    template.save(stream)
+    cache = TemplateCache()
+    for _ in range(2):
+        assert [p.text for p in cache.new_document(stream.getvalue()).paragraphs] == ['From bytes']
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_template_cache_evicts_least_recently_used():
+    templates = []
+    for text in ['a', 'b', 'c']:
+        template = Document()
+        template.add_paragraph(text)
+        stream = io.BytesIO()
+        template.save(stream)
+        templates.append(stream.getvalue())
+    cache = TemplateCache(max_size=2)
+    cache.new_document(templates[0])
+    cache.new_document(templates[1])
+    cache.new_document(templates[0])
+    cache.new_document(templates[2])
+    assert len(cache) == 2
+    # The second template was the least recently used, so it is parsed again.
+    assert [p.text for p in cache.new_document(templates[1]).paragraphs] == ['b']
+    assert [p.text for p in cache.new_document(templates[2]).paragraphs] == ['c']
+    assert (cache.hits, cache.misses) == (2, 4)
+
+    cache = TemplateCache(max_size=0)
+    cache.new_document(templates[0])
+    assert len(cache) == 0
@@ -0,0 +1,112 @@
+import pytest
+import pandas as pd
+from laundry.filters import RowFilter
+from laundry.validation import ValidationReport, ValidationError, ColumnLookup, validate_batch, validate_structure, \
+    validate_photos, volume_limit
+
+
+def batch_rows(*rows) -> pd.DataFrame:
+    columns = ['data_worksheet', 'structure_worksheet', 'header_row', 'drop_empty_columns', 'template_file',
+               'filter_rows', 'output_file']
+    return pd.DataFrame(list(rows), columns=columns, index=range(1, len(rows) + 1))
+
+
+def test_column_lookup():
+    calls = []
+
+    def function(value):
+        calls.append(value)
+        if value == 'bad':
+            raise ValueError(f'{value} is bad')
+        return value.upper()
+
+    values = pd.Series(['a', 'bad', 'a', 'bad', 'b'], name='col')
+    lookup = ColumnLookup(values, function)
+    assert calls == ['a', 'bad', 'b']
+    assert lookup.results().tolist() == ['A', None, 'A', None, 'B']
+    report = ValidationReport()
+    lookup.report(report, 'sheet')
+    assert [(issue.rows, issue.column, issue.message) for issue in report.issues] == [((1, 3), 'col', 'bad is bad')]
+
+
+def test_validate_batch(tmp_path):
+    template = tmp_path / 'template.docx'
+    template.write_bytes(b'')
+    batch = batch_rows(['data', 'structure', 0, None, str(template), 'score > 1', str(tmp_path / 'a.docx')],
+                       ['data', 'structure', None, True, None, None, str(tmp_path / 'b.docx')])
+    report = ValidationReport()
+    df = validate_batch(batch, ['data', 'structure'], report, volume_defaults={'max_rows_per_file': 10})
+    assert report.ok and len(report) == 0
+    assert df['template_file'].tolist() == [template.resolve(), None]
+    assert df['output_file'].tolist() == [tmp_path.resolve() / 'a.docx', tmp_path.resolve() / 'b.docx']
+    assert df.at[1, 'filter_rows'] == [RowFilter('score', '>', (1.0,))]
+    assert df['header_row'].tolist() == [0, 0]
+    assert df['drop_empty_columns'].tolist() == [False, True]
+    assert df['max_rows_per_file'].tolist() == [10, 10]
+    assert df['max_output_mb'].tolist() == [None, None]
+
+
+def test_validate_batch_reports_every_problem():
+    batch = batch_rows(['missing', 'structure', 0, True, 'no_template.docx', 'score >> 1', 'no_dir/a.docx'],
+                       ['data', 'structure', -1, True, 'no_template.docx', None, None])
+    report = ValidationReport()
+    validate_batch(batch, ['data', 'structure'], report)
+    assert {(issue.column, issue.rows) for issue in report.errors} == {
+        ('data_worksheet', (1,)), ('template_file', (1, 2)), ('filter_rows', (1,)), ('output_file', (1,)),
+        ('output_file', (2,)), ('header_row', (2,))}
+    with pytest.raises(ValidationError) as e:
+        report.raise_for_errors('Batch')
+    assert str(e.value) == 'Batch failed with 6 errors.'
+    assert e.value.report is report
+
+
+def test_validate_batch_missing_headers():
+    report = ValidationReport()
+    validate_batch(pd.DataFrame({'data_worksheet': ['data']}), ['data'], report, '_batch')
+    assert len(report.errors) == 1
+    assert report.errors[0].rows == ()
+    assert str(report.errors[0]).startswith("Worksheet '_batch': The required headers")
+
+
+def test_validate_structure(tmp_path):
+    (tmp_path / 'photos').mkdir()
+    structure = pd.DataFrame({'section_type': ['heading', 'Table', 'chart', 'photo', 'photo'],
+                              'section_contains': ['name', 'a\nmissing', 'name', 'photos', 'more_photos'],
+                              'section_style': None, 'title_style': None,
+                              'section_break': [True, None, None, None, None],
+                              'page_break': None, 'path': [None, None, None, 'photos', 'no_photos']})
+    report = ValidationReport()
+    df, photo_paths = validate_structure(structure, report, root=tmp_path,
+                                         data_columns=['name', 'a', 'photos', 'more_photos'])
+    assert {(issue.column, issue.rows) for issue in report.errors} == {
+        ('section_type', (2,)), ('section_contains', (1,)), ('path', (4,))}
+    assert photo_paths == {'photos': (tmp_path / 'photos').resolve()}
+    assert df['section_break'].tolist() == [True, False, False, False, False]
+    assert df['page_break'].tolist() == [False] * 5
+
+
+def test_validate_photos(tmp_path):
+    for name in ['p1.jpg', 'p2.jpg', 'p2.png']:
+        (tmp_path / name).write_bytes(b'')
+    data = pd.DataFrame({'photos': ['p1.jpg\np2', 'No Photo', 'missing', 'p1.jpg\np2', 'p1.gif']})
+    report = ValidationReport()
+    df = validate_photos(data, {'photos': tmp_path}, report, 'data')
+    assert df.at[0, 'photos'] == [tmp_path.resolve() / 'p1.jpg', tmp_path.resolve() / 'p2.jpg']
+    assert df.at[3, 'photos'] == df.at[0, 'photos']
+    assert df.at[1, 'photos'] == 'No Photo'
+    assert [issue.rows for issue in report.errors] == [(2,), (4,)]
+    assert len(report.warnings) == 1 and 'p2' in report.warnings[0].message
+    assert report.to_dict()['errors'] == 2
+
+
+@pytest.mark.parametrize('value,limit_type,default,expected', [(None, int, None, None), ('nan', int, 3, 3),
+                                                               (float('nan'), int, None, None), (2.0, int, None, 2),
+                                                               ('1.5', float, None, 1.5)])
+def test_volume_limit(value, limit_type, default, expected):
+    assert volume_limit(value, limit_type, default) == expected
+
+
+@pytest.mark.parametrize('value', [0, -1, 'many'])
+def test_volume_limit_invalid(value):
+    with pytest.raises(ValueError):
+        volume_limit(value, int)
@@ -0,0 +1,96 @@
+import openpyxl
+import pandas as pd
+from docx import Document
+from laundry.watch import WatchSession, sheet_digests
+
+
+def write_workbook(fp, first: str):
+    with pd.ExcelWriter(fp) as writer:
+        pd.DataFrame({'name': [first, 'b'], 'value': [1, 2]}).to_excel(writer, sheet_name='data', index=False)
+        pd.DataFrame({'name': ['b', 'c']}).to_excel(writer, sheet_name='other', index=False)
+
+
+def test_sheet_digests(tmp_path):
+    fp = tmp_path / 'book.xlsx'
+    write_workbook(fp, 'a')
+    before = sheet_digests(fp)
+    assert set(before) == {'data', 'other'}
+    assert sheet_digests(fp) == before
+
+    # Adding a string to the first worksheet changes the shared string indexes used by the second.
+    workbook = openpyxl.load_workbook(fp)
+    workbook['data'].cell(row=2, column=1).value = 'a new first string'
+    workbook.save(fp)
+    after = sheet_digests(fp)
+    assert after['data'] != before['data']
+    assert after['other'] == before['other']
+
+
+def test_sheet_digests_not_xlsx(tmp_path):
+    fp = tmp_path / 'book.xls'
+    fp.write_bytes(b'not a zip file')
+    assert sheet_digests(fp) is None
+
+
+def test_watch_session_changed_worksheets(tmp_path):
+    fp = tmp_path / 'book.xlsx'
+    write_workbook(fp, 'a')
+    session = WatchSession(fp)
+    assert session.changed_worksheets() is None
+    frames = session.caches.worksheet_frames
+    frames.update({('data', 0): pd.DataFrame(), ('data', 1): pd.DataFrame(), ('other', 0): pd.DataFrame()})
+    assert session.changed_worksheets() == set()
+    assert len(frames) == 3
+
+    write_workbook(fp, 'changed')
+    assert session.changed_worksheets() == {'data'}
+    assert list(frames) == [('other', 0)]
+
+
+def test_watch_session_changed_sources(tmp_path):
+    fp = tmp_path / 'book.xlsx'
+    write_workbook(fp, 'a')
+    source = tmp_path / 'data.csv'
+    source.write_text('name\na\n')
+    uri = f'csv:{source}'
+    session = WatchSession(fp)
+    session.changed_worksheets()
+    frames = session.caches.worksheet_frames
+    frames.update({(uri, 0): pd.DataFrame(), ('data', 0): pd.DataFrame()})
+    session._source_stamps = session.source_stamps()
+    assert session.changed_worksheets() == set()
+
+    source.write_text('name\na\nchanged\n')
+    assert session.changed_worksheets() == {uri}
+    assert list(frames) == [('data', 0)]
+
+
+def test_watch_session_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Document().save(tmp_path / 'template.docx')
+    fp = tmp_path / 'book.xlsx'
+
+    def write_book(columns: str):
+        batch = pd.DataFrame({'data_worksheet': ['data'], 'structure_worksheet': ['structure'], 'header_row': [0],
+                              'drop_empty_columns': [True], 'template_file': ['template.docx'],
+                              'filter_rows': [None], 'output_file': ['report.docx']})
+        structure = pd.DataFrame({'section_type': ['table'], 'section_contains': [columns],
+                                  'section_style': ['Table Grid'], 'title_style': [None], 'section_break': [None],
+                                  'page_break': [None], 'path': [None]})
+        with pd.ExcelWriter(fp) as writer:
+            batch.to_excel(writer, sheet_name='batch', index=False)
+            structure.to_excel(writer, sheet_name='structure', index=False)
+            pd.DataFrame({'name': ['a', 'b'], 'score': [1, 2]}).to_excel(writer, sheet_name='data', index=False)
+
+    write_book('name\nscore')
+    session = WatchSession(fp, {'batch_worksheet': 'batch', 'verbose': False})
+    assert session.run()
+    assert (tmp_path / 'report.docx').exists()
+    dependencies = session._dependencies
+    assert tmp_path / 'template.docx' in {path.resolve() for path in dependencies}
+
+    # The structure names a column that the data worksheet does not have, so the checks fail.
+    write_book('name\nmissing')
+    assert not session.run()
+    assert session.runs == 2
+    assert session._dependencies == dependencies
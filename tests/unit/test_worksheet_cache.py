@@ -0,0 +1,63 @@
+import os
+import numpy as np
+import pytest
+import pandas as pd
+from laundry.worksheet_cache import WorksheetCache, file_digest
+
+
+def test_file_digest(tmp_path):
+    fp = tmp_path / 'book.xlsx'
+    fp.write_bytes(b'abc')
+    assert file_digest(fp) == 'ba7816bf8f01cfea414140de5dae2223b00361a396177a9cb410ff61f20015ad'
+
+
+def test_worksheet_cache_round_trip(tmp_path):
+    workbook = tmp_path / 'book.xlsx'
+    workbook.write_bytes(b'workbook')
+    cache = WorksheetCache(tmp_path / 'cache')
+    df = pd.DataFrame({'asset_name': ['shed', np.nan, 'pump'], 'score': [1.0, np.nan, 3.0]}, index=[0, 2, 5])
+    key = cache.entry_key(workbook, 'Master List', 0, True, True)
+    assert cache.get(key) is None
+    cache.put(key, df)
+    result = cache.get(key)
+    pd.testing.assert_frame_equal(result, df)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_worksheet_cache_key_changes_with_workbook(tmp_path):
+    workbook = tmp_path / 'book.xlsx'
+    workbook.write_bytes(b'workbook')
+    cache = WorksheetCache(tmp_path / 'cache')
+    key = cache.entry_key(workbook, 'Master List', 0, True, True)
+    assert key != cache.entry_key(workbook, 'Master List', 1, True, True)
+    workbook.write_bytes(b'a changed workbook')
+    assert key != cache.entry_key(workbook, 'Master List', 0, True, True)
+
+
+def test_worksheet_cache_mixed_types(tmp_path):
+    """DataFrames that cannot be stored as Parquet are still cached."""
+    cache = WorksheetCache(tmp_path / 'cache')
+    df = pd.DataFrame({'score': [1, 'N/A', 3]})
+    cache.put('mixed', df)
+    pd.testing.assert_frame_equal(cache.get('mixed'), df)
+
+
+@pytest.mark.skipif(not hasattr(os, 'getuid'), reason='Files have no owner on this platform.')
+def test_worksheet_cache_shared_directory(tmp_path):
+    """Pickled entries are neither written nor read in a directory that everyone can write to."""
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    cache_dir.chmod(0o777)
+    cache = WorksheetCache(cache_dir)
+    cache.put('mixed', pd.DataFrame({'score': [1, 'N/A', 3]}))
+    assert list(cache_dir.iterdir()) == []
+    pd.DataFrame({'score': [1, 'N/A', 3]}).to_pickle(cache_dir / 'mixed.pkl')
+    assert cache.get('mixed') is None
+    cache.put('plain', pd.DataFrame({'a': [1, 2, 3]}))
+    assert cache.get('plain') is not None
+
+
+def test_worksheet_cache_evict(tmp_path):
+    cache = WorksheetCache(tmp_path / 'cache', max_size_mb=0)
+    cache.put('entry', pd.DataFrame({'a': [1, 2, 3]}))
+    assert list((tmp_path / 'cache').iterdir()) == []